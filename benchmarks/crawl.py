@@ -0,0 +1,95 @@
+"""Reproducible benchmark of full crawls of a synthetic site.
+
+Crawls a SyntheticSite (see benchmarks/site.py) of each given size with
+validate_all_links() and reports the pages per second, the driver
+round trips (or HTTP requests) per page and the peak memory.
+
+The 'inprocess' driver renders the pages without HTTP or HTML, so it
+measures the overhead of the validator itself; the 'http' driver is
+HttpFastPathDriver crawling the site served from a local http.server.
+
+Every crawl runs in a fresh process, twice: once to time it and once
+under tracemalloc to measure the peak of the Python allocations, as
+tracing slows the crawl down. The sites are seeded, so the runs are
+reproducible.
+
+Usage:
+    python -m benchmarks.crawl [inprocess|http] [sizes] [fan out] [depth] [error rate] [latency in ms]
+
+Example:
+    python -m benchmarks.crawl inprocess 1000,10000,100000
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+import sys
+import tracemalloc
+from selenium_validate_site_links import SiteAllLinkValidator, HttpFastPathDriver
+from benchmarks.site import SyntheticSite, InProcessDriver, serve
+
+
+def crawl(driver_name, site, trace):
+    """Crawls the site once.
+
+    Returns:
+        tuple: The pages visited, the errors, the seconds, the round trips
+            and the peak of the traced memory in bytes (0 if not traced).
+    """
+    if trace:
+        tracemalloc.start()
+    if driver_name == 'inprocess':
+        driver = InProcessDriver(site)
+        domain = 'synthetic.test'
+        round_trips = lambda: driver.round_trips
+        seconds, pages, errors = _crawl(driver, domain)
+    else:
+        with serve(site) as domain:
+            driver = HttpFastPathDriver()
+            round_trips = lambda: site.requests
+            seconds, pages, errors = _crawl(driver, domain)
+            driver.quit()
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return pages, errors, seconds, round_trips(), peak
+
+
+def _crawl(driver, domain):
+    validator = SiteAllLinkValidator(driver, domain)
+    validator.protocol = 'http://'
+    validator.result_sinks = []
+    errors = 0
+    start = perf_counter()
+    for result in validator.iter_validate_all_links():
+        errors += result.status != 'valid'
+    return perf_counter() - start, len(validator.links_visited), errors
+
+
+def run(driver_name, size, fan_out, depth, error_rate, latency, trace):
+    site = SyntheticSite(size, fan_out=fan_out, depth=depth or None, error_rate=error_rate, latency=latency)
+    return crawl(driver_name, site, trace)
+
+
+def run_in_new_process(*args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(run, *args).result()
+
+
+def main(driver_name='inprocess', sizes='1000,10000,100000', fan_out=10, depth=0, error_rate=0.01, latency_ms=0):
+    latency = latency_ms / 1000
+    print('%s driver, fan out %d, depth %s, error rate %.2f%%, %.2f ms latency'
+          % (driver_name, fan_out, depth or 'auto', error_rate * 100, latency_ms))
+    print('%8s %8s %10s %12s %16s %14s' % ('size', 'pages', 'errors', 'pages/s', 'round trips/page', 'peak memory'))
+    for size in (int(size) for size in sizes.split(',')):
+        pages, errors, seconds, round_trips, _ = run_in_new_process(
+            driver_name, size, fan_out, depth, error_rate, latency, False)
+        traced_pages, _, _, _, peak = run_in_new_process(
+            driver_name, size, fan_out, depth, error_rate, latency, True)
+        assert traced_pages == pages, (traced_pages, pages)
+        print('%8d %8d %10d %12.0f %16.2f %11.1f MB'
+              % (size, pages, errors, pages / seconds, round_trips / pages, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*[[str, str, int, int, float, float][i](arg) for i, arg in enumerate(sys.argv[1:])])
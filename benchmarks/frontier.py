@@ -0,0 +1,75 @@
+"""Micro-benchmark of the crawl frontier bookkeeping.
+
+Simulates the queue/visited operations of validate_all_links on a
+synthetic site where every page links to a few new pages and to the
+same set of navigation links, and compares the previous list-based
+bookkeeping with LinkFrontier.
+
+Usage:
+    python -m benchmarks.frontier [size ...]
+"""
+import sys
+from time import perf_counter
+from selenium_validate_site_links import LinkFrontier
+
+FAN_OUT = 3  # New pages linked from every page.
+NAV_LINKS = 20  # Links repeated on every page.
+
+
+def page_links(page, size):
+    """Returns the links found on a synthetic page."""
+    links = ['/nav/%d' % i for i in range(NAV_LINKS)]
+    links.extend('/page/%d' % child for child in range(page * FAN_OUT + 1, page * FAN_OUT + FAN_OUT + 1)
+                 if child < size)
+    return links
+
+
+def crawl_with_lists(size):
+    """The bookkeeping of the list-based implementation."""
+    links_to_visit = ['/page/0']
+    links_visited = []
+    while links_to_visit:
+        url = links_to_visit.pop(0)
+        if url in links_visited:
+            continue
+        links_visited.append(url)
+        if not url.startswith('/page/'):
+            continue
+        for link in page_links(int(url[6:]), size):
+            if link in links_visited:
+                continue
+            links_to_visit.append(link)
+    return len(links_visited)
+
+
+def crawl_with_frontier(size):
+    """The bookkeeping of LinkFrontier."""
+    frontier = LinkFrontier()
+    frontier.push('/page/0')
+    while frontier:
+        url = frontier.pop()
+        if frontier.is_visited(url):
+            continue
+        frontier.mark_visited(url)
+        if not url.startswith('/page/'):
+            continue
+        for link in page_links(int(url[6:]), size):
+            frontier.push(link)
+    return len(frontier.visited)
+
+
+def main(sizes):
+    print('%8s %12s %12s %9s' % ('pages', 'lists (s)', 'frontier (s)', 'speedup'))
+    for size in sizes:
+        start = perf_counter()
+        visited_lists = crawl_with_lists(size)
+        lists_time = perf_counter() - start
+        start = perf_counter()
+        visited_frontier = crawl_with_frontier(size)
+        frontier_time = perf_counter() - start
+        assert visited_lists == visited_frontier
+        print('%8d %12.4f %12.4f %8.1fx' % (size, lists_time, frontier_time, lists_time / frontier_time))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000, 8000])
@@ -0,0 +1,83 @@
+"""Benchmark of collect_current_page_links_to_visit round trips.
+
+Compares reading the hrefs one element at a time with reading them
+in a single execute_script call, using an in-process driver that
+counts its round trips and simulates the wire-protocol latency of
+each one.
+
+Usage:
+    python -m benchmarks.link_extraction [links per page] [latency in ms]
+"""
+import sys
+from time import perf_counter, sleep
+from selenium_validate_site_links import SiteAllLinkValidator, FIND_HREFS_SCRIPT
+
+PAGES = 20
+
+
+class CountingElement:
+    """An 'a' tag whose get_attribute() costs a round trip."""
+
+    def __init__(self, driver, href):
+        self.driver = driver
+        self.href = href
+
+    def get_attribute(self, name):
+        self.driver.round_trip()
+        return self.href
+
+
+class CountingDriver:
+    """A driver whose calls each cost a round trip of `latency` seconds."""
+
+    def __init__(self, links, latency):
+        self.latency = latency
+        self.round_trips = 0
+        self.current_url = 'https://w3.org/standards'
+        self.hrefs = ['https://w3.org/page/%d' % (i % (links // 2 or 1)) for i in range(links)]
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            sleep(self.latency)
+
+    def find_elements_by_xpath(self, xpath):
+        self.round_trip()
+        return [CountingElement(self, href) for href in self.hrefs]
+
+
+class ScriptingCountingDriver(CountingDriver):
+    """A CountingDriver that can also execute scripts."""
+
+    def execute_script(self, script, *args):
+        self.round_trip()
+        assert script == FIND_HREFS_SCRIPT
+        return list(self.hrefs)
+
+
+def run(driver_class, links, latency):
+    """Collects the links of PAGES pages.
+
+    Returns:
+        tuple: The round trips and seconds per page.
+    """
+    driver = driver_class(links, latency)
+    validator = SiteAllLinkValidator(driver, 'w3.org')
+    start = perf_counter()
+    for _ in range(PAGES):
+        validator.links_to_visit = []
+        validator.collect_current_page_links_to_visit()
+    return driver.round_trips / PAGES, (perf_counter() - start) / PAGES
+
+
+def main(links=800, latency_ms=0.5):
+    latency = latency_ms / 1000
+    print('%d links per page, %.2f ms per round trip' % (links, latency_ms))
+    print('%-16s %12s %14s' % ('extraction', 'round trips', 'ms per page'))
+    for name, driver_class in (('per element', CountingDriver), ('execute_script', ScriptingCountingDriver)):
+        round_trips, seconds = run(driver_class, links, latency)
+        print('%-16s %12d %14.2f' % (name, round_trips, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])])
@@ -0,0 +1,68 @@
+"""Benchmark of the memory and queries of LinkGraph.
+
+Records the links of a synthetic site (see benchmarks/site.py), spilling
+them to a file past a threshold, and reports the peak of the Python
+allocations while recording and while building the indexes, and the
+time of the referrers and depth queries. Then records the site again,
+querying the referrers of a page every 100 pages, as when reporting the
+referrers of each broken page during a crawl. Recording and indexing are
+timed under tracemalloc, which slows them down.
+
+Usage:
+    python -m benchmarks.link_graph [pages] [fan out] [spill threshold]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+from selenium_validate_site_links import LinkGraph
+from benchmarks.site import SyntheticSite
+
+
+def main(pages=200000, fan_out=10, spill_threshold=1000000):
+    site = SyntheticSite(pages, fan_out=fan_out)
+    with tempfile.TemporaryDirectory() as directory:
+        graph = LinkGraph(os.path.join(directory, 'links.bin'), spill_threshold)
+        tracemalloc.start()
+        start = perf_counter()
+        for page in range(pages):
+            nav, main = site.links(page)
+            graph.add_links(site.path(page), dict.fromkeys(nav + main))
+        recorded = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        print('%d pages, %d links recorded in %.2f s, peak %.1f MB'
+              % (len(graph), graph.link_count, recorded, peak / 2 ** 20))
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = perf_counter()
+        referrers = graph.referrers(site.path(pages - 1))
+        indexed = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        print('indexes built in %.2f s, peak %.1f MB (%.1f MB over the recorded graph)'
+              % (indexed, peak / 2 ** 20, (peak - before) / 2 ** 20))
+        tracemalloc.stop()
+        start = perf_counter()
+        depth = graph.depth(site.path(pages - 1), '/')
+        print('depth %d computed in %.2f s' % (depth, perf_counter() - start))
+        start = perf_counter()
+        for page in range(0, pages, pages // 1000 or 1):
+            graph.referrers(site.path(page))
+        print('%d referrers of the last page, %.1f us per referrers query'
+              % (len(referrers), (perf_counter() - start) * 1e6 / len(range(0, pages, pages // 1000 or 1))))
+        graph.close()
+
+        graph = LinkGraph(os.path.join(directory, 'links2.bin'), spill_threshold)
+        start = perf_counter()
+        for page in range(pages):
+            nav, main = site.links(page)
+            graph.add_links(site.path(page), dict.fromkeys(nav + main))
+            if page % 100 == 99:
+                graph.referrers(site.path(page))
+        print('%d links recorded with %d referrers queries in %.2f s'
+              % (graph.link_count, pages // 100, perf_counter() - start))
+        graph.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
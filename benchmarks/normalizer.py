@@ -0,0 +1,117 @@
+"""Benchmark of the link checks of collect_current_page_links_to_visit.
+
+Compares the previous per-call regex implementation of
+get_relative_url() and is_for_check() with LinkNormalizer,
+with and without its cache, over synthetic hrefs where,
+like in real sites, most hrefs are repeated.
+
+Usage:
+    python -m benchmarks.normalizer [hrefs] [distinct hrefs]
+"""
+import random
+import re
+import sys
+from time import perf_counter
+from selenium_validate_site_links import LinkNormalizer
+
+DOMAIN = 'www.w3.org'
+REGEX_TO_CHECK = '/?standards'
+
+
+class LegacyChecks:
+    """The link checks as implemented before LinkNormalizer."""
+
+    def __init__(self, domain, check_anchors, regex_to_check):
+        self.domain = domain
+        self.check_anchors = check_anchors
+        self.regex_to_check = regex_to_check
+
+    def get_domain_strip_www(self):
+        return self.domain[4:] if self.domain.startswith('www.') else self.domain
+
+    @staticmethod
+    def is_absolute_url(uri):
+        if not isinstance(uri, str):
+            return False
+        return re.match('https?://', uri)
+
+    @staticmethod
+    def is_link(uri):
+        if not isinstance(uri, str) or uri == '':
+            return False
+        return not re.match('((mailto)|(tel)|(ftp)):', uri)
+
+    def is_internal(self, uri):
+        if not isinstance(uri, str) or not self.is_link(uri):
+            return False
+        if self.is_absolute_url(uri):
+            if re.match('https?://(www.)?' + self.get_domain_strip_www(), uri) is None:
+                return False
+        return True
+
+    def get_relative_url(self, link):
+        if not self.is_internal(link):
+            return False
+        if not self.is_absolute_url(link):
+            relative_url = link
+        else:
+            relative_url = link.split(self.get_domain_strip_www(), 1)[1]
+        if not self.check_anchors:
+            relative_url = relative_url.split('#', 1)[0]
+        if relative_url.endswith('/'):
+            relative_url = relative_url[:-1]
+        return relative_url
+
+    def is_for_check(self, uri):
+        if not self.regex_to_check:
+            return True
+        url = self.get_relative_url(uri)
+        if url:
+            return bool(re.match(self.regex_to_check, url))
+
+
+def make_hrefs(count, distinct):
+    """Returns `count` hrefs drawn from `distinct` synthetic ones."""
+    rng = random.Random(0)
+    templates = ('https://www.w3.org/standards/%d/', 'https://w3.org/participate/%d#top', '/standards/%d',
+                 'https://google.com/%d', 'mailto:user%d@example.com', 'page/%d/')
+    pool = [templates[i % len(templates)] % i for i in range(distinct)]
+    return [pool[rng.randrange(distinct)] for _ in range(count)]
+
+
+def run_legacy(hrefs):
+    checks = LegacyChecks(DOMAIN, False, REGEX_TO_CHECK)
+    kept = 0
+    for link in hrefs:
+        if checks.get_relative_url(link) and checks.is_for_check(link):
+            kept += 1
+    return kept
+
+
+def run_normalizer(hrefs, cache_size):
+    normalize = LinkNormalizer(DOMAIN, False, REGEX_TO_CHECK, cache_size=cache_size).normalize
+    kept = 0
+    for link in hrefs:
+        url, _, _, _, is_for_check = normalize(link)
+        if url and is_for_check:
+            kept += 1
+    return kept
+
+
+def main(count=2000000, distinct=50000):
+    hrefs = make_hrefs(count, distinct)
+    print('%d hrefs, %d distinct' % (count, distinct))
+    results = []
+    for name, run in (('legacy', run_legacy),
+                      ('normalizer', lambda hrefs: run_normalizer(hrefs, 0)),
+                      ('normalizer+LRU', lambda hrefs: run_normalizer(hrefs, 65536))):
+        start = perf_counter()
+        kept = run(hrefs)
+        seconds = perf_counter() - start
+        results.append(kept)
+        print('%-16s %8.2f s %12.0f hrefs/s' % (name, seconds, count / seconds))
+    assert len(set(results)) == 1, results
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
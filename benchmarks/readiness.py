@@ -0,0 +1,62 @@
+"""Benchmark of the wait after each link visit.
+
+Crawls a local site served with a configurable latency, with a driver
+that simulates resources (scripts, XHRs) finishing loading a random
+time after each page load, up to `max_resource_time` seconds. Compares
+the fixed time_to_wait needed to cover the slowest page with ReadinessWait.
+
+Usage:
+    python -m benchmarks.readiness [pages] [latency] [max resource time]
+"""
+import random
+import sys
+from time import monotonic, perf_counter
+from selenium_validate_site_links import SiteAllLinkValidator, ReadinessWait, READINESS_SCRIPT
+from tests.fakedriver import FakeDriver, make_site, serve_site
+
+
+class SimulatedBrowser(FakeDriver):
+    """A FakeDriver whose page resources finish loading after get() returns."""
+
+    def __init__(self, max_resource_time):
+        super().__init__()
+        self.max_resource_time = max_resource_time
+        self.random = random.Random(0)
+        self.resources_end = 0
+
+    def get(self, url):
+        super().get(url)
+        self.resources_end = monotonic() + self.random.uniform(0, self.max_resource_time)
+
+    def _execute_script(self, script, *args):
+        if script != READINESS_SCRIPT:
+            return super()._execute_script(script, *args)
+        self.round_trips += 1
+        now = monotonic()
+        if now < self.resources_end:
+            return ['complete', 0, 0]
+        return ['complete', (now - self.resources_end) * 1000, 1]
+
+
+def crawl(domain, max_resource_time, readiness_wait):
+    validator = SiteAllLinkValidator(SimulatedBrowser(max_resource_time), domain)
+    validator.protocol = 'http://'
+    validator.time_to_wait = max_resource_time
+    validator.readiness_wait = readiness_wait
+    start = perf_counter()
+    validator.validate_all_links()
+    return len(validator.links_visited), perf_counter() - start
+
+
+def main(pages=50, latency=0.02, max_resource_time=0.3):
+    print('%d pages, %.0f ms latency, resources loaded within %.0f ms'
+          % (pages, latency * 1000, max_resource_time * 1000))
+    with serve_site(make_site(pages), delay=latency) as domain:
+        for name, readiness_wait in (('time_to_wait', None),
+                                     ('ReadinessWait', ReadinessWait(poll_interval=0.01, network_idle=0.05))):
+            visited, seconds = crawl(domain, max_resource_time, readiness_wait)
+            print('%-14s %4d pages %8.2f s %8.1f ms per page' % (name, visited, seconds, seconds * 1000 / visited))
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])])
@@ -0,0 +1,188 @@
+"""A synthetic website for benchmarks, served from a local http.server
+or crawled in-process by a fake webdriver.
+
+The pages are generated on demand from their number, so sites of
+100k pages cost no memory until crawled.
+"""
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlsplit
+import math
+import random
+import threading
+import zlib
+from selenium.common.exceptions import WebDriverException
+from selenium_validate_site_links import FIND_HREFS_SCRIPT, READINESS_SCRIPT
+
+ERROR_TITLE = '404 not found'
+
+
+class SyntheticSite:
+    """A website of numbered pages, '/' for page 0 and '/p/<n>' for the rest.
+
+    The pages form a tree of the given depth. Each page links in its
+    <main> element to its children in the tree and to random other pages,
+    up to fan_out links, and outside of it to the first nav_links pages.
+    """
+
+    def __init__(self, size, fan_out=10, depth=None, nav_links=10, error_rate=0.01, latency=0, seed=0):
+        """Initiate the site.
+
+        Args:
+            size (int): The number of pages.
+            fan_out (int): The links in the <main> element of each page. Defaults to 10.
+            depth (int): The depth of the tree of pages. Defaults to the depth
+                of a tree where all the fan_out links are children.
+            nav_links (int): The links outside of <main>, on every page. Defaults to 10.
+            error_rate (float): The fraction of pages that are error pages. Defaults to 0.01.
+            latency (float): The seconds each response takes. Defaults to 0.
+            seed (int): The seed of the random links. Defaults to 0.
+        """
+        self.size = size
+        self.fan_out = fan_out
+        self.nav_links = min(nav_links, size)
+        self.error_rate = error_rate
+        self.latency = latency
+        self.seed = seed
+        self.requests = 0  # The requests served by serve().
+        if depth is None:
+            self.children = max(fan_out, 1)
+        else:
+            # The branching needed to fit all the pages in the depth.
+            self.children = max(2, math.ceil(size ** (1 / depth)))
+        self.cross_links = max(fan_out - self.children, 0)
+
+    @staticmethod
+    def path(page):
+        """Returns the path of a page number."""
+        return '/' if page == 0 else '/p/%d' % page
+
+    @staticmethod
+    def page_number(path):
+        """Returns the page number of a path, or None if it is not a page."""
+        if path in ('', '/'):
+            return 0
+        if path.startswith('/p/') and path[3:].rstrip('/').isdigit():
+            return int(path[3:].rstrip('/'))
+        return None
+
+    def is_error(self, page):
+        """Returns whether a page is an error page."""
+        return page != 0 and zlib.crc32(b'%d' % page) % 10000 < self.error_rate * 10000
+
+    def links(self, page):
+        """Returns the paths a page links to.
+
+        Returns:
+            tuple: The paths outside and inside of the <main> element.
+        """
+        nav = [self.path(other) for other in range(self.nav_links)]
+        first = page * self.children + 1
+        main = [self.path(child) for child in range(first, min(first + self.children, self.size))]
+        if self.cross_links:
+            rng = random.Random(self.seed * 1000003 + page)
+            main.extend(self.path(rng.randrange(self.size)) for _ in range(self.cross_links))
+        return nav, main
+
+    def render(self, path):
+        """Returns the response to a path.
+
+        Returns:
+            tuple: The status code, the title and the paths outside and inside of <main>.
+        """
+        page = self.page_number(urlsplit(path).path)
+        if page is None or page >= self.size or self.is_error(page):
+            return 404, ERROR_TITLE, [], []
+        nav, main = self.links(page)
+        return 200, 'Page %d' % page, nav, main
+
+    def html(self, path):
+        """Returns the status code and HTML of a path."""
+        status, title, nav, main = self.render(path)
+        return status, ('<html><head><title>%s</title></head><body><nav>%s</nav><main>%s</main></body></html>' % (
+            title, ''.join('<a href="%s">nav</a>' % href for href in nav),
+            ''.join('<a href="%s/">link</a>' % href for href in main)))
+
+
+@contextmanager
+def serve(site):
+    """Serves a site from a local http.server in a background thread.
+
+    Args:
+        site (SyntheticSite): The site.
+
+    Yields:
+        str: The domain (host:port) of the server.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            site.requests += 1
+            if site.latency:
+                sleep(site.latency)
+            status, html = site.html(self.path)
+            body = html.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield '127.0.0.1:%d' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class InProcessDriver:
+    """A fake webdriver that renders the pages of a SyntheticSite in-process,
+    without HTTP or HTML, to measure the overhead of the validator itself.
+
+    It supports the './/a' and './/main//a' XPaths and counts its round trips.
+    """
+
+    def __init__(self, site, protocol='http://', domain='synthetic.test'):
+        self.site = site
+        self.base = protocol + domain
+        self.round_trips = 0
+        self.current_url = ''
+        self.title = ''
+        self.status_code = None
+        self._nav = []
+        self._main = []
+
+    def get(self, url):
+        self.round_trips += 1
+        if self.site.latency:
+            sleep(self.site.latency)
+        parts = urlsplit(url)
+        if parts.netloc and self.base.split('://', 1)[1] != parts.netloc:
+            raise WebDriverException('Unknown host ' + parts.netloc)
+        self.current_url = url
+        self.status_code, self.title, self._nav, self._main = self.site.render(parts.path)
+
+    def _hrefs(self, xpath):
+        paths = self._main if xpath != './/a' else self._nav + self._main
+        return [self.base + path + '/' for path in paths]
+
+    def execute_script(self, script, *args):
+        self.round_trips += 1
+        if script == FIND_HREFS_SCRIPT:
+            return self._hrefs(args[0])
+        if script == READINESS_SCRIPT:
+            return ['complete', 60000, 0]
+        raise WebDriverException('Unsupported script')
+
+    def quit(self):
+        pass
@@ -0,0 +1,65 @@
+"""Benchmark of the memory and throughput of the visited sets.
+
+Marks `count` faceted URLs as visited in a LinkFrontier with each
+visited set, then checks as many URLs, half of them visited. Each run
+is in a fresh process, whose peak resident memory growth is reported,
+as SQLite allocates outside of the Python allocator. The Bloom filter
+is sized for `count` links and its false positives are reported.
+
+Usage:
+    python -m benchmarks.visited [counts] [bloom error rate]
+
+Example:
+    python -m benchmarks.visited 1000000,10000000 0.001
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+import resource
+import sys
+from selenium_validate_site_links import LinkFrontier, MemoryVisitedSet, BloomVisitedSet, SqliteVisitedSet
+
+
+def url(i):
+    return '/category/%d/item?color=%d&size=%d' % (i % 1000, i % 7, i)
+
+
+def run(name, count, error_rate):
+    """Fills and queries a visited set.
+
+    Returns:
+        tuple: The links marked and checked per second, the false positives
+            and the peak resident memory growth in bytes.
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    visited = {'memory': MemoryVisitedSet,
+               'bloom': lambda: BloomVisitedSet(count, error_rate),
+               'sqlite': SqliteVisitedSet}[name]()
+    frontier = LinkFrontier(visited)
+    start = perf_counter()
+    for i in range(count):
+        frontier.mark_visited(url(i))
+    marked = count / (perf_counter() - start)
+    start = perf_counter()
+    # Half of the URLs checked are visited, the other half are new.
+    hits = sum(frontier.is_visited(url(i)) for i in range(count // 2, count + count // 2))
+    checked = count / (perf_counter() - start)
+    false_positives = hits - (count - count // 2)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    visited.close()
+    # ru_maxrss is in kilobytes on Linux.
+    return marked, checked, false_positives, peak * 1024
+
+
+def main(counts='1000000,10000000', error_rate=0.001):
+    print('%-8s %10s %14s %14s %16s %12s' % ('backend', 'urls', 'marked/s', 'checked/s', 'false positives', 'memory'))
+    for count in (int(count) for count in counts.split(',')):
+        for name in ('memory', 'bloom', 'sqlite'):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                marked, checked, false_positives, peak = executor.submit(run, name, count, error_rate).result()
+            print('%-8s %10d %14.0f %14.0f %16d %9.1f MB'
+                  % (name, count, marked, checked, false_positives, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main(*[[str, float][i](arg) for i, arg in enumerate(sys.argv[1:])])
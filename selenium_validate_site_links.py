@@ -1,7 +1,2645 @@
-from time import sleep
+from collections import deque, namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from html.parser import HTMLParser
+from itertools import groupby
+from operator import itemgetter
+from time import monotonic, perf_counter, sleep, time
+from urllib.parse import quote, urljoin, urlsplit
+from array import array
+import asyncio
+import codecs
+import copy
+import fnmatch
+import gzip
+import hashlib
+import heapq
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import queue
 import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import xml.etree.ElementTree as ElementTree
+import zlib
 from selenium.common.exceptions import WebDriverException, StaleElementReferenceException
 
+# Returns the hrefs of the 'a' tags matching the XPath given as argument, in one call.
+FIND_HREFS_SCRIPT = """
+var snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var hrefs = new Array(snapshot.snapshotLength);
+for (var i = 0; i < snapshot.snapshotLength; i++) {
+    var a = snapshot.snapshotItem(i);
+    if (!a.hasAttribute('href')) {
+        hrefs[i] = null;
+    } else {
+        hrefs[i] = typeof a.href === 'string' ? a.href : a.getAttribute('href');
+    }
+}
+return hrefs;
+"""
+
+ABSOLUTE_URL_PATTERN = re.compile('https?://')
+NOT_LINK_PATTERN = re.compile('((mailto)|(tel)|(ftp)):')
+
+# The result of all the checks of a link, see LinkNormalizer.normalize().
+NormalizedLink = namedtuple('NormalizedLink', ['relative_url', 'is_link', 'is_absolute', 'is_internal', 'is_for_check'])
+
+
+class LinkNormalizer:
+    """Normalizes links to relative URLs and runs all the link checks
+    of SiteAllLinkValidator in one pass.
+
+    The patterns are compiled once, when the settings change, and the
+    results are kept in a bounded LRU cache, since the same links
+    (e.g. menus) are found in most pages.
+    """
+
+    def __init__(self, domain='', check_anchors=False, regex_to_check='', cache_size=65536, canonicalizer=None):
+        """Initiate the normalizer.
+
+        Args:
+            domain (str): The domain of the website.
+            check_anchors (bool): Whether to keep the anchors of the links. Defaults to False.
+            regex_to_check (str): The regular expression the relative URLs to check match.
+            cache_size (int): The number of links to cache. Defaults to 65536.
+            canonicalizer (UrlCanonicalizer): The canonicalizer of the relative URLs. Defaults to none.
+        """
+        self.cache_size = cache_size
+        self.configure(domain, check_anchors, regex_to_check, canonicalizer)
+
+    def configure(self, domain, check_anchors, regex_to_check, canonicalizer=None):
+        """Compiles the patterns for the given settings and clears the cache.
+
+        Args:
+            domain (str): The domain of the website.
+            check_anchors (bool): Whether to keep the anchors of the links.
+            regex_to_check (str): The regular expression the relative URLs to check match.
+            canonicalizer (UrlCanonicalizer): The canonicalizer of the relative URLs. Defaults to none.
+        """
+        self._canonicalizer = canonicalizer
+        domain_no_www = domain[4:] if domain.startswith('www.') else domain
+        # Allow both formats of the domain, with and without 'www.'.
+        self._domain_match = re.compile(r'https?://(www\.)?' + re.escape(domain_no_www)).match
+        self._check_anchors = check_anchors
+        self._regex_match = re.compile(regex_to_check).match if regex_to_check else None
+        self._cached_normalize = lru_cache(maxsize=self.cache_size)(self._normalize)
+
+    def normalize(self, link):
+        """Returns the relative URL of a link and the results of its checks.
+
+        Args:
+            link (str): The link URL.
+
+        Returns:
+            NormalizedLink: The relative URL (False if the link is not internal)
+                and whether the link is a link, absolute, internal and for check.
+        """
+        return self._cached_normalize(link)
+
+    def _normalize(self, link):
+        if not isinstance(link, str) or link == '' or NOT_LINK_PATTERN.match(link):
+            return NormalizedLink(False, False, bool(isinstance(link, str) and ABSOLUTE_URL_PATTERN.match(link)),
+                                  False, self._regex_match is None)
+        if ABSOLUTE_URL_PATTERN.match(link):
+            domain_match = self._domain_match(link)
+            if domain_match is None:
+                return NormalizedLink(False, True, True, False, self._regex_match is None)
+            relative_url = link[domain_match.end():]
+            is_absolute = True
+        else:
+            relative_url = link
+            is_absolute = False
+        # Remove any anchors if needed.
+        if not self._check_anchors:
+            relative_url = relative_url.split('#', 1)[0]
+        if self._canonicalizer is not None:
+            relative_url = self._canonicalizer.canonicalize(relative_url)
+        if relative_url.endswith('/'):
+            relative_url = relative_url[:-1]
+        if self._regex_match is None:
+            is_for_check = True
+        else:
+            is_for_check = bool(relative_url) and self._regex_match(relative_url) is not None
+        return NormalizedLink(relative_url, True, is_absolute, True, is_for_check)
+
+
+# The query parameters dropped by UrlCanonicalizer by default: campaign tags, click IDs and session IDs.
+TRACKING_PARAMETERS = ('utm_*', 'gclid', 'dclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', 'sessionid', 'sid',
+                       'jsessionid', 'phpsessid', 'aspsessionid*')
+
+# The index pages UrlCanonicalizer strips from the paths by default.
+INDEX_PAGES = ('index.html', 'index.htm', 'index.php', 'default.aspx', 'default.asp')
+
+PERCENT_ESCAPE_PATTERN = re.compile('%([0-9A-Fa-f]{2})')
+UNRESERVED_CHARACTERS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+
+class UrlCanonicalizer:
+    """Rewrites relative URLs to a canonical form before they are deduplicated,
+    so that the variants of a page are visited once.
+
+    The query parameters matching drop_parameters (or not matching
+    keep_parameters, if set) are dropped and the rest sorted; the percent
+    escapes are normalized; the dot segments, empty segments, index pages,
+    trailing slashes and session path parameters (e.g. ';jsessionid=...')
+    are removed; and then the rewrite rules are applied in order.
+
+    It also counts the visits avoided: the distinct variants found of the
+    URLs visited, beyond the first one. Set it as the canonicalizer of
+    SiteAllLinkValidator, which also honors <link rel="canonical"> if
+    honor_canonical_link is set.
+    """
+
+    def __init__(self, drop_parameters=TRACKING_PARAMETERS, keep_parameters=None, sort_parameters=True,
+                 normalize_encoding=True, normalize_path=True, index_pages=INDEX_PAGES, lowercase_path=False,
+                 rewrite_rules=(), honor_canonical_link=True):
+        """Initiate the canonicalizer.
+
+        Args:
+            drop_parameters (iterable): The shell-style patterns of the names of the query
+                parameters to drop, case-insensitive. Defaults to TRACKING_PARAMETERS.
+            keep_parameters (iterable): The patterns of the names of the only query
+                parameters to keep, if set. Defaults to keeping all but the dropped ones.
+            sort_parameters (bool): Whether to sort the query parameters. Defaults to True.
+            normalize_encoding (bool): Whether to decode the escaped unreserved characters,
+                uppercase the other escapes and escape the characters that need it. Defaults to True.
+            normalize_path (bool): Whether to remove the dot and empty segments, the index
+                pages and the trailing slash of the path. Defaults to True.
+            index_pages (iterable): The index page names, case-insensitive. Defaults to INDEX_PAGES.
+            lowercase_path (bool): Whether to lowercase the path, for case-insensitive
+                servers. Defaults to False.
+            rewrite_rules (iterable): The (regex, replacement) pairs to substitute
+                in the canonical relative URLs, in order, as re.sub() does.
+            honor_canonical_link (bool): Whether the validator reads the <link rel="canonical">
+                of each page visited, one more round trip per page. Defaults to True.
+        """
+        self._drop_match = self._compile_names(drop_parameters)
+        self._keep_match = self._compile_names(keep_parameters) if keep_parameters is not None else None
+        self.sort_parameters = sort_parameters
+        self.normalize_encoding = normalize_encoding
+        self.normalize_path = normalize_path
+        self.index_pages = frozenset(page.lower() for page in index_pages)
+        self.lowercase_path = lowercase_path
+        self.rewrite_rules = [(re.compile(pattern), replacement) for pattern, replacement in rewrite_rules]
+        self.honor_canonical_link = honor_canonical_link
+        self.visits_avoided = 0  # The visits avoided by canonicalization.
+        self._variants = set()  # The variants found of the canonical URLs.
+        self._reached_by_variant = set()  # The canonical URLs first reached through a variant.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _compile_names(patterns):
+        patterns = list(patterns or ())
+        if not patterns:
+            return lambda name: False
+        return re.compile('|'.join(fnmatch.translate(pattern.lower()) for pattern in patterns)).match
+
+    def canonicalize(self, url):
+        """Returns the canonical form of a relative URL.
+
+        Example:
+            >>> print(UrlCanonicalizer().canonicalize('/a/./b/index.html?utm_source=x&b=2&a=%7e1'))
+            "/a/b?a=~1&b=2"
+
+        Args:
+            url (str): The relative URL, e.g. '/products?id=1'.
+
+        Returns:
+            str: The canonical relative URL.
+        """
+        url, hash_sign, fragment = url.partition('#')
+        path, question_mark, query = url.partition('?')
+        if ';' in path:
+            path = '/'.join(self._strip_path_parameters(segment) for segment in path.split('/'))
+        if self.normalize_encoding:
+            path = self._normalize_escapes(path, "/;:@!$&'()*+,=")
+        if self.normalize_path:
+            path = self._normalize_path(path)
+        if self.lowercase_path:
+            path = path.lower()
+        if question_mark:
+            parameters = [parameter for parameter in query.split('&') if parameter and self._keeps(parameter)]
+            if self.normalize_encoding:
+                parameters = [self._normalize_escapes(parameter, ":@!$'()*+,;=/?") for parameter in parameters]
+            if self.sort_parameters:
+                parameters.sort()
+            query = '&'.join(parameters)
+        url = path + ('?' + query if query else '') + hash_sign + fragment
+        for pattern, replacement in self.rewrite_rules:
+            url = pattern.sub(replacement, url)
+        return url
+
+    def _keeps(self, parameter):
+        """Checks whether a query parameter is kept."""
+        name = PERCENT_ESCAPE_PATTERN.sub(lambda match: chr(int(match.group(1), 16)),
+                                          parameter.split('=', 1)[0]).lower()
+        if self._keep_match is not None:
+            return self._keep_match(name) is not None
+        return not self._drop_match(name)
+
+    def _strip_path_parameters(self, segment):
+        """Removes the dropped parameters of a path segment, e.g. ';jsessionid=...'."""
+        name, *parameters = segment.split(';')
+        return ';'.join([name] + [parameter for parameter in parameters if self._keeps(parameter)])
+
+    @staticmethod
+    def _normalize_escapes(text, safe):
+        """Decodes the escaped unreserved characters, uppercases the other escapes
+        and escapes the characters outside of the safe ones."""
+        def normalize(match):
+            character = chr(int(match.group(1), 16))
+            return character if character in UNRESERVED_CHARACTERS else '%' + match.group(1).upper()
+        return quote(PERCENT_ESCAPE_PATTERN.sub(normalize, text), safe=safe + '%')
+
+    def _normalize_path(self, path):
+        """Removes the dot segments, the empty segments, the index page and the trailing slash."""
+        if not path:
+            return path
+        segments = []
+        for segment in path.split('/'):
+            if segment == '..':
+                if segments:
+                    segments.pop()
+            elif segment not in ('', '.'):
+                segments.append(segment)
+        if segments and segments[-1].lower() in self.index_pages:
+            segments.pop()
+        return '/' + '/'.join(segments) if segments else ''
+
+    def record_link(self, raw_url, url, seen):
+        """Counts the visits avoided by the canonicalization of a link found in a page.
+
+        Args:
+            raw_url (str): The relative URL of the link before canonicalization.
+            url (str): The canonical relative URL.
+            seen (bool): Whether the canonical URL was visited or queued already.
+        """
+        with self._lock:
+            if raw_url == url:
+                if url in self._reached_by_variant:
+                    # The canonical URL itself, after a variant of it.
+                    self._reached_by_variant.discard(url)
+                    self.visits_avoided += 1
+                return
+            if raw_url in self._variants:
+                return
+            self._variants.add(raw_url)
+            if seen:
+                self.visits_avoided += 1
+            else:
+                self._reached_by_variant.add(url)
+
+    def record_canonical_link(self, url, queued):
+        """Counts the visit avoided by the URL a page declares as canonical,
+        which is marked as visited instead of being visited.
+
+        Args:
+            url (str): The canonical relative URL, not visited yet.
+            queued (bool): Whether the canonical URL is queued, i.e. its visit is avoided.
+        """
+        with self._lock:
+            if queued:
+                self.visits_avoided += 1
+            else:
+                # Reached through a variant, the page declaring it.
+                self._reached_by_variant.add(url)
+
+
+# Returns the canonical URL of the current page, if it declares one.
+CANONICAL_URL_SCRIPT = """
+var link = document.querySelector('link[rel~="canonical" i][href]');
+return link ? link.href : null;
+"""
+
+# Returns the document readiness, the milliseconds since the last resource
+# finished loading and the number of resources loaded.
+READINESS_SCRIPT = """
+var entries = performance.getEntriesByType('resource');
+var last = 0;
+for (var i = 0; i < entries.length; i++) {
+    last = Math.max(last, entries[i].responseEnd);
+}
+return [document.readyState, performance.now() - last, entries.length];
+"""
+
+
+class LinksView(Sequence):
+    """A read-only, ordered view of the links held by a LinkFrontier.
+
+    Membership checks are answered by the frontier's hash set when
+    one is given, so `link in view` stays O(1).
+    """
+
+    def __init__(self, links, lookup=None):
+        """Initiate the view.
+
+        Args:
+            links (list|deque): The ordered container to expose.
+            lookup (set): Optional set to answer membership checks with.
+        """
+        self._links = links
+        self._lookup = lookup
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._links)[index]
+        return self._links[index]
+
+    def __len__(self):
+        return len(self._links)
+
+    def __iter__(self):
+        return iter(self._links)
+
+    def __contains__(self, link):
+        if self._lookup is not None:
+            return link in self._lookup
+        return link in self._links
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self._links))
+
+
+class MemoryVisitedSet(Sequence):
+    """The visited links in memory, in visit order, mirrored in a hash set.
+    Exact, and the default visited set of a LinkFrontier.
+
+    Visited sets are sequences of the links in visit order that also
+    provide add(link), returning whether the link was added, discard(link),
+    clear() and close(). They are used under the lock of their frontier.
+    """
+
+    def __init__(self):
+        """Initiate the set."""
+        self._links = []
+        self._lookup = set()
+
+    def add(self, link):
+        """Adds a link, unless it has been added already.
+
+        Returns:
+            bool: True if the link was added.
+        """
+        if link in self._lookup:
+            return False
+        self._links.append(link)
+        self._lookup.add(link)
+        return True
+
+    def discard(self, link):
+        """Removes a link, if added. Takes linear time."""
+        if link in self._lookup:
+            self._lookup.discard(link)
+            self._links.remove(link)
+
+    def __contains__(self, link):
+        return link in self._lookup
+
+    def __getitem__(self, index):
+        return self._links[index]
+
+    def __len__(self):
+        return len(self._links)
+
+    def __iter__(self):
+        return iter(self._links)
+
+    def clear(self):
+        """Removes all the links."""
+        self._links.clear()
+        self._lookup.clear()
+
+    def close(self):
+        """Releases the resources of the set, none in memory."""
+
+
+class BloomVisitedSet(Sequence):
+    """The visited links as a Bloom filter, in a fixed amount of memory
+    (about 1.8 bytes per link for a 0.1% false-positive rate).
+
+    Up to `capacity` links, a link not visited is wrongly reported as
+    visited, and therefore skipped, with a probability of at most
+    `error_rate`; visited links are always reported as visited.
+    The links themselves are not kept, so they can be counted
+    and checked but not listed.
+    """
+
+    def __init__(self, capacity=10000000, error_rate=0.001):
+        """Initiate the set.
+
+        Args:
+            capacity (int): The number of links expected. Defaults to 10000000.
+            error_rate (float): The false-positive rate at capacity. Defaults to 0.001.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+        self._count = 0
+
+    def _positions(self, link):
+        # Double hashing: the positions are h1 + i * h2 for two 64-bit hashes.
+        digest = hashlib.blake2b(link.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, link):
+        """Adds a link, unless it is reported as added already.
+
+        Returns:
+            bool: True if the link was added.
+        """
+        bits = self._bits
+        added = False
+        for position in self._positions(link):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                added = True
+        self._count += added
+        return added
+
+    def discard(self, link):
+        """Links cannot be removed from a Bloom filter.
+
+        Raises:
+            TypeError: Always.
+        """
+        raise TypeError('A BloomVisitedSet cannot remove links')
+
+    def __contains__(self, link):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(link))
+
+    def __getitem__(self, index):
+        raise TypeError('A BloomVisitedSet does not keep the links')
+
+    def __iter__(self):
+        raise TypeError('A BloomVisitedSet does not keep the links')
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """Removes all the links."""
+        self._bits = bytearray(len(self._bits))
+        self._count = 0
+
+    def close(self):
+        """Releases the resources of the set, none besides its memory."""
+
+
+class SqliteVisitedSet(Sequence):
+    """The visited links in an SQLite database on disk, in visit order.
+    Exact, with the memory used bounded by the database page cache.
+
+    The links added are written in batches; the pending ones are
+    kept in memory and checked first.
+    """
+
+    def __init__(self, path=None, batch_size=1000, cache_size_kb=65536):
+        """Initiate the set.
+
+        Args:
+            path (str): The path of the database. Defaults to a temporary
+                file removed on close().
+            batch_size (int): The links to add before writing them. Defaults to 1000.
+            cache_size_kb (int): The size of the page cache in KiB. Defaults to 65536.
+        """
+        self.temporary = path is None
+        if path is None:
+            descriptor, path = tempfile.mkstemp(suffix='.sqlite')
+            os.close(descriptor)
+        self.path = path
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=OFF')
+        self._connection.execute('PRAGMA cache_size=-%d' % cache_size_kb)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS visited_links '
+                                     '(seq INTEGER PRIMARY KEY, link TEXT UNIQUE)')
+        self._count = self._connection.execute('SELECT COUNT(*) FROM visited_links').fetchone()[0]
+        self._pending = {}  # The links added and not written yet, in order.
+        self._lock = threading.Lock()
+
+    def _stored(self, link):
+        return self._connection.execute('SELECT 1 FROM visited_links WHERE link = ?', (link,)).fetchone() is not None
+
+    def add(self, link):
+        """Adds a link, unless it has been added already.
+
+        Returns:
+            bool: True if the link was added.
+        """
+        with self._lock:
+            if link in self._pending or self._stored(link):
+                return False
+            self._pending[link] = None
+            self._count += 1
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+            return True
+
+    def discard(self, link):
+        """Removes a link, if added."""
+        with self._lock:
+            if link in self._pending:
+                del self._pending[link]
+                self._count -= 1
+                return
+            with self._connection:
+                self._count -= self._connection.execute('DELETE FROM visited_links WHERE link = ?', (link,)).rowcount
+
+    def _flush(self):
+        with self._connection:
+            self._connection.executemany('INSERT INTO visited_links (link) VALUES (?)',
+                                         ((link,) for link in self._pending))
+        self._pending.clear()
+
+    def __contains__(self, link):
+        with self._lock:
+            return link in self._pending or self._stored(link)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('SqliteVisitedSet index out of range')
+        with self._lock:
+            self._flush()
+            row = self._connection.execute('SELECT link FROM visited_links ORDER BY seq LIMIT 1 OFFSET ?',
+                                           (index,)).fetchone()
+        return row[0]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        with self._lock:
+            self._flush()
+            links = self._connection.execute('SELECT link FROM visited_links ORDER BY seq')
+        for row in links:
+            yield row[0]
+
+    def clear(self):
+        """Removes all the links."""
+        with self._lock:
+            self._pending.clear()
+            with self._connection:
+                self._connection.execute('DELETE FROM visited_links')
+            self._count = 0
+
+    def close(self):
+        """Closes the database, removing it if temporary."""
+        with self._lock:
+            self._flush()
+            self._connection.close()
+        if self.temporary:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+
+class LinkFrontier:
+    """The crawl frontier: the links left to visit and the links visited.
+
+    The queue is a deque and both states are mirrored in hash sets,
+    so enqueueing, dequeueing and visited checks are all O(1).
+    A link is only enqueued once while it is queued, being visited
+    by a worker or visited.
+
+    All the methods are thread-safe, so one frontier can be shared
+    by several workers (see claim() and release()).
+
+    The visited links are kept in memory by default. For very large
+    crawls, a BloomVisitedSet bounds the memory used at the cost of
+    a small false-positive rate, and a SqliteVisitedSet keeps them
+    exactly on disk.
+    """
+
+    def __init__(self, visited=None):
+        """Initiate the frontier.
+
+        Args:
+            visited: The visited set, e.g. a BloomVisitedSet. Defaults to a MemoryVisitedSet.
+        """
+        self._queue = deque()  # The links left to be visited, in FIFO order.
+        self._queued = set()  # The same links, for O(1) lookups.
+        self._in_flight = set()  # The links claimed by a worker and not released yet.
+        self._visited = visited if visited is not None else MemoryVisitedSet()  # The visited links.
+        self._condition = threading.Condition()
+        self.journal = None  # A list to append the ('push'|'visit'|'unvisit', link) changes to, if set.
+
+    @property
+    def to_visit(self):
+        """A read-only view of the links left to be visited."""
+        return LinksView(self._queue, self._queued)
+
+    @property
+    def visited(self):
+        """A read-only view of the visited links, in the order visited."""
+        return LinksView(self._visited, self._visited)
+
+    def push(self, link):
+        """Adds a link to the end of the queue, unless it is
+        already queued, in flight or has been visited.
+
+        Args:
+            link (str): The relative URL to enqueue.
+
+        Returns:
+            bool: True if the link was enqueued, False if it was a duplicate.
+        """
+        with self._condition:
+            if link in self._queued or link in self._visited or link in self._in_flight:
+                return False
+            self._enqueue(link)
+            self._queued.add(link)
+            if self.journal is not None:
+                self.journal.append(('push', link))
+            self._condition.notify()
+            return True
+
+    def pop(self):
+        """Removes and returns the next link to visit.
+
+        Returns:
+            str: The next relative URL in the queue.
+
+        Raises:
+            IndexError: If there are no links left to visit.
+        """
+        with self._condition:
+            link = self._dequeue()
+            self._queued.discard(link)
+            return link
+
+    def claim(self, block=True):
+        """Removes and returns the next link to visit and marks it as in flight,
+        waiting while the queue is empty but other workers may still add links.
+
+        Every claimed link must be passed to release() once processed.
+
+        Args:
+            block (bool): Whether to wait while the queue is empty and
+                links are in flight. Defaults to True.
+
+        Returns:
+            str|None: The next relative URL in the queue or None when
+                the queue is empty and no link is in flight anymore
+                (or, when not blocking, just when the queue is empty).
+        """
+        with self._condition:
+            while not self._queued:
+                if not self._in_flight or not block:
+                    return None
+                self._condition.wait()
+            link = self._dequeue()
+            self._queued.discard(link)
+            self._in_flight.add(link)
+            return link
+
+    def _enqueue(self, link):
+        """Adds a link to the queue, under the lock."""
+        self._queue.append(link)
+
+    def _dequeue(self):
+        """Removes and returns the next link of the queue, under the lock.
+
+        Raises:
+            IndexError: If the queue is empty.
+        """
+        return self._queue.popleft()
+
+    def release(self, link):
+        """Marks a claimed link as no longer in flight.
+
+        Args:
+            link (str): The relative URL returned by claim().
+        """
+        with self._condition:
+            self._in_flight.discard(link)
+            if not self._in_flight:
+                # Wake up the workers waiting in claim() so they can stop.
+                self._condition.notify_all()
+
+    def mark_visited(self, link):
+        """Records a link as visited.
+
+        Args:
+            link (str): The relative URL visited.
+        """
+        with self._condition:
+            if not self._visited.add(link):
+                return
+            if self.journal is not None:
+                self.journal.append(('visit', link))
+
+    def requeue(self, link):
+        """Moves a visited or claimed link back to the end of the queue, to visit it again.
+
+        Args:
+            link (str): The relative URL.
+
+        Returns:
+            bool: True if the link was requeued, False if the visited set
+                cannot remove links (i.e. a BloomVisitedSet).
+        """
+        with self._condition:
+            if link in self._visited:
+                try:
+                    self._visited.discard(link)
+                except TypeError:
+                    return False
+                if self.journal is not None:
+                    self.journal.append(('unvisit', link))
+            self._in_flight.discard(link)
+            self.push(link)
+            return True
+
+    def is_visited(self, link):
+        """Checks whether a link has been visited already or not.
+
+        Args:
+            link (str): The relative URL to check.
+
+        Returns:
+            bool: Whether the link is visited or not.
+        """
+        return link in self._visited
+
+    def is_queued(self, link):
+        """Checks whether a link is waiting to be visited.
+
+        Args:
+            link (str): The relative URL to check.
+
+        Returns:
+            bool: Whether the link is queued or not.
+        """
+        return link in self._queued
+
+    def reset_to_visit(self, links=()):
+        """Replaces the queue with the given links.
+
+        Args:
+            links (iterable): The relative URLs to enqueue, in order.
+        """
+        with self._condition:
+            self._queue.clear()
+            self._queued.clear()
+            for link in links:
+                self.push(link)
+
+    def reset_visited(self, links=()):
+        """Replaces the visited links with the given ones.
+
+        Args:
+            links (iterable): The relative URLs visited, in order.
+        """
+        with self._condition:
+            self._visited.clear()
+            for link in links:
+                self.mark_visited(link)
+
+    def __len__(self):
+        return len(self._queued)
+
+    def __bool__(self):
+        return bool(self._queued)
+
+
+class LinkScorer:
+    """Scores the links of a PriorityFrontier, the lowest score being visited first.
+
+    The score is the depth of the link from the starting URL, lowered for
+    the links matching a regex, the pages that changed or failed recently
+    according to a CrawlHistory, and the links found in many pages.
+    """
+
+    def __init__(self, depth_weight=1.0, regex='', regex_weight=5.0, history=None, recency_weight=5.0,
+                 recency_half_life=7 * 86400, inbound_weight=1.0):
+        """Initiate the scorer.
+
+        Args:
+            depth_weight (float): The score of each level of depth. Defaults to 1.
+            regex (str): The regex of the relative URLs to visit first, e.g. a narrower
+                one than regex_to_check. Defaults to none.
+            regex_weight (float): The score taken off the links matching the regex. Defaults to 5.
+            history (CrawlHistory): The times the pages last changed or failed. Defaults to none.
+            recency_weight (float): The score taken off a page that changed or failed just now,
+                halving every recency_half_life seconds. Defaults to 5.
+            recency_half_life (float): The seconds. Defaults to a week.
+            inbound_weight (float): The score taken off per doubling of the pages
+                linking to a link. Defaults to 1.
+        """
+        self.depth_weight = depth_weight
+        self.regex = re.compile(regex) if regex else None
+        self.regex_weight = regex_weight
+        self.history = history
+        self.recency_weight = recency_weight
+        self.recency_half_life = recency_half_life
+        self.inbound_weight = inbound_weight
+
+    def __call__(self, link, depth, inbound):
+        """Scores a link.
+
+        Args:
+            link (str): The relative URL.
+            depth (int): The depth of the link from the starting URL.
+            inbound (int): The number of pages found linking to it so far.
+
+        Returns:
+            float: The score.
+        """
+        score = self.depth_weight * depth - self.inbound_weight * math.log2(inbound)
+        if self.regex is not None and self.regex.match(link):
+            score -= self.regex_weight
+        if self.history is not None:
+            last_event = self.history.last_event(link)
+            if last_event is not None:
+                age = max(time() - last_event, 0)
+                score -= self.recency_weight * 0.5 ** (age / self.recency_half_life)
+        return score
+
+
+class PriorityFrontier(LinkFrontier):
+    """A frontier visiting the links in the order of their score instead of FIFO.
+
+    The queue is a heap of [score, sequence, link] entries, the sequence
+    keeping the links of equal score in FIFO order. A link found again
+    while queued is scored again with one more inbound link; its previous
+    entry is left in the heap and skipped when popped.
+
+    The depth of a link is the depth of the page being validated by the
+    thread pushing it plus one. The links pushed outside of a page, e.g.
+    the ones seeded from the sitemaps or restored from a checkpoint, are
+    at depth 1, or 0 before any link is visited.
+    """
+
+    def __init__(self, scorer=None, max_depth=None, visited=None):
+        """Initiate the frontier.
+
+        Args:
+            scorer (callable): Returns the score of a link given the link, its depth and
+                its inbound link count, e.g. a LinkScorer. Defaults to LinkScorer().
+            max_depth (int): The depth past which the links are not visited. Defaults to no limit.
+            visited: The visited set. Defaults to a MemoryVisitedSet.
+        """
+        super().__init__(visited)
+        self._queue = []  # The heap of the [score, sequence, link] entries of the links to visit.
+        self._entries = {}  # The current entry of each link in the heap.
+        self._depths = {}  # The depth of each queued link.
+        self._inbound = {}  # The number of pages linking to each queued link.
+        self._sequence = 0
+        self._local = threading.local()  # The link being validated by each thread and its depth.
+        self.scorer = scorer if scorer is not None else LinkScorer()
+        self.max_depth = max_depth
+        self.beyond_max_depth = set()  # The links not queued for being deeper than max_depth.
+
+    @property
+    def to_visit(self):
+        """A read-only view of the links left to be visited, in order of priority."""
+        with self._condition:
+            return LinksView([entry[2] for entry in sorted(self._entries.values())], self._queued)
+
+    def push(self, link):
+        """Adds a link to the queue with its score, like LinkFrontier.push(),
+        or scores a queued link again with one more inbound link.
+
+        Returns:
+            bool: True if the link was enqueued, False if it was a duplicate or beyond max_depth.
+        """
+        with self._condition:
+            depth = self._push_depth(link)
+            if link in self._queued:
+                self._inbound[link] += 1
+                self._depths[link] = min(self._depths[link], depth)
+                self._add_entry(link)
+                return False
+            if self.max_depth is not None and depth > self.max_depth:
+                if link not in self._visited and link not in self._in_flight:
+                    self.beyond_max_depth.add(link)
+                return False
+            if not super().push(link):
+                return False
+            # Found deeper first, now within the max depth.
+            self.beyond_max_depth.discard(link)
+            return True
+
+    def _push_depth(self, link):
+        """Returns the depth of a link pushed by the current thread."""
+        if link == getattr(self._local, 'link', None):
+            # The link being validated, requeued.
+            return self._local.depth
+        depth = getattr(self._local, 'depth', None)
+        if depth is None:
+            return 1 if len(self._visited) else 0
+        return depth + 1
+
+    def _add_entry(self, link):
+        """Pushes an entry with the current score of a link to the heap, under the lock."""
+        self._sequence += 1
+        entry = [self.scorer(link, self._depths[link], self._inbound[link]), self._sequence, link]
+        self._entries[link] = entry
+        heapq.heappush(self._queue, entry)
+        if len(self._queue) > 2 * len(self._entries) + 1000:
+            # Drop the entries replaced by newer ones.
+            self._queue = list(self._entries.values())
+            heapq.heapify(self._queue)
+
+    def _enqueue(self, link):
+        self._depths[link] = self._push_depth(link)
+        self._inbound[link] = 1
+        self._add_entry(link)
+
+    def _dequeue(self):
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            link = entry[2]
+            if self._entries.get(link) is entry:
+                del self._entries[link]
+                del self._inbound[link]
+                self._local.link = link
+                self._local.depth = self._depths.pop(link)
+                return link
+        raise IndexError('pop from an empty frontier')
+
+    def reset_to_visit(self, links=()):
+        with self._condition:
+            self._entries.clear()
+            self._depths.clear()
+            self._inbound.clear()
+            super().reset_to_visit(links)
+
+
+class LinkGraph:
+    """The graph of the links between pages found during a crawl.
+
+    The URLs are interned to integer IDs and the links stored as pairs of
+    IDs in an array, 8 bytes each, optionally spilled to a file past a
+    threshold. The queries build compressed sparse row indexes of the
+    links in both directions, 4 bytes per link each, reading the spilled
+    links in chunks. The links added afterwards are kept in adjacency
+    lists next to the indexes, which are rebuilt once these outnumber the
+    indexed links or reach the spill threshold.
+
+    All the methods are thread-safe.
+    """
+
+    def __init__(self, spill_path=None, spill_threshold=1000000):
+        """Initiate the graph.
+
+        Args:
+            spill_path (str): The path of the file to spill the links to, if any.
+            spill_threshold (int): The number of links to keep in memory
+                before spilling them. Defaults to 1000000.
+        """
+        self.spill_path = spill_path
+        self.spill_threshold = spill_threshold
+        self.link_count = 0
+        self._ids = {}  # The ID of each URL.
+        self._urls = []  # The URL of each ID.
+        self._links = array('I')  # The (source, target) IDs of the links not spilled, interleaved.
+        self._spill = open(spill_path, 'w+b') if spill_path is not None else None
+        self._lock = threading.Lock()
+        self._index = None  # The (forward, backward) indexes, until too many links are added.
+        self._indexed = 0  # The number of links in the indexes.
+        self._pending = ({}, {})  # The IDs linked from and to each ID by the links not indexed.
+        self._depths = {}  # The depth of each ID from a start ID, by start ID, until links are added.
+
+    def _intern(self, url):
+        url_id = self._ids.get(url)
+        if url_id is None:
+            url_id = self._ids[url] = len(self._urls)
+            self._urls.append(url)
+        return url_id
+
+    def add_links(self, source, targets):
+        """Records the links of a page.
+
+        Args:
+            source (str): The URL of the page.
+            targets (iterable): The distinct URLs it links to. Links to itself are skipped.
+        """
+        with self._lock:
+            source_id = self._intern(source)
+            for target in targets:
+                if target != source:
+                    target_id = self._intern(target)
+                    self._links.append(source_id)
+                    self._links.append(target_id)
+                    self.link_count += 1
+                    if self._index is not None:
+                        self._pending[0].setdefault(source_id, []).append(target_id)
+                        self._pending[1].setdefault(target_id, []).append(source_id)
+            if self._index is not None and self.link_count - self._indexed > min(self._indexed, self.spill_threshold):
+                # Rebuild the indexes on the next query.
+                self._index = None
+                self._pending = ({}, {})
+            self._depths.clear()
+            if self._spill is not None and len(self._links) >= 2 * self.spill_threshold:
+                self._links.tofile(self._spill)
+                self._links = array('I')
+
+    def __len__(self):
+        """Returns the number of URLs."""
+        return len(self._urls)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def _iter_links(self):
+        """Yields all the links in arrays of interleaved IDs, the spilled ones
+        read in chunks of at most spill_threshold links."""
+        if self._spill is not None:
+            self._spill.flush()
+            self._spill.seek(0)
+            while True:
+                # Read into the array, without an intermediate bytes object.
+                chunk = array('I', [0]) * (2 * self.spill_threshold)
+                size = self._spill.readinto(chunk)
+                if not size:
+                    break
+                del chunk[size // chunk.itemsize:]
+                yield chunk
+                del chunk
+        yield self._links
+
+    def _build_index(self):
+        """Returns the (forward, backward) indexes, building them if needed.
+
+        Each index is the offsets and the IDs of the links grouped by ID, where
+        the IDs linked from (or to) ID k are grouped[offsets[k]:offsets[k + 1]].
+        """
+        if self._index is not None:
+            return self._index
+        size = len(self._urls)
+        forward_offsets, backward_offsets = array('I', [0]) * (size + 1), array('I', [0]) * (size + 1)
+        # Count the links of each ID, then sum the counts into the offsets.
+        for chunk in self._iter_links():
+            ids = iter(chunk)
+            for source, target in zip(ids, ids):
+                forward_offsets[source + 1] += 1
+                backward_offsets[target + 1] += 1
+            # Free the chunk before the next one is read, like _iter_links() does.
+            del chunk, ids
+        for offsets in (forward_offsets, backward_offsets):
+            for key in range(1, size + 1):
+                offsets[key] += offsets[key - 1]
+        # Place each link after the ones found before it of the same ID.
+        forward_next, backward_next = forward_offsets[:-1], backward_offsets[:-1]
+        forward, backward = array('I', [0]) * self.link_count, array('I', [0]) * self.link_count
+        for chunk in self._iter_links():
+            ids = iter(chunk)
+            for source, target in zip(ids, ids):
+                forward[forward_next[source]] = target
+                forward_next[source] += 1
+                backward[backward_next[target]] = source
+                backward_next[target] += 1
+            del chunk, ids
+        if self._spill is not None:
+            self._spill.seek(0, 2)
+        self._index = ((forward_offsets, forward), (backward_offsets, backward))
+        self._indexed = self.link_count
+        self._pending = ({}, {})
+        return self._index
+
+    def _neighbour_ids(self, url_id, direction):
+        """Returns the IDs linked from (direction 0) or to (direction 1) an ID, in the order found."""
+        offsets, grouped = self._build_index()[direction]
+        # The IDs interned after the indexes were built have only pending links.
+        ids = grouped[offsets[url_id]:offsets[url_id + 1]] if url_id + 1 < len(offsets) else []
+        pending = self._pending[direction].get(url_id)
+        return list(ids) + pending if pending else ids
+
+    def links(self, url):
+        """Returns the URLs a page links to.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            list: The URLs, in the order found.
+        """
+        return self._neighbours(url, 0)
+
+    def referrers(self, url):
+        """Returns the pages linking to a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            list: The URLs of the pages, in the order found.
+        """
+        return self._neighbours(url, 1)
+
+    def _neighbours(self, url, direction):
+        with self._lock:
+            url_id = self._ids.get(url)
+            if url_id is None:
+                return []
+            return [self._urls[other] for other in self._neighbour_ids(url_id, direction)]
+
+    def depth(self, url, start):
+        """Returns the least number of links to follow from a page to reach a URL.
+
+        Args:
+            url (str): The URL.
+            start (str): The URL of the page to start from, e.g. the starting URL.
+
+        Returns:
+            int|None: The depth, or None if the URL cannot be reached.
+        """
+        with self._lock:
+            url_id, start_id = self._ids.get(url), self._ids.get(start)
+            if url_id is None or start_id is None:
+                return None
+            depths = self._depths.get(start_id)
+            if depths is None:
+                depths = self._depths[start_id] = self._breadth_first(start_id)
+            return depths[url_id] if depths[url_id] >= 0 else None
+
+    def _breadth_first(self, start_id):
+        """Returns the depth of each ID from a start ID, -1 if unreachable."""
+        depths = array('i', [-1]) * len(self._urls)
+        depths[start_id] = 0
+        level = [start_id]
+        depth = 0
+        while level:
+            depth += 1
+            next_level = []
+            for source in level:
+                for target in self._neighbour_ids(source, 0):
+                    if depths[target] < 0:
+                        depths[target] = depth
+                        next_level.append(target)
+            level = next_level
+        return depths
+
+    def close(self):
+        """Closes the spill file, if any."""
+        if self._spill is not None:
+            self._spill.close()
+
+
+class CrawlCheckpoint:
+    """Persists the frontier of a crawl in an SQLite database (in WAL mode),
+    so that an interrupted crawl can be resumed where it stopped.
+
+    The frontier journals its changes in memory and they are written
+    in batches, in one transaction, every `interval` seconds or every
+    `batch_size` changes, so the crawl does not wait for the disk on
+    every page. Links being visited when the crawl stopped, or that
+    failed to load, are visited again when resumed. Once a crawl
+    completes, the checkpoint is cleared so the next one starts over.
+    """
+
+    def __init__(self, path, interval=5.0, batch_size=1000):
+        """Initiate the checkpoint, creating the database if needed.
+
+        Args:
+            path (str): The path of the SQLite database.
+            interval (float): The seconds between writes. Defaults to 5.
+            batch_size (int): The changes that trigger a write before
+                the interval passes. Defaults to 1000.
+        """
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS frontier (seq INTEGER PRIMARY KEY, link TEXT UNIQUE)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS visited (seq INTEGER PRIMARY KEY, link TEXT UNIQUE)')
+        self._lock = threading.Lock()
+        self._journal = []
+        self._last_flush = monotonic()
+
+    def attach(self, frontier):
+        """Restores the saved state into the frontier and starts journaling its changes.
+
+        Args:
+            frontier (LinkFrontier): The frontier of the crawl.
+
+        Returns:
+            bool: True if a saved state was restored, i.e. the crawl is resumed.
+        """
+        frontier.journal = None
+        visited = [row[0] for row in self._connection.execute('SELECT link FROM visited ORDER BY seq')]
+        to_visit = [row[0] for row in self._connection.execute('SELECT link FROM frontier ORDER BY seq')]
+        resumed = bool(visited or to_visit)
+        if resumed:
+            frontier.reset_visited(visited)
+            frontier.reset_to_visit(to_visit)
+        self._journal = frontier.journal = []
+        self._last_flush = monotonic()
+        return resumed
+
+    def maybe_flush(self):
+        """Writes the journaled changes if the interval has passed or the batch is full."""
+        if len(self._journal) >= self.batch_size or monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Writes the journaled changes in one transaction."""
+        with self._lock:
+            # Swap the journal in place, the frontier keeps appending to the same list.
+            changes = self._journal[:]
+            del self._journal[:len(changes)]
+            self._last_flush = monotonic()
+            if not changes:
+                return
+            with self._connection:
+                # Apply the runs of changes of the same kind in order, a link may be visited again.
+                for operation, run in groupby(changes, key=itemgetter(0)):
+                    links = [(link,) for _, link in run]
+                    if operation == 'push':
+                        self._connection.executemany('INSERT OR IGNORE INTO frontier (link) VALUES (?)', links)
+                    elif operation == 'visit':
+                        self._connection.executemany('INSERT OR IGNORE INTO visited (link) VALUES (?)', links)
+                        self._connection.executemany('DELETE FROM frontier WHERE link = ?', links)
+                    else:
+                        self._connection.executemany('DELETE FROM visited WHERE link = ?', links)
+
+    def clear(self):
+        """Discards the saved state and the journaled changes, once the crawl completes."""
+        with self._lock:
+            del self._journal[:]
+            self._last_flush = monotonic()
+            with self._connection:
+                self._connection.execute('DELETE FROM frontier')
+                self._connection.execute('DELETE FROM visited')
+
+    def close(self):
+        """Writes any pending changes and closes the database."""
+        self.flush()
+        self._connection.close()
+
+
+# The state of a page stored by IncrementalCache. The errors are the (kind, message)
+# pairs of the issues of the page in ERROR_KINDS, None for the pages stored without.
+PageRecord = namedtuple('PageRecord', ['url', 'etag', 'last_modified', 'content_hash', 'hrefs', 'valid',
+                                       'status_code', 'errors'])
+
+
+class IncrementalCache:
+    """Stores the HTTP validators (ETag and Last-Modified), a hash of the content,
+    the links and the validation result of every page in an SQLite database,
+    so that pages unchanged since the previous run are not rendered again.
+
+    A page is checked with a conditional HTTP request over pooled connections:
+    it is unchanged if the server answers 304 Not Modified, or if the hash of
+    its status, title and the markup of the region holding its links is
+    the stored one.
+    """
+
+    def __init__(self, path, pool=None, batch_size=100):
+        """Initiate the cache, creating the database if needed.
+
+        Args:
+            path (str): The path of the SQLite database.
+            pool (HttpConnectionPool): The connection pool. Defaults to a new one.
+            batch_size (int): The pages to store per transaction. Defaults to 100.
+        """
+        self.path = path
+        self.pool = pool or HttpConnectionPool()
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, '
+                                     'last_modified TEXT, content_hash TEXT, hrefs TEXT, valid INTEGER, '
+                                     'status_code INTEGER, errors TEXT)')
+            columns = {row[1] for row in self._connection.execute('PRAGMA table_info(pages)')}
+            # Add the columns missing from the databases of older versions.
+            for column, column_type in (('status_code', 'INTEGER'), ('errors', 'TEXT')):
+                if column not in columns:
+                    self._connection.execute('ALTER TABLE pages ADD COLUMN ' + column + ' ' + column_type)
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def get(self, url):
+        """Returns the stored state of a page.
+
+        Args:
+            url (str): The absolute URL of the page.
+
+        Returns:
+            PageRecord|None: The stored state or None if the page is not stored.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT url, etag, last_modified, content_hash, hrefs, valid, '
+                                           'status_code, errors FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        errors = None if row[7] is None else [tuple(error) for error in json.loads(row[7])]
+        return PageRecord(row[0], row[1], row[2], row[3], json.loads(row[4]), bool(row[5]), row[6], errors)
+
+    def check(self, url, xpath):
+        """Checks whether a page has changed since it was stored.
+
+        Args:
+            url (str): The absolute URL of the page.
+            xpath (str): The XPath of the 'a' tags of the page.
+
+        Returns:
+            tuple: The stored PageRecord if the page is unchanged, None otherwise,
+                and a PageRecord with the current validators and hash of the page
+                (without hrefs and result) or None if it could not be fetched.
+        """
+        stored = self.get(url)
+        headers = {}
+        if stored is not None and stored.etag:
+            headers['If-None-Match'] = stored.etag
+        if stored is not None and stored.last_modified:
+            headers['If-Modified-Since'] = stored.last_modified
+        try:
+            response = self.pool.fetch(url, headers)
+        except (OSError, http.client.HTTPException, ValueError):
+            return None, None
+        if response.status == 304 and stored is not None:
+            return stored, stored
+        try:
+            region = parse_region_xpath(xpath)
+        except ValueError:
+            region = None
+        extractor = LinkExtractor(region, response.url, digest=True)
+        extractor.feed(response.text)
+        extractor.close()
+        fresh = PageRecord(url, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                           str(response.status) + ':' + extractor.hexdigest(), None, None, None, None)
+        if stored is not None and stored.content_hash == fresh.content_hash:
+            unchanged = stored._replace(etag=fresh.etag, last_modified=fresh.last_modified)
+            if unchanged != stored:
+                self.store(unchanged)
+            return unchanged, fresh
+        return None, fresh
+
+    def store(self, record):
+        """Stores the state of a page. The pages are written in batches.
+
+        Args:
+            record (PageRecord): The state of the page.
+        """
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) < self.batch_size:
+                return
+        self.flush()
+
+    def flush(self):
+        """Writes the pending pages in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, hrefs, valid, '
+                    'status_code, errors) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(record.url, record.etag, record.last_modified, record.content_hash, json.dumps(record.hrefs),
+                      int(record.valid), record.status_code,
+                      None if record.errors is None else json.dumps(record.errors)) for record in pending])
+
+    def close(self):
+        """Writes any pending pages and closes the database."""
+        self.flush()
+        self._connection.close()
+        self.pool.close()
+
+
+class ReadinessWait:
+    """Waits until the current page is ready, instead of for a fixed time.
+
+    The page is ready once document.readyState is 'complete' and the network
+    is idle: no resource has finished loading for `network_idle` seconds
+    and no new resource appeared since the previous poll.
+    """
+
+    def __init__(self, timeout=10, poll_interval=0.05, network_idle=0.5):
+        """Initiate the strategy.
+
+        Args:
+            timeout (float): The maximum seconds to wait. Defaults to 10.
+            poll_interval (float): The seconds between polls. Defaults to 0.05.
+            network_idle (float): The seconds without network activity
+                for the network to be idle. Defaults to 0.5.
+        """
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.network_idle = network_idle
+
+    def wait(self, driver):
+        """Polls the page until it is ready or the timeout expires.
+
+        Drivers that cannot execute scripts (e.g. HttpFastPathDriver)
+        load complete pages, so they are ready at once.
+
+        Args:
+            driver: The selenium webdriver object.
+
+        Returns:
+            bool: True if the page is ready, False if the timeout expired.
+        """
+        if not hasattr(driver, 'execute_script'):
+            return True
+        deadline = monotonic() + self.timeout
+        resources = None
+        while True:
+            try:
+                ready_state, idle_ms, count = driver.execute_script(READINESS_SCRIPT)
+            except WebDriverException:
+                ready_state, idle_ms, count = None, 0, None
+            if ready_state == 'complete' and idle_ms >= self.network_idle * 1000 and count == resources:
+                return True
+            resources = count
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            sleep(min(self.poll_interval, remaining))
+
+
+# The URL patterns of the resources of each type that ValidationProfile can block.
+RESOURCE_TYPE_PATTERNS = {
+    'image': ('*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*', '*.bmp*'),
+    'font': ('*.woff*', '*.ttf*', '*.otf*', '*.eot*'),
+    'media': ('*.mp4*', '*.webm*', '*.ogg*', '*.ogv*', '*.mp3*', '*.wav*', '*.m4a*', '*.mov*', '*.m3u8*'),
+    'stylesheet': ('*.css*',),
+}
+
+# The URL patterns of common analytics and ad services.
+TRACKER_PATTERNS = ('*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+                    '*googlesyndication.com*', '*adservice.google.*', '*connect.facebook.net*', '*hotjar.com*')
+
+
+class ValidationProfile:
+    """A lightweight browser profile for link validation.
+
+    The pages are loaded with an eager page-load strategy, returning once
+    the DOM is ready, and the resources validation never uses (images, fonts,
+    media, analytics and ads) are blocked through the Chrome DevTools Protocol,
+    or through the browser preferences for images if the protocol is not
+    available.
+
+    Example:
+        >>> profile = ValidationProfile(blocked_types=('image', 'media'))
+        >>> validator = SiteAllLinkValidator(webdriver.Chrome(options=profile.chrome_options()), 'w3.org')
+        >>> validator.validation_profile = profile
+    """
+
+    def __init__(self, blocked_types=('image', 'font', 'media'), blocked_patterns=TRACKER_PATTERNS,
+                 page_load_strategy='eager', check_rendering=True):
+        """Initiate the profile.
+
+        Args:
+            blocked_types (iterable): The types of resources to block, out of
+                RESOURCE_TYPE_PATTERNS. Defaults to images, fonts and media.
+            blocked_patterns (iterable): More URL patterns to block, where '*' matches
+                anything. Defaults to the TRACKER_PATTERNS.
+            page_load_strategy (str): The page-load strategy of the browser. Defaults to 'eager'.
+            check_rendering (bool): Whether to reload the pages without any links found with the
+                resources unblocked, to detect pages whose links need them. Defaults to True.
+
+        Raises:
+            ValueError: If a resource type is unknown.
+        """
+        unknown = set(blocked_types) - set(RESOURCE_TYPE_PATTERNS)
+        if unknown:
+            raise ValueError('Unknown resource types: ' + ', '.join(sorted(unknown)))
+        self.blocked_types = tuple(blocked_types)
+        self.blocked_patterns = tuple(blocked_patterns)
+        self.page_load_strategy = page_load_strategy
+        self.check_rendering = check_rendering
+
+    @property
+    def blocked_urls(self):
+        """The URL patterns blocked."""
+        return [pattern for resource_type in self.blocked_types
+                for pattern in RESOURCE_TYPE_PATTERNS[resource_type]] + list(self.blocked_patterns)
+
+    def chrome_options(self, options=None):
+        """Sets the page-load strategy, and blocks the images through the browser
+        preferences, in the options of a Chrome webdriver.
+
+        Args:
+            options (selenium.webdriver.ChromeOptions): The options to update. Defaults to new ones.
+
+        Returns:
+            selenium.webdriver.ChromeOptions: The options.
+        """
+        if options is None:
+            from selenium.webdriver import ChromeOptions
+            options = ChromeOptions()
+        options.set_capability('pageLoadStrategy', self.page_load_strategy)
+        if 'image' in self.blocked_types:
+            prefs = dict(options.experimental_options.get('prefs', {}))
+            prefs['profile.managed_default_content_settings.images'] = 2
+            options.add_experimental_option('prefs', prefs)
+        return options
+
+    def attach(self, driver):
+        """Starts blocking the resources in the browser of a webdriver.
+
+        Args:
+            driver: The selenium webdriver object.
+
+        Returns:
+            bool: True if the resources are blocked, False if the webdriver
+                does not support the Chrome DevTools Protocol.
+        """
+        return self._set_blocked_urls(driver, self.blocked_urls)
+
+    @contextmanager
+    def unblocked(self, driver):
+        """Stops blocking the resources while the context is active.
+
+        Yields:
+            bool: True if the resources are unblocked, False if they cannot be.
+        """
+        if not self._set_blocked_urls(driver, []):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.attach(driver)
+
+    @staticmethod
+    def _set_blocked_urls(driver, urls):
+        execute_cdp_cmd = getattr(driver, 'execute_cdp_cmd', None)
+        if execute_cdp_cmd is None:
+            return False
+        try:
+            execute_cdp_cmd('Network.enable', {})
+            execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+        except WebDriverException:
+            return False
+        return True
+
+
+# The response of the main document of a page load, see NetworkLogCapture. The redirects are
+# the (url, status) of each redirect followed, in order, and the response_time the seconds
+# from sending the request to receiving the response headers, if known.
+NavigationResponse = namedtuple('NavigationResponse', ['url', 'status', 'redirects', 'response_time'])
+
+
+class NetworkLogCapture:
+    """Captures the HTTP status, redirects and timing of each page loaded by
+    Chrome from its performance log, which records the network events of
+    the same navigation, so no extra request is made.
+
+    Example:
+        >>> network_log = NetworkLogCapture()
+        >>> validator = SiteAllLinkValidator(webdriver.Chrome(options=network_log.chrome_options()), 'w3.org')
+        >>> validator.network_log = network_log
+    """
+
+    @staticmethod
+    def chrome_options(options=None):
+        """Enables the performance log in the options of a Chrome webdriver.
+
+        Args:
+            options (selenium.webdriver.ChromeOptions): The options to update. Defaults to new ones.
+
+        Returns:
+            selenium.webdriver.ChromeOptions: The options.
+        """
+        if options is None:
+            from selenium.webdriver import ChromeOptions
+            options = ChromeOptions()
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        return options
+
+    def capture(self, driver, url):
+        """Reads the events logged since the previous call and returns the response of a page load.
+
+        Args:
+            driver: The selenium webdriver object.
+            url (str): The URL loaded.
+
+        Returns:
+            NavigationResponse|None: The response, or None if the webdriver has
+                no performance log or the page load was not found in it.
+        """
+        get_log = getattr(driver, 'get_log', None)
+        if get_log is None:
+            return None
+        try:
+            entries = get_log('performance')
+        except WebDriverException:
+            return None
+        return self.parse(entries, url)
+
+    @staticmethod
+    def parse(entries, url):
+        """Finds the response of a page load in performance log entries.
+
+        Args:
+            entries (list): The entries, whose message is the JSON of a DevTools event.
+            url (str): The URL loaded.
+
+        Returns:
+            NavigationResponse|None: The response, or None if the page load was not found.
+        """
+        url = url.split('#', 1)[0].rstrip('/')
+        request_id = None
+        redirects = []
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+                method, params = message['method'], message['params']
+            except (KeyError, TypeError, ValueError):
+                continue
+            if method == 'Network.requestWillBeSent':
+                if request_id is None:
+                    # The document request of the page load, as opposed to a subframe or a leftover of the previous page.
+                    if (params.get('type') == 'Document' and params.get('requestId') == params.get('loaderId')
+                            and params['request']['url'].split('#', 1)[0].rstrip('/') == url):
+                        request_id = params['requestId']
+                elif params.get('requestId') == request_id and 'redirectResponse' in params:
+                    redirects.append((params['redirectResponse']['url'], params['redirectResponse']['status']))
+            elif method == 'Network.responseReceived' and request_id is not None \
+                    and params.get('requestId') == request_id:
+                response = params['response']
+                timing = response.get('timing') or {}
+                response_time = timing['receiveHeadersEnd'] / 1000 if 'receiveHeadersEnd' in timing else None
+                return NavigationResponse(response['url'], response['status'], redirects, response_time)
+        return None
+
+
+def compile_title_matcher(titles):
+    """Compiles error page titles and patterns into a single matcher.
+
+    The patterns are kept as compiled, with all their flags, and searched in turn.
+
+    Args:
+        titles (str|re.Pattern|iterable): The titles, matched exactly, and the
+            compiled patterns, searched in the title (e.g. re.compile('not found', re.I)).
+
+    Returns:
+        callable: Returns whether a title is any of the titles or matches any of the patterns.
+    """
+    if isinstance(titles, (str, re.Pattern)):
+        titles = [titles]
+    titles = list(titles)
+    exact = frozenset(title for title in titles if not isinstance(title, re.Pattern))
+    patterns = tuple(title for title in titles if isinstance(title, re.Pattern))
+
+    def matcher(title):
+        return title in exact or any(pattern.search(title) for pattern in patterns)
+    return matcher
+
+
+def browser_memory(driver):
+    """Returns the resident memory of the webdriver service and its descendant
+    processes (i.e. the browser) of a local webdriver, on Linux.
+
+    Args:
+        driver: The selenium webdriver object.
+
+    Returns:
+        int|None: The memory in bytes, or None if unknown.
+    """
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None or not os.path.isdir('/proc'):
+        return None
+    total = 0
+    pids = [process.pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open('/proc/%d/status' % pid) as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir('/proc/%d/task' % pid):
+                with open('/proc/%d/task/%s/children' % (pid, task)) as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class DriverSession:
+    """Manages the webdriver of a validator during long crawls.
+
+    The webdriver is recycled, i.e. quit and replaced by a new one from the
+    factory, every `max_pages` pages or once its memory exceeds `max_memory`,
+    and every new one gets page-load and script timeouts. A watchdog kills
+    the session when a page takes longer than `watchdog_timeout` to validate,
+    e.g. because the browser hung; the page is then requeued, to be retried
+    with a new webdriver up to `max_retries` times.
+
+    Example:
+        >>> validator = SiteAllLinkValidator(None, 'w3.org')
+        >>> validator.session = DriverSession(webdriver.Chrome, max_pages=500, max_memory=2 * 2 ** 30)
+    """
+
+    def __init__(self, driver_factory, max_pages=1000, max_memory=None, memory_probe=browser_memory,
+                 memory_check_interval=20, page_load_timeout=60, script_timeout=30, watchdog_timeout=300,
+                 max_retries=2):
+        """Initiate the session.
+
+        Args:
+            driver_factory (callable): Returns a new selenium webdriver object.
+            max_pages (int): The pages to validate with a webdriver before recycling it,
+                if limited. Defaults to 1000.
+            max_memory (int): The memory in bytes past which the webdriver is recycled, if limited.
+            memory_probe (callable): Returns the memory of a webdriver in bytes, or None if unknown.
+                Defaults to browser_memory().
+            memory_check_interval (int): The pages between memory checks. Defaults to 20.
+            page_load_timeout (float): The page-load timeout of the webdrivers in seconds,
+                if limited. Defaults to 60.
+            script_timeout (float): The script timeout of the webdrivers in seconds,
+                if limited. Defaults to 30.
+            watchdog_timeout (float): The seconds a page may take to validate before the session
+                is killed, if limited. Defaults to 300.
+            max_retries (int): The times a page is retried after its session was killed. Defaults to 2.
+        """
+        self.driver_factory = driver_factory
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.memory_probe = memory_probe
+        self.memory_check_interval = memory_check_interval
+        self.page_load_timeout = page_load_timeout
+        self.script_timeout = script_timeout
+        self.watchdog_timeout = watchdog_timeout
+        self.max_retries = max_retries
+        self.pages = 0  # The pages validated with the current webdriver.
+        self.recycled = 0  # The number of webdrivers replaced.
+        self.killed = 0  # The number of webdrivers killed by the watchdog.
+        self._driver = None  # The webdriver configured last.
+        self._retries = {}  # The retries of each page requeued, by relative URL.
+
+    def _start(self, validator):
+        """Configures the webdriver of the validator, creating it if needed."""
+        if validator.driver is None:
+            validator.driver = self.driver_factory()
+        driver = validator.driver
+        if driver is self._driver:
+            return
+        try:
+            if self.page_load_timeout is not None and hasattr(driver, 'set_page_load_timeout'):
+                driver.set_page_load_timeout(self.page_load_timeout)
+            if self.script_timeout is not None and hasattr(driver, 'set_script_timeout'):
+                driver.set_script_timeout(self.script_timeout)
+        except WebDriverException:
+            pass
+        self._driver = driver
+        self.pages = 0
+
+    def recycle(self, validator, killed=False):
+        """Replaces the webdriver of the validator with a new one.
+
+        Args:
+            validator (SiteAllLinkValidator): The validator.
+            killed (bool): Whether the webdriver was killed, in which case
+                it is quit in the background as it may not respond.
+        """
+        driver, validator.driver = validator.driver, None
+        if killed:
+            threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+        else:
+            self._quit(driver)
+        self.recycled += 1
+        self._start(validator)
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            # The webdriver is gone already.
+            pass
+
+    def _needs_recycling(self):
+        if self.max_pages is not None and self.pages >= self.max_pages:
+            return True
+        if self.max_memory is None or not self.pages or self.pages % self.memory_check_interval:
+            return False
+        memory = self.memory_probe(self._driver)
+        return memory is not None and memory > self.max_memory
+
+    def kill(self, driver):
+        """Kills a webdriver, making its pending commands fail.
+
+        The webdriver service process (e.g. chromedriver) of local webdrivers
+        is killed; remote ones are asked to quit.
+
+        Args:
+            driver: The selenium webdriver object.
+        """
+        self.killed += 1
+        process = getattr(getattr(driver, 'service', None), 'process', None)
+        if process is not None:
+            process.kill()
+        else:
+            threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+
+    def validate(self, validator, url, check_full_page=False):
+        """Validates a link with validate_link() under the watchdog,
+        recycling the webdriver first if due.
+
+        Args:
+            validator (SiteAllLinkValidator): The validator.
+            url (str): The relative URL to validate.
+            check_full_page (bool): Whether to collect the links of the full page.
+
+        Returns:
+            bool: True if the link was visited, False otherwise, including
+                when its session was killed and it was requeued or failed.
+        """
+        self._start(validator)
+        if self._needs_recycling():
+            self.recycle(validator)
+        driver = validator.driver
+        killed = threading.Event()
+        watchdog = None
+        if self.watchdog_timeout is not None:
+            watchdog = threading.Timer(self.watchdog_timeout, lambda: (killed.set(), self.kill(driver)))
+            watchdog.daemon = True
+            watchdog.start()
+        # The result is published once known not to come from a killed attempt.
+        validator._hold_result = True
+        try:
+            visited = validator.validate_link(url, check_full_page)
+        except Exception:
+            if not killed.is_set():
+                raise
+            visited = None
+        finally:
+            validator._hold_result = False
+            if watchdog is not None:
+                watchdog.cancel()
+        if not killed.is_set() or visited is True:
+            if validator.last_result is not None:
+                validator._publish_result(url, validator.last_result)
+            if killed.is_set():
+                # The page was validated just before the watchdog fired.
+                self.recycle(validator, killed=True)
+                return visited
+            self.pages += 1
+            self._retries.pop(url, None)
+            return visited
+        self.recycle(validator, killed=True)
+        # Drop the result of the killed attempt, e.g. the load_error of its failed get().
+        validator.last_result = None
+        link = validator.protocol + validator.domain + url
+        relative_url = validator.get_relative_url(link)
+        retries = self._retries.get(relative_url, 0)
+        if retries < self.max_retries and validator.frontier.requeue(relative_url):
+            self._retries[relative_url] = retries + 1
+            return False
+        self._retries.pop(relative_url, None)
+        message = ('Session killed after ' + str(self.watchdog_timeout) + ' seconds validating url: ' + link
+                   + ' (' + str(retries + 1) + ' attempts)')
+        validator.last_result = PageResult(link, 'failed', None, 'hung_page', (('hung_page', message),),
+                                           validator._referrers.pop(relative_url, None), {})
+        if validator.instrumentation is not None:
+            validator.instrumentation.record_page(validator.last_result)
+        validator.emit_result(validator.last_result)
+        return False
+
+
+class HostRateLimiter:
+    """Spaces the requests to each host with a token bucket per host.
+
+    Requests reserve a token and only wait for their own host, so
+    threads requesting other hosts are not blocked.
+    """
+
+    def __init__(self, rate, burst=1):
+        """Initiate the limiter.
+
+        Args:
+            rate (float): The requests per second allowed per host.
+            burst (int): The requests allowed at once after a quiet period. Defaults to 1.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # The (tokens, time) of each host.
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """Reserves a token for a request.
+
+        Args:
+            url (str): The absolute URL to request.
+
+        Returns:
+            float: The seconds to wait before sending the request.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        # A negative balance is the time until the token reserved is refilled.
+        return -tokens / self.rate if tokens < 0 else 0
+
+    def acquire(self, url):
+        """Waits until a request to the URL is allowed.
+
+        Args:
+            url (str): The absolute URL to request.
+
+        Returns:
+            float: The seconds waited.
+        """
+        delay = self.reserve(url)
+        if delay:
+            sleep(delay)
+        return delay
+
+
+# The result of the check of an external link by ExternalLinkChecker.
+ExternalLinkResult = namedtuple('ExternalLinkResult', ['url', 'status_code', 'error', 'referrer', 'checked_at'])
+
+
+class ExternalLinkChecker:
+    """Checks external links in the background while the crawl goes on.
+
+    Each distinct link is checked once, with a HEAD request falling back to
+    a GET of its first byte when HEAD is not allowed, over pooled connections
+    and with bounded concurrency, in total and per host. The results are kept
+    in a cache that can be persisted in an SQLite database and are reused for
+    `ttl` seconds, also across runs.
+    """
+
+    def __init__(self, max_workers=8, max_per_host=2, cache_path=None, ttl=86400, pool=None):
+        """Initiate the checker.
+
+        Args:
+            max_workers (int): The links checked at once. Defaults to 8.
+            max_per_host (int): The links of the same host checked at once. Defaults to 2.
+            cache_path (str): The path of the SQLite database to persist the results in, if any.
+            ttl (float): The seconds a result is reused for. Defaults to a day.
+            pool (HttpConnectionPool): The connection pool. Defaults to a new one.
+        """
+        self.max_per_host = max_per_host
+        self.ttl = ttl
+        self.pool = pool or HttpConnectionPool(timeout=15)
+        self.checked = 0  # The number of links requested, i.e. not found in the cache.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._host_limits = {}  # The semaphores, by host.
+        self._results = {}  # The results, by URL, including the cached ones.
+        self._referrers = {}  # The first page each link was found in, by URL.
+        self._futures = []
+        self._connection = None
+        if cache_path is not None:
+            self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute('CREATE TABLE IF NOT EXISTS external_links (url TEXT PRIMARY KEY, '
+                                         'status_code INTEGER, error TEXT, referrer TEXT, checked_at REAL)')
+            expired = time() - ttl
+            for row in self._connection.execute('SELECT url, status_code, error, referrer, checked_at '
+                                                'FROM external_links WHERE checked_at >= ?', (expired,)):
+                self._results[row[0]] = ExternalLinkResult(*row)
+
+    def submit(self, url, referrer):
+        """Schedules the check of a link, unless it has been checked or scheduled already.
+        Returns at once.
+
+        Args:
+            url (str): The absolute external URL.
+            referrer (str): The URL of the page the link was found in.
+        """
+        with self._lock:
+            if url in self._referrers:
+                return
+            self._referrers[url] = referrer
+            if url in self._results:
+                return
+            self._futures.append(self._executor.submit(self._check, url))
+
+    def _check(self, url):
+        try:
+            status_code = self._check_status(url)
+            error = 'Error status ' + str(status_code) if status_code >= 400 else None
+        except Exception as exception:
+            # Any failure, e.g. of a malformed URL, is the result of this link only.
+            status_code, error = None, 'Error loading url: ' + str(exception)
+        with self._lock:
+            self.checked += 1
+            self._results[url] = ExternalLinkResult(url, status_code, error, self._referrers[url], time())
+
+    def _check_status(self, url):
+        """Returns the status code of a link, within the limit of its host."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._host_limits.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with limit:
+            status_code = self._request('HEAD', url)
+            if status_code in (403, 405, 501):
+                # HEAD may not be allowed, get the first byte instead.
+                status_code = self._request('GET', url, {'Range': 'bytes=0-0'})
+            return status_code
+
+    def _request(self, method, url, headers=None, max_redirects=10):
+        """Returns the status code of a request, following any redirects, without reading the body."""
+        for _ in range(max_redirects + 1):
+            with self.pool.open(method, url, headers) as response:
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                return response.status
+        raise http.client.HTTPException('Too many redirects for ' + url)
+
+    def join(self):
+        """Waits for all the scheduled checks to finish and persists the results."""
+        while True:
+            with self._lock:
+                futures, self._futures = self._futures, []
+            if not futures:
+                break
+            wait(futures)
+            for future in futures:
+                future.result()
+        self.flush()
+
+    def results(self):
+        """Returns the results of the links submitted so far.
+
+        Returns:
+            list: The ExternalLinkResult of each link checked, with the referrer of this crawl.
+        """
+        with self._lock:
+            return [result._replace(referrer=self._referrers[url])
+                    for url, result in self._results.items() if url in self._referrers]
+
+    def broken_links(self):
+        """Returns the results of the broken links submitted so far.
+
+        Returns:
+            list: The ExternalLinkResult of each broken link.
+        """
+        return [result for result in self.results() if result.error is not None]
+
+    def flush(self):
+        """Persists the results in the cache database, if any."""
+        if self._connection is None:
+            return
+        with self._lock:
+            rows = list(self._results.values())
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO external_links '
+                                         '(url, status_code, error, referrer, checked_at) VALUES (?, ?, ?, ?, ?)',
+                                         rows)
+
+    def close(self):
+        """Waits for the checks, persists the results and releases the resources."""
+        self.join()
+        self._executor.shutdown()
+        self.pool.close()
+        if self._connection is not None:
+            self._connection.close()
+
+
+def iter_sitemap(stream):
+    """Parses a sitemap or sitemap index incrementally.
+
+    Each <url> and <sitemap> element is cleared once read, so the memory
+    used does not grow with the number of URLs.
+
+    Args:
+        stream: A binary file-like object with the XML.
+
+    Yields:
+        tuple: The kind ('url' or 'sitemap') and the <loc> of each entry.
+    """
+    root = None
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if root is None:
+            root = element
+        if event != 'end':
+            continue
+        # Ignore the namespace of the tags.
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag in ('url', 'sitemap'):
+            loc = next((child.text for child in element if child.tag.rsplit('}', 1)[-1] == 'loc'), None)
+            if loc and loc.strip():
+                yield tag, loc.strip()
+            root.clear()
+
+
+class SitemapReader:
+    """Reads the page URLs of a website from its sitemaps.
+
+    The sitemaps are the ones given, or else the ones listed in robots.txt,
+    or else /sitemap.xml. Sitemap index files are followed and gzipped
+    sitemaps are supported. The sitemaps are parsed while downloaded.
+    """
+
+    def __init__(self, sitemap_urls=None, pool=None, max_sitemaps=1000):
+        """Initiate the reader.
+
+        Args:
+            sitemap_urls (list): The absolute URLs of the sitemaps. Defaults to
+                the ones listed in the robots.txt of the website.
+            pool (HttpConnectionPool): The connection pool. Defaults to a new one.
+            max_sitemaps (int): The number of sitemaps to read at most. Defaults to 1000.
+        """
+        self.sitemap_urls = sitemap_urls
+        self.pool = pool or HttpConnectionPool()
+        self.max_sitemaps = max_sitemaps
+        self.errors = []  # The (sitemap URL, message) of each sitemap that could not be read.
+
+    def discover(self, base_url):
+        """Returns the sitemaps listed in the robots.txt of a website,
+        or its /sitemap.xml if none are listed.
+
+        Args:
+            base_url (str): The protocol and domain of the website, e.g. 'https://w3.org'.
+        """
+        try:
+            response = self.pool.fetch(base_url + '/robots.txt')
+        except (OSError, http.client.HTTPException, ValueError):
+            response = None
+        sitemaps = []
+        if response is not None and response.status == 200:
+            for line in response.text.splitlines():
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'sitemap' and value.strip():
+                    sitemaps.append(urljoin(base_url + '/', value.strip()))
+        return sitemaps or [base_url + '/sitemap.xml']
+
+    def iter_urls(self, base_url):
+        """Reads the sitemaps of a website, following any sitemap index files.
+
+        Args:
+            base_url (str): The protocol and domain of the website, e.g. 'https://w3.org'.
+
+        Yields:
+            tuple: The absolute URL of each page and the URL of the sitemap listing it.
+        """
+        queue = deque(self.sitemap_urls or self.discover(base_url))
+        seen = set(queue)
+        read = 0
+        while queue and read < self.max_sitemaps:
+            sitemap_url = queue.popleft()
+            read += 1
+            try:
+                for kind, loc in self._read(sitemap_url):
+                    if kind == 'url':
+                        yield loc, sitemap_url
+                    elif loc not in seen:
+                        seen.add(loc)
+                        queue.append(loc)
+            except (OSError, http.client.HTTPException, ValueError, ElementTree.ParseError) as exception:
+                self.errors.append((sitemap_url, str(exception)))
+
+    def _read(self, url, max_redirects=10):
+        """Yields the entries of a sitemap, parsed while downloaded."""
+        for _ in range(max_redirects + 1):
+            with self.pool.open('GET', url, {'Accept-Encoding': 'gzip'}) as response:
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    response.read()
+                    url = urljoin(url, location)
+                    continue
+                if response.status != 200:
+                    response.read()
+                    raise http.client.HTTPException('Error status ' + str(response.status))
+                stream = response
+                if response.getheader('Content-Encoding', '').lower() == 'gzip':
+                    stream = gzip.GzipFile(fileobj=stream)
+                # Sitemaps may also be gzipped files (*.xml.gz), served as they are.
+                if stream.peek(2)[:2] == b'\x1f\x8b':
+                    stream = gzip.GzipFile(fileobj=stream)
+                yield from iter_sitemap(stream)
+                # Read any trailing data so that the connection can be reused.
+                response.read()
+                return
+        raise http.client.HTTPException('Too many redirects for ' + url)
+
+
+# The result of the validation of a page, see SiteAllLinkValidator.iter_validate_all_links().
+# The status is 'valid', 'error' or 'failed' (not loaded), the error_kind is the kind of
+# the first error issue, if any, and the issues are the (kind, message) pairs found.
+# The timings are the seconds spent in each phase, by phase name.
+PageResult = namedtuple('PageResult', ['url', 'status', 'status_code', 'error_kind', 'issues', 'referrer',
+                                       'timings'])
+
+# The kinds of issues that make a page fail validation; the rest are warnings.
+ERROR_KINDS = frozenset(['load_error', 'driver_error', 'error_status', 'error_page', 'broken_external_link',
+                         'hung_page'])
+
+
+class PrintSink:
+    """Prints the issues of each result, as the validator always did."""
+
+    def emit(self, result):
+        """Prints the messages of the issues of a result.
+
+        Args:
+            result (PageResult): The result.
+        """
+        for _, message in result.issues:
+            print(message)
+
+    def flush(self):
+        """Nothing to flush."""
+
+    def close(self):
+        """Nothing to close."""
+
+
+class JsonLinesSink:
+    """Writes each result as a line of JSON, buffering them
+    and writing them in batches."""
+
+    def __init__(self, path, batch_size=100):
+        """Initiate the sink, appending to the file.
+
+        Args:
+            path (str): The path of the JSON Lines file.
+            batch_size (int): The results to buffer before writing them. Defaults to 100.
+        """
+        self.batch_size = batch_size
+        self._file = open(path, 'a', encoding='utf-8')
+        self._buffer = []
+
+    def emit(self, result):
+        """Buffers a result, writing the buffer when full.
+
+        Args:
+            result (PageResult): The result.
+        """
+        self._buffer.append(json.dumps(result._asdict()))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered results."""
+        if self._buffer:
+            self._file.write('\n'.join(self._buffer) + '\n')
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        """Writes the buffered results and closes the file."""
+        self.flush()
+        self._file.close()
+
+
+class CrawlHistory:
+    """Remembers when each page last changed or failed, across runs, in an
+    SQLite database, for a LinkScorer to visit those pages first.
+
+    Used as a result sink. A page is failed if its result is not valid, and
+    changed if it was rendered after an IncrementalCache revalidated it, i.e.
+    it is new or changed since it was stored. The events of previous runs
+    are loaded in memory, the ones of the current run written in batches.
+    """
+
+    def __init__(self, path, base_url, batch_size=100):
+        """Initiate the history, creating the database if needed.
+
+        Args:
+            path (str): The path of the SQLite database.
+            base_url (str): The protocol and domain stripped from the URLs
+                of the results, e.g. 'https://example.com'.
+            batch_size (int): The events to buffer before writing them. Defaults to 100.
+        """
+        self.base_url = base_url
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS events (url TEXT PRIMARY KEY, kind TEXT, time REAL)')
+        self._events = dict(self._connection.execute('SELECT url, time FROM events'))
+        self._pending = []
+
+    def last_event(self, link):
+        """Returns when a page last changed or failed before this run.
+
+        Args:
+            link (str): The relative URL of the page.
+
+        Returns:
+            float|None: The time of the event or None if there is none.
+        """
+        return self._events.get(link)
+
+    def emit(self, result):
+        """Records the result of a page if it failed or changed.
+
+        Args:
+            result (PageResult): The result.
+        """
+        if not result.url.startswith(self.base_url):
+            return
+        if result.status != 'valid':
+            kind = 'failed'
+        elif 'revalidate' in result.timings and 'get' in result.timings:
+            kind = 'changed'
+        else:
+            return
+        self._pending.append((result.url[len(self.base_url):], kind, time()))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered events."""
+        if self._pending:
+            with self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO events (url, kind, time) VALUES (?, ?, ?)',
+                                             self._pending)
+            self._pending = []
+
+    def close(self):
+        """Writes the buffered events and closes the database."""
+        self.flush()
+        self._connection.close()
+
+
+class Histogram:
+    """A histogram of durations with logarithmic buckets.
+
+    Recording is O(1) and the memory does not grow with the number of
+    values. Percentiles are accurate to the bucket width, about 9%.
+    """
+
+    BUCKETS_PER_DOUBLING = 8
+
+    def __init__(self):
+        """Initiate the histogram."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = {}  # The number of values, by bucket index.
+
+    def record(self, value):
+        """Records a value.
+
+        Args:
+            value (float): The value, e.g. the seconds of a phase.
+        """
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        # The buckets start at one microsecond.
+        index = int(math.log2(value * 1e6) * self.BUCKETS_PER_DOUBLING) if value > 1e-6 else 0
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def percentile(self, percent):
+        """Returns an upper bound of the percentile.
+
+        Args:
+            percent (float): The percentile, from 0 to 100.
+
+        Returns:
+            float: The upper bound of the bucket holding the percentile, 0 if empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(self.max, 2 ** ((index + 1) / self.BUCKETS_PER_DOUBLING) / 1e6)
+        return self.max
+
+
+# Returns the main timings of the Navigation Timing entry of the current page, in milliseconds.
+NAVIGATION_TIMING_SCRIPT = """
+var entry = performance.getEntriesByType('navigation')[0];
+if (!entry) {
+    return null;
+}
+return {
+    'ttfb': entry.responseStart - entry.requestStart,
+    'download': entry.responseEnd - entry.responseStart,
+    'dom_content_loaded': entry.domContentLoadedEventEnd - entry.startTime,
+    'load': entry.loadEventEnd - entry.startTime
+};
+"""
+
+
+class CrawlInstrumentation:
+    """Records the duration of each phase of the validation of the pages
+    (e.g. 'get', 'wait', 'find_links', 'filter_links') in histograms,
+    along with counters, the Navigation Timing of the pages and the
+    slowest pages, and calls the hooks registered before and after
+    each phase, e.g. to attach a profiler.
+    """
+
+    def __init__(self, navigation_timing=True, slowest=10):
+        """Initiate the instrumentation.
+
+        Args:
+            navigation_timing (bool): Whether to record the Navigation Timing
+                of the pages. Defaults to True.
+            slowest (int): The number of slowest pages to keep. Defaults to 10.
+        """
+        self.navigation_timing = navigation_timing
+        self.slowest = slowest
+        self.histograms = {}  # The histograms, by phase name.
+        self.counters = {}  # The counters, by name.
+        self.pre_hooks = []  # The callables called with (phase, url) before each phase.
+        self.post_hooks = []  # The callables called with (phase, url, seconds) after each phase.
+        self._slowest_pages = []  # A heap of the (seconds, url) of the slowest pages.
+        self._lock = threading.Lock()
+
+    def add_hooks(self, pre=None, post=None):
+        """Registers hooks to call before and after each phase.
+
+        Args:
+            pre (callable): Called with (phase, url) before each phase.
+            post (callable): Called with (phase, url, seconds) after each phase.
+        """
+        if pre is not None:
+            self.pre_hooks.append(pre)
+        if post is not None:
+            self.post_hooks.append(post)
+
+    def before(self, phase, url):
+        """Calls the pre-phase hooks."""
+        for hook in self.pre_hooks:
+            hook(phase, url)
+
+    def after(self, phase, url, seconds):
+        """Records the duration of a phase and calls the post-phase hooks."""
+        self.record(phase, seconds)
+        for hook in self.post_hooks:
+            hook(phase, url, seconds)
+
+    def record(self, name, seconds):
+        """Records a duration in the histogram of the name."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def count(self, name, value=1):
+        """Adds the value to the counter of the name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_page(self, result):
+        """Records the result of a page: its status and its total duration.
+
+        Args:
+            result (PageResult): The result of the page.
+        """
+        seconds = sum(result.timings.values())
+        self.count('pages.' + result.status)
+        self.record('page', seconds)
+        with self._lock:
+            if len(self._slowest_pages) < self.slowest:
+                heapq.heappush(self._slowest_pages, (seconds, result.url))
+            elif seconds > self._slowest_pages[0][0]:
+                heapq.heapreplace(self._slowest_pages, (seconds, result.url))
+
+    def record_navigation_timing(self, driver):
+        """Records the Navigation Timing of the current page of the driver, if enabled and available.
+
+        Args:
+            driver: The selenium webdriver object.
+        """
+        if not self.navigation_timing or not hasattr(driver, 'execute_script'):
+            return
+        try:
+            timing = driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+        except WebDriverException:
+            return
+        for name, milliseconds in (timing or {}).items():
+            if milliseconds is not None and milliseconds >= 0:
+                self.record('navigation.' + name, milliseconds / 1000)
+
+    def slowest_pages(self):
+        """Returns the slowest pages.
+
+        Returns:
+            list: The (seconds, url) of the slowest pages, slowest first.
+        """
+        with self._lock:
+            return sorted(self._slowest_pages, reverse=True)
+
+    def summary(self):
+        """Returns a summary of the phases, counters and slowest pages.
+
+        Returns:
+            str: The summary table, in milliseconds.
+        """
+        lines = ['%-28s %8s %10s %10s %10s %10s %12s' % ('phase', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms',
+                                                          'total s')]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for name, histogram in histograms:
+            lines.append('%-28s %8d %10.1f %10.1f %10.1f %10.1f %12.2f' % (
+                name, histogram.count, histogram.percentile(50) * 1000, histogram.percentile(95) * 1000,
+                histogram.percentile(99) * 1000, histogram.max * 1000, histogram.total))
+        for name, value in counters:
+            lines.append('%-28s %8d' % (name, value))
+        slowest = self.slowest_pages()
+        if slowest:
+            lines.append('slowest pages:')
+            lines.extend('%10.1f ms  %s' % (seconds * 1000, url) for seconds, url in slowest)
+        return '\n'.join(lines)
+
+
+class _PhaseTimer:
+    """Times a phase of the validation of a page, see SiteAllLinkValidator._phase()."""
+
+    __slots__ = ('name', 'url', 'timings', 'instrumentation', 'start')
+
+    def __init__(self, name, url, timings, instrumentation):
+        self.name = name
+        self.url = url
+        self.timings = timings
+        self.instrumentation = instrumentation
+        self.start = 0.0
+
+    def __enter__(self):
+        if self.instrumentation is not None:
+            self.instrumentation.before(self.name, self.url)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        seconds = perf_counter() - self.start
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + seconds
+        if self.instrumentation is not None:
+            self.instrumentation.after(self.name, self.url, seconds)
+
+
+# The progress of a crawl when it ended: the links visited, the ones left to visit,
+# the ones beyond the max depth of a PriorityFrontier and why the crawl stopped
+# early, e.g. 'max_pages', or None if it did not.
+CrawlCoverage = namedtuple('CrawlCoverage', ['visited', 'to_visit', 'beyond_max_depth', 'stop_reason'])
+
+
+class CrawlBudget:
+    """Limits the pages a crawl visits and the time it takes.
+
+    Once a limit is reached, the crawl stops before visiting the next link
+    and reports its partial coverage. The links left to visit are kept in
+    the frontier (and the checkpoint, if set) to resume the crawl later.
+    """
+
+    def __init__(self, max_pages=None, max_seconds=None):
+        """Initiate the budget.
+
+        Args:
+            max_pages (int): The links to visit. Defaults to no limit.
+            max_seconds (float): The seconds of wall-clock time. Defaults to no limit.
+        """
+        self.max_pages = max_pages
+        self.max_seconds = max_seconds
+        self._deadline = None
+        self._visited = 0
+
+    def start(self, frontier):
+        """Starts counting the pages and the time.
+
+        Args:
+            frontier (LinkFrontier): The frontier of the crawl.
+        """
+        if self.max_seconds is not None:
+            self._deadline = monotonic() + self.max_seconds
+        self._visited = len(frontier.visited)
+
+    def exhausted(self, frontier):
+        """Checks whether a limit is reached.
+
+        Args:
+            frontier (LinkFrontier): The frontier of the crawl.
+
+        Returns:
+            str|None: The limit reached, 'max_pages' or 'max_seconds', or None.
+        """
+        if self.max_pages is not None and len(frontier.visited) - self._visited >= self.max_pages:
+            return 'max_pages'
+        if self._deadline is not None and monotonic() >= self._deadline:
+            return 'max_seconds'
+        return None
+
 
 class SiteAllLinkValidator:
     """Validate the responses of all links in a website
@@ -17,14 +2655,68 @@ class SiteAllLinkValidator:
         self.driver = driver
         self._domain = domain
         self._error_page_title = '404 not found'
+        self._error_title_matcher = compile_title_matcher(self._error_page_title)
         self._protocol = 'https://'
         self._starting_url = ''
         self._time_to_wait = 0
         self._xpath_to_check = './/main'
         self._check_anchors = False
         self._regex_to_check = ''
-        self.links_to_visit = []  # The list of the links left to be visited.
-        self.links_visited = []  # The list to store the visited links.
+        self._canonicalizer = None
+        self.frontier = LinkFrontier()  # The links left to be visited and the visited ones.
+        self.checkpoint = None  # A CrawlCheckpoint to save the progress to and resume from, if set.
+        self.incremental_cache = None  # An IncrementalCache to skip the pages unchanged since the last run, if set.
+        self.readiness_wait = None  # A ReadinessWait to use after each link visit instead of time_to_wait, if set.
+        self.validation_profile = None  # A ValidationProfile to block the resources of the pages with, if set.
+        self.network_log = None  # A NetworkLogCapture to read the HTTP status of the pages from, if set.
+        self.link_graph = None  # A LinkGraph to record the links between the pages in, if set.
+        self.session = None  # A DriverSession to recycle the driver with and watch it, if set.
+        self.rate_limiter = None  # A HostRateLimiter to space the link visits with, if set.
+        self.external_link_checker = None  # An ExternalLinkChecker to check the external links with, if set.
+        self.sitemap_reader = None  # A SitemapReader to seed the links to visit from the sitemaps with, if set.
+        self.budget = None  # A CrawlBudget to stop the crawl at, if set.
+        self.stop_reason = None  # The limit of the budget that stopped the last crawl early, if any.
+        self.result_sinks = [PrintSink()]  # The sinks the result of each page is emitted to.
+        self.instrumentation = None  # A CrawlInstrumentation to record the phases of each page with, if set.
+        self.last_result = None  # The PageResult of the last link validated, if any.
+        self._page_issues = None  # The issues of the page being validated, while validating one.
+        self._page_timings = None  # The seconds of each phase of the page being validated, likewise.
+        self._cached_record = None  # The PageRecord of the page being validated, if unchanged since stored.
+        self._hold_result = False  # Whether validate_link() leaves publishing its result to its caller.
+        self._referrers = {}  # The page each link to visit was first found in, by relative URL.
+        self._sitemap_orphans = {}  # The sitemap of each link seeded from one and not found in any page yet.
+        self._sinks_lock = threading.Lock()
+        self._profile_driver = None  # The driver the validation_profile is attached to.
+        self._navigation = None  # The NavigationResponse of the current page, if captured.
+        self._normalizer = LinkNormalizer(self._domain, self._check_anchors, self._regex_to_check)
+        self._raw_normalizer = None  # A normalizer without the canonicalizer, to count the visits avoided.
+
+    def _configure_normalizer(self):
+        self._normalizer.configure(self._domain, self._check_anchors, self._regex_to_check, self._canonicalizer)
+        if self._canonicalizer is not None:
+            self._raw_normalizer = LinkNormalizer(self._domain, self._check_anchors)
+        else:
+            self._raw_normalizer = None
+
+    @property
+    def links_to_visit(self):
+        """A read-only view of the links left to be visited.
+        Assigning an iterable replaces the queue."""
+        return self.frontier.to_visit
+
+    @links_to_visit.setter
+    def links_to_visit(self, links):
+        self.frontier.reset_to_visit(links)
+
+    @property
+    def links_visited(self):
+        """A read-only view of the visited links, in the order visited.
+        Assigning an iterable replaces them."""
+        return self.frontier.visited
+
+    @links_visited.setter
+    def links_visited(self, links):
+        self.frontier.reset_visited(links)
 
     @property
     def domain(self):
@@ -37,6 +2729,7 @@ class SiteAllLinkValidator:
         if domain.endswith('/'):
             domain = domain[:-1]
         self._domain = domain
+        self._configure_normalizer()
 
     @property
     def protocol(self):
@@ -62,17 +2755,31 @@ class SiteAllLinkValidator:
         The class will use that title to validate error pages.
         Defaults to '404 not found'
 
-        TODO: Change this into an array to allow multiple page titles.
+        It may also be a list of titles and compiled patterns,
+        e.g. ['404 not found', re.compile('not found', re.I)].
         """
         return self._error_page_title
 
     @error_page_title.setter
     def error_page_title(self, error_page_title):
+        self._error_title_matcher = compile_title_matcher(error_page_title)
         self._error_page_title = error_page_title
 
+    def is_error_page_title(self, title):
+        """Checks whether a page title is the title of an error page.
+
+        Args:
+            title (str): The page title.
+
+        Returns:
+            bool: Whether it matches any of the error_page_title.
+        """
+        return self._error_title_matcher(title)
+
     @property
     def time_to_wait(self):
-        """The number of seconds to wait after each link visit. Defaults to 0."""
+        """The number of seconds to wait after each link visit. Defaults to 0.
+        Not used when readiness_wait is set."""
         return self._time_to_wait
 
     @time_to_wait.setter
@@ -87,6 +2794,18 @@ class SiteAllLinkValidator:
     @xpath_to_check.setter
     def xpath_to_check(self, xpath_to_check):
         self._xpath_to_check = xpath_to_check
+        self._check_xpath_support(self.driver)
+
+    def _check_xpath_support(self, driver):
+        """Checks that a driver with limited XPath support (e.g. HttpFastPathDriver)
+        supports the XPath of the links, before any page is validated.
+
+        Raises:
+            ValueError: If the driver does not support the XPath.
+        """
+        check_xpath = getattr(driver, 'check_xpath', None)
+        if check_xpath is not None:
+            check_xpath(self._links_xpath())
 
     @property
     def check_anchors(self):
@@ -96,6 +2815,7 @@ class SiteAllLinkValidator:
     @check_anchors.setter
     def check_anchors(self, check_anchors):
         self._check_anchors = check_anchors
+        self._configure_normalizer()
 
     @property
     def regex_to_check(self):
@@ -105,14 +2825,29 @@ class SiteAllLinkValidator:
     @regex_to_check.setter
     def regex_to_check(self, regex_to_check):
         self._regex_to_check = regex_to_check
+        self._configure_normalizer()
+
+    @property
+    def canonicalizer(self):
+        """A UrlCanonicalizer to rewrite the relative URLs with before they are deduplicated, if set."""
+        return self._canonicalizer
+
+    @canonicalizer.setter
+    def canonicalizer(self, canonicalizer):
+        self._canonicalizer = canonicalizer
+        self._configure_normalizer()
 
     def set_to_visit(self, link):
-        """Adds a link to the list (dictionary) with links to visit.
+        """Adds a link to the frontier with links to visit.
+        Links already queued or visited are skipped.
 
         Args:
             link (str): The link URL to check.
+
+        Returns:
+            bool: True if the link was added, False if it was a duplicate.
         """
-        self.links_to_visit.append(link)
+        return self.frontier.push(link)
 
     def set_visited(self, link):
         """Adds a link to the visited list.
@@ -120,7 +2855,7 @@ class SiteAllLinkValidator:
         Args:
             link (str): The link URL to check.
         """
-        self.links_visited.append(link)
+        self.frontier.mark_visited(link)
 
     def is_visited(self, link):
         """Checks whether the link has been visited already or not.
@@ -131,7 +2866,7 @@ class SiteAllLinkValidator:
         Returns:
             bool: Whether the link is visited or not.
         """
-        return link in self.links_visited
+        return self.frontier.is_visited(link)
 
     def validate_all_links(self):
         """Validate a link recursively.
@@ -141,23 +2876,597 @@ class SiteAllLinkValidator:
 
         Returns nothing if the links are external
         or have been visited already.
+
+        If a checkpoint is set and holds the state of
+        an interrupted crawl, the crawl is resumed.
+
+        The results are emitted to the result_sinks,
+        which print them by default.
+        """
+        for _ in self.iter_validate_all_links():
+            pass
+        if self.instrumentation is not None:
+            print(self.instrumentation.summary())
+
+    def iter_validate_all_links(self):
+        """Validates all the links like validate_all_links(), yielding
+        the result of each page as soon as it is validated.
+
+        Example:
+            >>> for result in self.iter_validate_all_links():
+            ...     if result.status != 'valid':
+            ...         alert(result.url, result.error_kind, result.referrer)
+
+        Yields:
+            PageResult: The result of each page validated, or failed to be loaded,
+                and of each sitemap failed to be read, followed by the partial coverage, if the budget stopped the crawl,
+                the visits avoided by the canonicalizer, if any, and the broken
+                external links, if checked.
+        """
+        try:
+            self._check_xpath_support(self.driver)
+            start_url = self.get_relative_url(self.protocol + self.domain + self.starting_url)
+            self._start_budget()
+            if not self._restore_checkpoint():
+                visited = self._validate_page(self.starting_url, True)
+                if self.last_result is not None:
+                    yield self.last_result
+                # Unless the session requeued the starting URL to retry it.
+                if not visited and not self.frontier:
+                    return
+                self.seed_from_sitemaps()
+                yield from self.report_sitemap_errors()
+
+            # Iterate through the links to visit.
+            while self.frontier and not self._budget_exhausted():
+                url = self.frontier.pop()
+
+                # Go to the URL and validate it.
+                self._validate_page(url, url == start_url)
+                if self.last_result is not None:
+                    yield self.last_result
+                if self.checkpoint is not None:
+                    self.checkpoint.maybe_flush()
+            if self.checkpoint is not None:
+                self.checkpoint.flush()
+            self._end_budget()
+            self._end_checkpoint()
+            yield from self.report_partial_coverage()
+            yield from self.report_visits_avoided()
+            yield from self.report_orphan_pages()
+            yield from self.report_external_links()
+        finally:
+            self._flush_sinks()
+
+    def _validate_page(self, url, check_full_page=False):
+        """Validates a link through the session, if set, or else with validate_link()."""
+        if self.session is None:
+            return self.validate_link(url, check_full_page)
+        self.last_result = None
+        return self.session.validate(self, url, check_full_page)
+
+    def validate_all_links_parallel(self, driver_factory, workers=4):
+        """Validate all the links using a pool of webdrivers.
+
+        Works like validate_all_links() but the links are visited by
+        a pool of threads, each one with its own webdriver, that
+        share the frontier (and therefore the visited links) of
+        this instance. The set of links visited is the same as
+        in validate_all_links(), only their order may differ.
+
+        Args:
+            driver_factory (callable): Returns a new selenium webdriver object.
+                The webdrivers created are quit once the validation ends.
+            workers (int): The number of webdrivers to use. Defaults to 4.
+        """
+        start_url = self.get_relative_url(self.protocol + self.domain + self.starting_url)
+        self._start_budget()
+        if not self._restore_checkpoint():
+            if start_url is False or not self.frontier.push(start_url):
+                return
+            self.seed_from_sitemaps()
+            self.report_sitemap_errors()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._run_worker, driver_factory, start_url) for _ in range(workers)]
+        if self.checkpoint is not None:
+            self.checkpoint.flush()
+        # Raise any unexpected exception of the workers.
+        for future in futures:
+            future.result()
+        self._end_budget()
+        self._end_checkpoint()
+        self.report_partial_coverage()
+        self.report_visits_avoided()
+        self.report_orphan_pages()
+        self.report_external_links()
+        self._flush_sinks()
+        if self.instrumentation is not None:
+            print(self.instrumentation.summary())
+
+    def _run_worker(self, driver_factory, start_url):
+        """Validates the links of the shared frontier with a new
+        webdriver until there are no links left to visit.
+
+        Args:
+            driver_factory (callable): Returns a new selenium webdriver object.
+            start_url (str): The relative starting URL, whose full page is checked.
+        """
+        # A shallow copy shares the frontier and settings but has its own driver.
+        worker = copy.copy(self)
+        worker.driver = driver_factory()
+        try:
+            self._check_xpath_support(worker.driver)
+            while not self._budget_exhausted():
+                url = self.frontier.claim()
+                if url is None:
+                    return
+                try:
+                    worker.validate_link(url, url == start_url)
+                except WebDriverException as exception:
+                    worker.emit_result(worker._driver_error_result(url, exception))
+                finally:
+                    self.frontier.release(url)
+                if self.checkpoint is not None:
+                    self.checkpoint.maybe_flush()
+        finally:
+            worker.driver.quit()
+
+    def _start_budget(self):
+        """Starts the budget, if set, at the beginning of a crawl."""
+        self.stop_reason = None
+        if self.budget is not None:
+            self.budget.start(self.frontier)
+
+    def _budget_exhausted(self):
+        """Checks whether the budget, if set, stops the crawl, setting the stop reason if so."""
+        if self.budget is not None and self.stop_reason is None:
+            self.stop_reason = self.budget.exhausted(self.frontier)
+        return self.stop_reason is not None
+
+    def _end_budget(self):
+        """Clears the stop reason of a crawl the budget stopped with no links left to visit."""
+        if self.stop_reason is not None and not self.frontier:
+            # The limit was reached on the last link.
+            self.stop_reason = None
+
+    def report_partial_coverage(self):
+        """Reports the coverage of the last crawl if the budget stopped it early.
+
+        Returns:
+            list: The PageResult of the starting page with the partial coverage,
+                or none if the crawl was complete.
+        """
+        if self.stop_reason is None:
+            return []
+        coverage = self.coverage()
+        message = ('Crawl stopped by ' + coverage.stop_reason + ': ' + str(coverage.visited) + ' links visited, '
+                   + str(coverage.to_visit) + ' left to visit')
+        result = PageResult(self.protocol + self.domain + self.starting_url, 'valid', None, None,
+                            (('partial_coverage', message),), None, {})
+        self.emit_result(result)
+        return [result]
+
+    def _end_checkpoint(self):
+        """Clears the checkpoint, if set, once a crawl completes, so that
+        only a crawl stopped early by the budget or interrupted is resumed.
+        """
+        if self.checkpoint is not None and self.stop_reason is None:
+            self.checkpoint.clear()
+
+    def report_visits_avoided(self):
+        """Reports the visits avoided by the canonicalizer, if set.
+
+        Returns:
+            list: The PageResult of the starting page with the visits avoided,
+                or none if no visit was avoided.
+        """
+        if self._canonicalizer is None or not self._canonicalizer.visits_avoided:
+            return []
+        message = 'URL canonicalization avoided ' + str(self._canonicalizer.visits_avoided) + ' visits'
+        result = PageResult(self.protocol + self.domain + self.starting_url, 'valid', None, None,
+                            (('visits_avoided', message),), None, {})
+        self.emit_result(result)
+        return [result]
+
+    def coverage(self):
+        """Returns the coverage of the last crawl.
+
+        Returns:
+            CrawlCoverage: The links visited, left to visit and beyond the max depth,
+                and the reason the crawl stopped early, if it did.
+        """
+        beyond_max_depth = len(getattr(self.frontier, 'beyond_max_depth', ()))
+        return CrawlCoverage(len(self.frontier.visited), len(self.frontier), beyond_max_depth, self.stop_reason)
+
+    def _driver_error_result(self, url, exception):
+        """Returns the result of a link whose validation raised a WebDriverException."""
+        link = self.protocol + self.domain + url
+        message = 'Error validating url: ' + link + '\n' + str(exception.msg)
+        return PageResult(link, 'failed', None, 'driver_error', (('driver_error', message),),
+                          self._referrers.pop(url, None), {})
+
+    def validate_all_links_sharded(self, validator_factory, shards=4, transport=None, start_workers=True):
+        """Validate all the links using a worker process per shard of the links.
+
+        The relative URLs are partitioned by a stable hash (see shard_of()).
+        Each worker owns the links of its shard, with its own frontier and
+        webdriver, and sends the links of other shards it finds to them in
+        batches through the transport. This instance coordinates the workers:
+        it routes the batches, detects when all the workers are idle with no
+        batch in flight, and emits the results of all of them to its sinks.
+
+        Example:
+            >>> # On each other machine, for the shards 2 and 3:
+            >>> run_shard(make_validator, 2, 4, SocketShardTransport.connect(('coordinator', 8765), 2))
+
+        Args:
+            validator_factory (callable): Returns a new SiteAllLinkValidator, with its own
+                webdriver, for a worker. It must be picklable, e.g. a module-level function.
+            shards (int): The number of shards. Defaults to 4.
+            transport: The QueueShardTransport (the default) or SocketShardTransport
+                to pass the messages through.
+            start_workers (bool): Whether to start a local worker process per shard.
+                Otherwise the workers are started with run_shard(), e.g. on other
+                machines. Defaults to True.
+
+        Raises:
+            RuntimeError: If a local worker process exits before the crawl ends.
         """
-        if not self.visit_url(self.protocol + self.domain + self.starting_url):
+        start_url = self.get_relative_url(self.protocol + self.domain + self.starting_url)
+        if start_url is False:
             return
-        sleep(self.time_to_wait)
-        self.validate_current_page()
-        self.collect_current_page_links_to_visit(True)
+        transport = transport or QueueShardTransport(shards)
+        processes = {}
+        if start_workers:
+            context = multiprocessing.get_context('spawn')
+            for shard in range(shards):
+                processes[shard] = context.Process(target=run_shard, daemon=True,
+                                                   args=(validator_factory, shard, shards, transport.worker(shard)))
+                processes[shard].start()
+        try:
+            self._coordinate_shards(transport, shards, start_url, processes)
+        finally:
+            for process in processes.values():
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            transport.close()
+            self._flush_sinks()
+        if self.instrumentation is not None:
+            print(self.instrumentation.summary())
+
+    def _coordinate_shards(self, transport, shards, start_url, processes):
+        """Routes the messages of the shard workers until they are all done."""
+        forwarded = [0] * shards  # The batches of links sent to each shard.
+        idle = [None] * shards  # The batches each shard had received when it last became idle.
+        done = set()
+        owner = shard_of(start_url, shards)
+        transport.send(owner, ['links', [[start_url, None]]])
+        forwarded[owner] += 1
+        stopped = False
+        while len(done) < shards:
+            message = transport.receive(timeout=1)
+            if message is None:
+                if any(not process.is_alive() for shard, process in processes.items() if shard not in done):
+                    raise RuntimeError('A shard worker exited before the crawl ended')
+                continue
+            shard, (kind, payload) = message
+            if kind == 'links':
+                idle[shard] = None
+                for owner, links in payload:
+                    transport.send(owner, ['links', links])
+                    forwarded[owner] += 1
+            elif kind == 'results':
+                for url, status, status_code, error_kind, issues, referrer, timings in payload:
+                    result = PageResult(url, status, status_code, error_kind, tuple(map(tuple, issues)), referrer,
+                                        timings)
+                    if self.instrumentation is not None:
+                        self.instrumentation.record_page(result)
+                    self.emit_result(result)
+            elif kind == 'idle':
+                idle[shard] = payload
+            elif kind == 'done':
+                done.add(shard)
+                for link in payload:
+                    self.frontier.mark_visited(link)
+            elif kind == 'closed' and shard not in done:
+                raise RuntimeError('The worker of shard %d disconnected before the crawl ended' % shard)
+            # The messages of each shard arrive in order, so once every shard is idle having
+            # received all the batches sent to it, no batch is in flight and the crawl is over.
+            if not stopped and idle == forwarded:
+                for shard in range(shards):
+                    transport.send(shard, ['stop', None])
+                stopped = True
 
-        # Iterate through the links to visit.
-        while self.links_to_visit:
-            url = self.links_to_visit.pop(0)
+    def seed_from_sitemaps(self):
+        """Sets the links listed in the sitemaps of the website to visit,
+        if a sitemap reader is set, filtered like the links found in pages.
 
-            # Go to the URL and validate it.
-            if not self.visit_url(self.protocol + self.domain + url):
+        The links not found in any page by the end of the crawl are
+        reported as orphan pages, and the sitemaps failed to be read by
+        report_sitemap_errors(). Called by the validate_all_links*()
+        methods, unless they resume a crawl.
+
+        Returns:
+            int: The number of links set to visit.
+        """
+        if self.sitemap_reader is None:
+            return 0
+        seeded = 0
+        for link, sitemap_url in self.sitemap_reader.iter_urls(self.protocol + self.domain):
+            url, _, _, _, is_for_check = self._normalizer.normalize(link)
+            if not url or not is_for_check:
+                continue
+            if self.is_visited(url) or self.frontier.is_queued(url):
+                # Found in the pages visited so far, i.e. the starting page.
                 continue
-            sleep(self.time_to_wait)
-            self.validate_current_page()
-            self.collect_current_page_links_to_visit()
+            if self.set_to_visit(url):
+                self._referrers[url] = sitemap_url
+                self._sitemap_orphans[url] = sitemap_url
+                seeded += 1
+        return seeded
+
+    def report_sitemap_errors(self):
+        """Reports the sitemaps the sitemap reader, if set, failed to read.
+
+        Returns:
+            list: The PageResult of each sitemap with the error.
+        """
+        if self.sitemap_reader is None:
+            return []
+        results = []
+        for sitemap_url, error in self.sitemap_reader.errors:
+            message = 'Error reading sitemap ' + sitemap_url + ': ' + error
+            results.append(PageResult(sitemap_url, 'valid', None, None, (('sitemap_error', message),), None, {}))
+            self.emit_result(results[-1])
+        return results
+
+    def report_orphan_pages(self):
+        """Reports the links seeded from the sitemaps that no page visited links to.
+
+        Returns:
+            list: The PageResult of each orphan page, with the sitemap as referrer.
+                None are reported if the budget stopped the crawl early, as the
+                pages left to visit may link to them.
+        """
+        if self.stop_reason is not None:
+            return []
+        results = []
+        for url, sitemap_url in self._sitemap_orphans.items():
+            link = self.protocol + self.domain + url
+            message = 'Orphan page ' + link + ' is only linked from sitemap: ' + sitemap_url
+            results.append(PageResult(link, 'valid', None, None, (('orphan_page', message),), sitemap_url, {}))
+            self.emit_result(results[-1])
+        return results
+
+    def report_external_links(self):
+        """Waits for the external link checks, if any, and reports the broken links.
+
+        Returns:
+            list: The PageResult of each broken external link.
+        """
+        if self.external_link_checker is None:
+            return []
+        self.external_link_checker.join()
+        results = []
+        for link in self.external_link_checker.broken_links():
+            message = 'Broken external link ' + link.url + ' (' + link.error + ') was found in URL: ' + link.referrer
+            results.append(PageResult(link.url, 'error', link.status_code, 'broken_external_link',
+                                      (('broken_external_link', message),), link.referrer, {}))
+            self.emit_result(results[-1])
+        return results
+
+    def emit_result(self, result):
+        """Emits a result to all the result sinks.
+
+        Args:
+            result (PageResult): The result to emit.
+        """
+        with self._sinks_lock:
+            for sink in self.result_sinks:
+                sink.emit(result)
+
+    def _flush_sinks(self):
+        with self._sinks_lock:
+            for sink in self.result_sinks:
+                sink.flush()
+
+    def _report(self, kind, message):
+        """Reports an issue of the page being validated.
+        Issues found outside of validate_link() are printed at once.
+
+        Args:
+            kind (str): The kind of the issue, e.g. 'error_page'.
+            message (str): The description of the issue.
+        """
+        if self._page_issues is None:
+            print(message)
+        else:
+            self._page_issues.append((kind, message))
+
+    def _restore_checkpoint(self):
+        """Restores the frontier from the checkpoint, if set.
+
+        Returns:
+            bool: True if the state of an interrupted crawl was restored.
+        """
+        if self.checkpoint is None:
+            return False
+        return self.checkpoint.attach(self.frontier)
+
+    def validate_link(self, url, check_full_page=False):
+        """Visits a link, validates the page and sets its links to visit.
+
+        If an incremental cache is set and the page has not changed since
+        it was stored, its stored result and links are used instead.
+
+        The result of the page, if visited or failed to be loaded,
+        is stored in last_result and emitted to the result sinks.
+
+        Args:
+            url (str): The relative URL to validate.
+            check_full_page (bool): Whether to collect the links of the full page
+                or within xpath_to_check. Defaults to False.
+
+        Returns:
+            bool: True if the link was visited, False otherwise.
+        """
+        link = self.protocol + self.domain + url
+        self.last_result = None
+        self._cached_record = None
+        self._page_issues = []
+        self._page_timings = timings = {}
+        try:
+            valid = self._validate_link(link, check_full_page)
+        finally:
+            issues, self._page_issues = self._page_issues, None
+            self._page_timings = None
+        if valid is None and not issues:
+            # The link is not a link or has been visited already.
+            return False
+        if valid is None:
+            status, status_code = 'failed', None
+        else:
+            status, status_code = 'valid' if valid else 'error', self.current_status_code()
+            if self._cached_record is not None:
+                # The page was not rendered, the driver holds the status of another one.
+                status_code = self._cached_record.status_code
+        error_kind = next((kind for kind, _ in issues if kind in ERROR_KINDS), None)
+        self.last_result = PageResult(link, status, status_code, error_kind, tuple(issues),
+                                      self._referrers.get(url), timings)
+        if not self._hold_result:
+            self._publish_result(url, self.last_result)
+        return valid is not None
+
+    def _publish_result(self, url, result):
+        """Records the result of a page validated in the instrumentation, if set, and emits it.
+
+        Args:
+            url (str): The relative URL validated.
+            result (PageResult): The result.
+        """
+        self._referrers.pop(url, None)
+        if self.instrumentation is not None:
+            self.instrumentation.record_page(result)
+        self.emit_result(result)
+
+    def _phase(self, name, url):
+        """Returns a context manager timing a phase of the validation of a page.
+
+        Args:
+            name (str): The name of the phase, e.g. 'get'.
+            url (str): The URL of the page.
+        """
+        return _PhaseTimer(name, url, self._page_timings, self.instrumentation)
+
+    def _validate_link(self, link, check_full_page):
+        """Validates a link, timing each phase.
+
+        Returns:
+            bool|None: Whether the page is valid or None if it was not visited.
+        """
+        fresh = None
+        if self.incremental_cache is not None:
+            relative_url = self.get_relative_url(link)
+            if relative_url is False or self.is_visited(relative_url):
+                return None
+            with self._phase('revalidate', link):
+                unchanged, fresh = self.incremental_cache.check(link, self._links_xpath(check_full_page))
+            if unchanged is not None:
+                self.set_visited(relative_url)
+                self._cached_record = unchanged
+                if unchanged.errors is not None:
+                    for kind, message in unchanged.errors:
+                        self._report(kind, message)
+                elif not unchanged.valid:
+                    self._report('error_page', 'Error page was found at URL: ' + link)
+                with self._phase('filter_links', link):
+                    self._set_hrefs_to_visit(unchanged.hrefs, link)
+                return unchanged.valid
+        profile = self.validation_profile
+        if profile is not None and self._profile_driver is not self.driver:
+            profile.attach(self.driver)
+            self._profile_driver = self.driver
+        if not self.visit_url(link):
+            return None
+        self._wait(link)
+        if self.instrumentation is not None:
+            self.instrumentation.record_navigation_timing(self.driver)
+        with self._phase('validate', link):
+            valid = self.validate_current_page()
+        if self._canonicalizer is not None and self._canonicalizer.honor_canonical_link:
+            with self._phase('canonical', link):
+                duplicate = self._record_canonical_url(link)
+            if duplicate:
+                # The links of the page were collected from the canonical one.
+                if fresh is not None:
+                    self._store_page(fresh, [], valid)
+                return valid
+        hrefs = self.collect_current_page_links_to_visit(check_full_page)
+        if not hrefs and valid and profile is not None and profile.check_rendering:
+            hrefs = self._collect_unblocked(link, check_full_page)
+        if fresh is not None:
+            self._store_page(fresh, hrefs, valid)
+        return valid
+
+    def _store_page(self, fresh, hrefs, valid):
+        """Stores a page rendered in the incremental cache, with its links, status and errors."""
+        errors = [[kind, message] for kind, message in self._page_issues if kind in ERROR_KINDS]
+        self.incremental_cache.store(fresh._replace(hrefs=hrefs, valid=valid, status_code=self.current_status_code(),
+                                                    errors=errors))
+
+    def _record_canonical_url(self, link):
+        """Marks the URL the current page declares as canonical as visited,
+        since its content is the one of the current page.
+
+        Args:
+            link (str): The URL of the current page.
+
+        Returns:
+            bool: Whether the canonical URL was visited already,
+                i.e. the current page is a duplicate.
+        """
+        canonical = self.find_current_page_canonical_url()
+        if not canonical:
+            return False
+        url, _, _, _, is_for_check = self._normalizer.normalize(canonical)
+        if not url or not is_for_check or url == self.get_relative_url(link):
+            return False
+        if self.is_visited(url):
+            return True
+        self._canonicalizer.record_canonical_link(url, self.frontier.is_queued(url))
+        self.set_visited(url)
+        return False
+
+    def _wait(self, link):
+        """Waits for the current page to be ready."""
+        with self._phase('wait', link):
+            if self.readiness_wait is not None:
+                self.readiness_wait.wait(self.driver)
+            else:
+                sleep(self.time_to_wait)
+
+    def _collect_unblocked(self, link, check_full_page):
+        """Reloads a page without links with the resources unblocked and
+        collects its links, reporting the page if blocking hid them.
+
+        Returns:
+            list: The hrefs of the 'a' tags checked.
+        """
+        with self.validation_profile.unblocked(self.driver) as unblocked:
+            if not unblocked:
+                return []
+            try:
+                with self._phase('unblocked_get', link):
+                    self.driver.get(link)
+            except WebDriverException:
+                return []
+            self._wait(link)
+            hrefs = self.collect_current_page_links_to_visit(check_full_page)
+        if hrefs:
+            self._report('blocked_rendering', 'Links were only rendered with the resources unblocked in URL: '
+                         + link)
+        return hrefs
 
     def visit_url(self, url):
         """Visits the URL given.
@@ -176,22 +3485,62 @@ class SiteAllLinkValidator:
             return False
         # Go to the URL.
         link = self.protocol + self.domain + relative_url
+        if self.rate_limiter is not None:
+            with self._phase('rate_limit', link):
+                self.rate_limiter.acquire(link)
+        self._navigation = None
         try:
-            self.driver.get(link)
+            with self._phase('get', link):
+                self.driver.get(link)
+            if self.network_log is not None:
+                self._navigation = self.network_log.capture(self.driver, link)
         except WebDriverException as exception:
-            print('Error loading url: ' + url + ', attempted to go to: ' + link)
-            print(exception.msg)
+            self._report('load_error', 'Error loading url: ' + url + ', attempted to go to: ' + link + '\n'
+                         + str(exception.msg))
             return False
         # Nothing went wrong so set the URL as visited and return True.
         self.set_visited(relative_url)
         return True
 
     def validate_current_page(self):
-        """Validates that the current page does not show an error."""
-        try:
-            assert self.driver.title != self.error_page_title
-        except AssertionError:
-            print('Error page was found at URL: ' + self.driver.current_url)
+        """Validates that the current page does not show an error.
+
+        Returns:
+            bool: True if the page is valid, False otherwise.
+        """
+        navigation = self._navigation
+        if navigation is not None:
+            if navigation.redirects:
+                chain = ['%s (%d)' % (url, status) for url, status in navigation.redirects] + [navigation.url]
+                self._report('redirect', 'Redirects were followed to URL: ' + ' -> '.join(chain))
+            if navigation.response_time is not None:
+                if self._page_timings is not None:
+                    self._page_timings['response'] = navigation.response_time
+                if self.instrumentation is not None:
+                    self.instrumentation.record('navigation.response', navigation.response_time)
+        status_code = self.current_status_code()
+        if status_code is not None and status_code >= 400:
+            self._report('error_status', 'Error status ' + str(status_code) + ' was found at URL: '
+                         + self.driver.current_url)
+            return False
+        if self.is_error_page_title(self.driver.title):
+            self._report('error_page', 'Error page was found at URL: ' + self.driver.current_url)
+            return False
+        return True
+
+    def current_status_code(self):
+        """Returns the HTTP status of the current page, if known.
+
+        Engines that know it expose it as status_code, otherwise it is
+        read from the network log, if captured.
+
+        Returns:
+            int|None: The status code.
+        """
+        status_code = getattr(self.driver, 'status_code', None)
+        if status_code is None and self._navigation is not None:
+            status_code = self._navigation.status
+        return status_code
 
     def collect_current_page_links_to_visit(self, check_full_page=False):
         """Iterates through all the 'a' tags of the current page,
@@ -204,30 +3553,111 @@ class SiteAllLinkValidator:
         Args:
             check_full_page (bool): Whether to check the full page
                 or within xpath_to_check. Defaults to False.
+
+        Returns:
+            list: The hrefs of all the 'a' tags checked.
         """
-        xpath = './/a' if check_full_page else self.xpath_to_check + '//a'
-        for a in self.driver.find_elements_by_xpath(xpath):
-            # In case of an error while getting the link, print the Exception message and continue.
-            try:
-                link = a.get_attribute('href')
-            except StaleElementReferenceException as exception:
-                print('Invalid "a" tag has been skipped in URL: ' + self.driver.current_url)
-                print(exception.msg)
-                continue
+        page_url = self.driver.current_url
+        with self._phase('find_links', page_url):
+            hrefs = self.find_current_page_hrefs(self._links_xpath(check_full_page))
+        with self._phase('filter_links', page_url):
+            self._set_hrefs_to_visit(hrefs, page_url)
+        if self.instrumentation is not None:
+            self.instrumentation.count('links', len(hrefs))
+        return hrefs
+
+    def _links_xpath(self, check_full_page=False):
+        """Returns the XPath of the 'a' tags to collect."""
+        return './/a' if check_full_page else self.xpath_to_check + '//a'
+
+    def _set_hrefs_to_visit(self, hrefs, page_url):
+        """Sets the hrefs found in a page to visit, if eligible.
+
+        Args:
+            hrefs (list): The hrefs of the 'a' tags.
+            page_url (str): The URL of the page, for reporting.
+        """
+        page_relative_url = None
+        if self._sitemap_orphans or self.link_graph is not None:
+            page_relative_url = self._normalizer.normalize(page_url).relative_url
+        # The internal links by relative URL and the external ones as they are, for the link graph.
+        targets = [] if self.link_graph is not None else None
+        # Filter the hrefs in bulk, checking each distinct one once.
+        for link in dict.fromkeys(hrefs):
             # Validate the link before adding it to the list to visit.
             if link == '':
-                print('Empty "a" tag was found in URL: ' + self.driver.current_url)
+                self._report('empty_link', 'Empty "a" tag was found in URL: ' + page_url)
+                continue
+            url, _, is_absolute, is_internal, is_for_check = self._normalizer.normalize(link)
+            if targets is not None and (url is not False or (is_absolute and not is_internal)):
+                targets.append(link if is_absolute and not is_internal else url)
+            if is_absolute and not is_internal and self.external_link_checker is not None:
+                self.external_link_checker.submit(link, page_url)
                 continue
-            url = self.get_relative_url(link)
             if not url:
                 continue
-            if not self.is_for_check(link):
+            # A page linking to itself does not make it reachable.
+            if self._sitemap_orphans and url != page_relative_url:
+                self._sitemap_orphans.pop(url, None)
+            if not is_for_check:
                 continue
+            if self._raw_normalizer is not None:
+                self._canonicalizer.record_link(self._raw_normalizer.normalize(link).relative_url, url,
+                                                self.is_visited(url) or self.frontier.is_queued(url))
             # Skip if URL has been visited already.
             if self.is_visited(url):
                 continue
-            # Add the URL to the list to visit.
-            self.set_to_visit(url)
+            # Add the URL to the frontier, unless it is queued already.
+            if self.set_to_visit(url):
+                self._referrers[url] = page_url
+        if targets is not None and page_relative_url is not False:
+            self.link_graph.add_links(page_relative_url, targets)
+
+    def find_current_page_hrefs(self, xpath):
+        """Returns the hrefs of the 'a' tags of the current page matching the XPath.
+
+        The XPath is resolved in the browser and all the hrefs are returned
+        by a single script call, instead of a round trip per tag. Drivers
+        providing find_hrefs_by_xpath() (e.g. HttpFastPathDriver) are asked
+        directly, while drivers that cannot execute scripts are asked
+        for each tag in turn.
+
+        Args:
+            xpath (str): The XPath of the 'a' tags.
+
+        Returns:
+            list: The hrefs, in document order. None for tags without an href.
+        """
+        find_hrefs = getattr(self.driver, 'find_hrefs_by_xpath', None)
+        if find_hrefs is not None:
+            return find_hrefs(xpath)
+        if hasattr(self.driver, 'execute_script'):
+            return self.driver.execute_script(FIND_HREFS_SCRIPT, xpath)
+        hrefs = []
+        for a in self.driver.find_elements_by_xpath(xpath):
+            # In case of an error while getting the link, print the Exception message and continue.
+            try:
+                hrefs.append(a.get_attribute('href'))
+            except StaleElementReferenceException as exception:
+                self._report('stale_link', 'Invalid "a" tag has been skipped in URL: ' + self.driver.current_url
+                             + '\n' + str(exception.msg))
+        return hrefs
+
+    def find_current_page_canonical_url(self):
+        """Returns the URL the current page declares as canonical with <link rel="canonical">.
+
+        Drivers providing find_canonical_url() (e.g. HttpFastPathDriver) are
+        asked directly, the others with a script, if they can execute one.
+
+        Returns:
+            str|None: The absolute URL or None if the page declares none.
+        """
+        find_canonical_url = getattr(self.driver, 'find_canonical_url', None)
+        if find_canonical_url is not None:
+            return find_canonical_url()
+        if hasattr(self.driver, 'execute_script'):
+            return self.driver.execute_script(CANONICAL_URL_SCRIPT)
+        return None
 
     def get_relative_url(self, link):
         """Returns the relative URL from a given internal link.
@@ -239,21 +3669,10 @@ class SiteAllLinkValidator:
 
         Args:
             link (str): The link URL.
-        Returns:
-            str|bool: The relative URL or False if link is not internal.
-        """
-        if not self.is_internal(link):
-            return False
-        if not self.is_absolute_url(link):
-            relative_url = link
-        else:
-            relative_url = link.split(self.get_domain_strip_www(), 1)[1]
-        # Remove any anchors if needed.
-        if not self.check_anchors:
-            relative_url = self.get_link_no_anchor(relative_url)
-        if relative_url.endswith("/"):
-            relative_url = relative_url[:-1]
-        return relative_url
+        Returns:
+            str|bool: The relative URL or False if link is not internal.
+        """
+        return self._normalizer.normalize(link).relative_url
 
     def get_domain_strip_www(self):
         """Returns the domain stripped of any
@@ -293,14 +3712,7 @@ class SiteAllLinkValidator:
         Returns:
             bool: Whether the URI is internal or not.
         """
-        if not isinstance(uri, str) or not self.is_link(uri):
-            return False
-        if self.is_absolute_url(uri):
-            # Remove any 'www.' from the beginning of the domain to
-            # allow checking both formats later in the Regex check.
-            if re.match('https?://(www.)?' + self.get_domain_strip_www(), uri) is None:
-                return False
-        return True
+        return self._normalizer.normalize(uri).is_internal
 
     def is_for_check(self, uri):
         """Checks whether the uri is eligible to be checked
@@ -313,12 +3725,7 @@ class SiteAllLinkValidator:
             bool: True if the URI matched the class' regex_to_check property, False otherwise.
                 Also False when the regex_to_check property is not set or False.
         """
-        if not self.regex_to_check:
-            # If no valid Regex has been set therefore check all links.
-            return True
-        url = self.get_relative_url(uri)
-        if url:
-            return bool(re.match(self.regex_to_check, url))
+        return self._normalizer.normalize(uri).is_for_check
 
     @staticmethod
     def is_absolute_url(uri):
@@ -332,7 +3739,7 @@ class SiteAllLinkValidator:
         """
         if not isinstance(uri, str):
             return False
-        return re.match('https?://', uri)
+        return ABSOLUTE_URL_PATTERN.match(uri) is not None
 
     @staticmethod
     def is_link(uri):
@@ -348,4 +3755,1101 @@ class SiteAllLinkValidator:
             return False
         if uri == '':
             return False
-        return not re.match('((mailto)|(tel)|(ftp)):', uri)
+        return NOT_LINK_PATTERN.match(uri) is None
+
+
+# A response read by HttpConnectionPool.fetch().
+HttpResponse = namedtuple('HttpResponse', ['url', 'status', 'headers', 'text'])
+
+
+def split_request_url(url):
+    """Splits an http(s) URL into the connection key and the request target,
+    in ASCII as HTTP needs them: the host IDNA-encoded and the path and query
+    percent-encoded, keeping any existing escapes.
+
+    Example:
+        >>> print(split_request_url('https://b\u00fccher.example/caf\u00e9?q=\u00e9'))
+        (('https', 'xn--bcher-kva.example'), '/caf%C3%A9?q=%C3%A9')
+
+    Args:
+        url (str): The absolute http(s) URL.
+
+    Returns:
+        tuple: The (scheme, netloc) key of the connection and the request target.
+
+    Raises:
+        ValueError: If the URL has no host or an invalid host or port.
+    """
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError('No host in URL: ' + url)
+    host = parts.hostname.encode('idna').decode('ascii')
+    if ':' in host:
+        host = '[' + host + ']'
+    netloc = host if parts.port is None else host + ':' + str(parts.port)
+    target = quote(parts.path or '/', safe="/%;:@!$&'()*+,=~")
+    if parts.query:
+        target += '?' + quote(parts.query, safe="/?%;:@!$&'()*+,=~")
+    return (parts.scheme, netloc), target
+
+
+class HttpConnectionPool:
+    """A thread-safe pool of keep-alive HTTP(S) connections, per host."""
+
+    def __init__(self, timeout=30, max_idle_per_host=8):
+        """Initiate the pool.
+
+        Args:
+            timeout (float): The socket timeout in seconds. Defaults to 30.
+            max_idle_per_host (int): The number of idle connections
+                to keep open for each host. Defaults to 8.
+        """
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}  # The idle connections, by (scheme, host).
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self._connect(*key), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    @contextmanager
+    def open(self, method, url, headers=None):
+        """Sends a request over a pooled connection.
+
+        The connection returns to the pool if the response
+        has been read completely when the context exits.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The absolute http(s) URL.
+            headers (dict): Extra request headers.
+
+        Yields:
+            http.client.HTTPResponse: The response.
+
+        Raises:
+            OSError|http.client.HTTPException: If the request fails.
+            ValueError: If the URL is invalid.
+        """
+        key, target = split_request_url(url)
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                connection.request(method, target, headers=headers or {})
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException):
+                if not reused:
+                    raise
+                # The server may have closed the idle connection, retry on a new one.
+                connection.close()
+                connection = self._connect(*key)
+                connection.request(method, target, headers=headers or {})
+                response = connection.getresponse()
+            yield response
+        except BaseException:
+            connection.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self._release(key, connection)
+        else:
+            connection.close()
+
+    def fetch(self, url, headers=None, method='GET', max_redirects=10):
+        """Sends a request and reads the whole response, following any redirects.
+
+        Args:
+            url (str): The absolute http(s) URL.
+            headers (dict): Extra request headers.
+            method (str): The HTTP method. Defaults to 'GET'.
+            max_redirects (int): The number of redirects to follow. Defaults to 10.
+
+        Returns:
+            HttpResponse: The response, with the body decompressed and decoded.
+
+        Raises:
+            OSError|http.client.HTTPException: If the request fails.
+            ValueError: If the URL is invalid.
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        for _ in range(max_redirects + 1):
+            with self.open(method, url, headers) as response:
+                body = response.read()
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                if response.getheader('Content-Encoding', '').lower() == 'gzip':
+                    body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+                try:
+                    text = body.decode(response.headers.get_content_charset() or 'utf-8', errors='replace')
+                except LookupError:
+                    text = body.decode('utf-8', errors='replace')
+                return HttpResponse(url, response.status, response.headers, text)
+        raise http.client.HTTPException('Too many redirects for ' + url)
+
+    def close(self):
+        """Closes all the idle connections."""
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+
+def parse_region_xpath(xpath):
+    """Parses the XPath of the 'a' tags to collect into the region holding them.
+
+    Only the subset used for xpath_to_check is supported: './/a' for the
+    full page, or './/tag//a' and './/tag[@attribute="value"]//a' where
+    tag may be '*'.
+
+    Args:
+        xpath (str): The XPath of the 'a' tags.
+
+    Returns:
+        tuple|None: The (tag, attribute, value) of the region or None for the full page.
+
+    Raises:
+        ValueError: If the XPath is not supported.
+    """
+    match = re.match(r'^(?:\.?//(\w+|\*)(?:\[@([\w:-]+)\s*=\s*([\'"])(.*?)\3\])?)?\.?//a$', xpath.strip())
+    if match is None:
+        raise ValueError('Unsupported XPath for the HTTP engine: ' + xpath)
+    tag, attribute, _, value = match.groups()
+    if tag is None:
+        return None
+    return tag.lower(), attribute, value
+
+
+# The HTML elements without an end tag, that never close a region.
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                           'source', 'track', 'wbr'])
+
+
+class LinkExtractor(HTMLParser):
+    """A streaming HTML parser collecting the page title
+    and the hrefs of the 'a' tags within a region.
+
+    Feed it the page in chunks, as it is downloaded.
+    """
+
+    def __init__(self, region=None, base_url='', digest=False):
+        """Initiate the parser.
+
+        Args:
+            region (tuple|None): The (tag, attribute, value) of the region,
+                as returned by parse_region_xpath(), or None for the full page.
+            base_url (str): The URL to resolve the hrefs against.
+            digest (bool): Whether to hash the title and the markup of the region
+                (see hexdigest()). Defaults to False.
+        """
+        super().__init__(convert_charrefs=True)
+        self.region = region
+        self.base_url = base_url
+        self.title = ''
+        self.title_done = False
+        self.hrefs = []  # The absolute hrefs, None for 'a' tags without one.
+        self.canonical_url = None  # The absolute href of the <link rel="canonical"> tag, if any.
+        self._in_title = False
+        self._region_depth = 0
+        self._digest = hashlib.sha256() if digest else None
+
+    def hexdigest(self):
+        """Returns the hash of the title and of the markup of the region.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest.
+        """
+        digest = self._digest.copy()
+        digest.update(b'\0' + self.title.strip().encode())
+        return digest.hexdigest()
+
+    def _in_region(self):
+        return self.region is None or self._region_depth
+
+    def _matches_region(self, tag, attrs):
+        region_tag, attribute, value = self.region
+        if region_tag != '*' and tag != region_tag:
+            return False
+        return attribute is None or dict(attrs).get(attribute) == value
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title' and not self.title_done:
+            self._in_title = True
+        elif tag == 'base':
+            href = dict(attrs).get('href')
+            if href:
+                self.base_url = urljoin(self.base_url, href.strip())
+        elif tag == 'link' and self.canonical_url is None:
+            attributes = dict(attrs)
+            if 'canonical' in (attributes.get('rel') or '').lower().split() and attributes.get('href'):
+                self.canonical_url = urljoin(self.base_url, attributes['href'].strip())
+        if self.region is not None and tag not in VOID_ELEMENTS:
+            if self._region_depth:
+                if self.region[0] == '*' or tag == self.region[0]:
+                    self._region_depth += 1
+            elif self._matches_region(tag, attrs):
+                self._region_depth = 1
+        if self._digest is not None and self._in_region():
+            self._digest.update(self.get_starttag_text().encode())
+        if tag == 'a' and self._in_region():
+            href = dict(attrs).get('href')
+            self.hrefs.append(None if href is None else urljoin(self.base_url, href.strip()))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._in_title:
+            self._in_title = False
+            self.title_done = True
+        if self._digest is not None and self._in_region():
+            self._digest.update(('</' + tag + '>').encode())
+        if self._region_depth and tag not in VOID_ELEMENTS and (self.region[0] == '*' or tag == self.region[0]):
+            self._region_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._digest is not None and self._in_region():
+            self._digest.update(data.encode())
+
+
+class LinkElement:
+    """A minimal stand-in for a selenium webelement of an 'a' tag."""
+
+    def __init__(self, href):
+        self._href = href
+
+    def get_attribute(self, name):
+        """Returns the resolved href for 'href', None otherwise."""
+        return self._href if name == 'href' else None
+
+
+class HttpFastPathDriver:
+    """A webdriver look-alike that loads pages over pooled keep-alive
+    HTTP connections and parses them with a streaming HTML parser,
+    instead of rendering them in a browser.
+
+    It implements the part of the webdriver API SiteAllLinkValidator uses,
+    so it can be passed in its place. Pages whose URL path matches
+    browser_url_regex (e.g. JavaScript-rendered sections) are still
+    loaded by the selenium webdriver given as browser.
+    """
+
+    def __init__(self, browser=None, browser_url_regex='', pool=None, max_redirects=10, chunk_size=65536):
+        """Initiate the driver.
+
+        Args:
+            browser: The selenium webdriver object for the pages that need rendering.
+            browser_url_regex (str): A regular expression searched in the URL path
+                of each page. Matching pages are loaded by the browser.
+            pool (HttpConnectionPool): The connection pool. Defaults to a new one.
+            max_redirects (int): The number of redirects to follow. Defaults to 10.
+            chunk_size (int): The bytes to read and parse at a time. Defaults to 65536.
+        """
+        self.browser = browser
+        self.browser_url_regex = re.compile(browser_url_regex) if browser_url_regex else None
+        self.pool = pool or HttpConnectionPool()
+        self.max_redirects = max_redirects
+        self.chunk_size = chunk_size
+        self.status_code = None
+        self._current_url = ''
+        self._title = ''
+        self._html = ''
+        self._links = {}  # The hrefs of the current page, by XPath.
+        self._canonical_url = False  # The canonical URL of the current page, False until parsed.
+        self._use_browser = False
+
+    @property
+    def current_url(self):
+        """The URL of the current page, after any redirects."""
+        return self.browser.current_url if self._use_browser else self._current_url
+
+    @property
+    def title(self):
+        """The title of the current page."""
+        return self.browser.title if self._use_browser else self._title
+
+    def get(self, url):
+        """Loads a page, over HTTP or in the browser.
+
+        Args:
+            url (str): The absolute URL.
+
+        Raises:
+            WebDriverException: If the page cannot be loaded.
+        """
+        self._use_browser = bool(self.browser is not None and self.browser_url_regex
+                                 and self.browser_url_regex.search(urlsplit(url).path))
+        if self._use_browser:
+            self.status_code = None
+            self.browser.get(url)
+            return
+        try:
+            self._fetch(url)
+        except (OSError, http.client.HTTPException, ValueError) as exception:
+            raise WebDriverException('Failed to fetch ' + url + ': ' + str(exception))
+
+    def _fetch(self, url):
+        headers = {'Accept': 'text/html,*/*;q=0.8', 'Accept-Encoding': 'gzip'}
+        for _ in range(self.max_redirects + 1):
+            with self.pool.open('GET', url, headers) as response:
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    response.read()
+                    url = urljoin(url, location)
+                    continue
+                self._current_url = url
+                self.status_code = response.status
+                self._read(response)
+                return
+        raise WebDriverException('Too many redirects for ' + url)
+
+    def _read(self, response):
+        """Reads the response in chunks, parsing the title as they arrive."""
+        try:
+            decoder = codecs.getincrementaldecoder(response.headers.get_content_charset() or 'utf-8')('replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        decompressor = None
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Only the title is needed now, so restrict the region to it.
+        parser = LinkExtractor(region=('title', None, None))
+        chunks = []
+        while True:
+            data = response.read(self.chunk_size)
+            if not data:
+                break
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            text = decoder.decode(data)
+            chunks.append(text)
+            # Stop parsing once the title is known, the links are parsed on demand.
+            if not parser.title_done:
+                parser.feed(text)
+        self._html = ''.join(chunks)
+        self._title = parser.title.strip()
+        self._links = {}
+        self._canonical_url = False
+
+    def check_xpath(self, xpath):
+        """Checks that the XPath is supported, for the pages not loaded by the browser.
+
+        Args:
+            xpath (str): The XPath of the 'a' tags.
+
+        Raises:
+            ValueError: If parse_region_xpath() does not support the XPath.
+        """
+        parse_region_xpath(xpath)
+
+    def find_elements_by_xpath(self, xpath):
+        """Returns the 'a' tags within the region of the XPath.
+
+        Args:
+            xpath (str): An XPath supported by parse_region_xpath().
+
+        Returns:
+            list: The LinkElement objects of the 'a' tags.
+        """
+        if self._use_browser:
+            return self.browser.find_elements_by_xpath(xpath)
+        return [LinkElement(href) for href in self.find_hrefs_by_xpath(xpath)]
+
+    def find_hrefs_by_xpath(self, xpath):
+        """Returns the resolved hrefs of the 'a' tags within the region of the XPath.
+
+        Args:
+            xpath (str): An XPath supported by parse_region_xpath().
+
+        Returns:
+            list: The absolute hrefs, None for 'a' tags without one.
+        """
+        if self._use_browser:
+            return self.browser.execute_script(FIND_HREFS_SCRIPT, xpath)
+        if xpath not in self._links:
+            parser = LinkExtractor(parse_region_xpath(xpath), self._current_url)
+            for start in range(0, len(self._html), self.chunk_size):
+                parser.feed(self._html[start:start + self.chunk_size])
+            parser.close()
+            self._links[xpath] = parser.hrefs
+        return self._links[xpath]
+
+    def find_canonical_url(self):
+        """Returns the resolved href of the <link rel="canonical"> tag of the current page.
+
+        Returns:
+            str|None: The absolute URL or None if the page declares none.
+        """
+        if self._use_browser:
+            return self.browser.execute_script(CANONICAL_URL_SCRIPT)
+        if self._canonical_url is False:
+            parser = LinkExtractor(('head', None, None), self._current_url)
+            for start in range(0, len(self._html), self.chunk_size):
+                parser.feed(self._html[start:start + self.chunk_size])
+            parser.close()
+            self._canonical_url = parser.canonical_url
+        return self._canonical_url
+
+    def quit(self):
+        """Closes the pooled connections and quits the browser, if any."""
+        self.pool.close()
+        if self.browser is not None:
+            self.browser.quit()
+
+
+# The result of the validation of a page by AsyncCrawler.
+CrawlResult = namedtuple('CrawlResult', ['validator', 'url', 'status_code', 'error'])
+
+
+class AsyncHttpClient:
+    """A minimal asyncio HTTP/1.1 client with keep-alive connections
+    and global and per-host limits on the requests in flight."""
+
+    def __init__(self, max_connections=100, max_per_host=6, timeout=30):
+        """Initiate the client.
+
+        Args:
+            max_connections (int): The requests in flight, for all hosts. Defaults to 100.
+            max_per_host (int): The requests in flight, per host. Defaults to 6.
+            timeout (float): The timeout of each request in seconds. Defaults to 30.
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._global_limit = None
+        self._host_limits = {}  # The semaphores, by (scheme, host).
+        self._idle = {}  # The idle (reader, writer) connections, by (scheme, host).
+
+    async def fetch(self, url, method='GET', headers=None, max_redirects=10):
+        """Sends a request, following any redirects.
+
+        Args:
+            url (str): The absolute http(s) URL.
+            method (str): The HTTP method. Defaults to 'GET'.
+            headers (dict): Extra request headers.
+            max_redirects (int): The number of redirects to follow. Defaults to 10.
+
+        Returns:
+            tuple: The final URL, the status code, the headers (with lowercase names)
+                and the decoded body.
+
+        Raises:
+            OSError|asyncio.TimeoutError|ValueError: If the request fails.
+        """
+        if self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.max_connections)
+        for _ in range(max_redirects + 1):
+            key, target = split_request_url(url)
+            if key not in self._host_limits:
+                self._host_limits[key] = asyncio.Semaphore(self.max_per_host)
+            async with self._global_limit, self._host_limits[key]:
+                status, response_headers, body = await asyncio.wait_for(
+                    self._request(key, target, method, headers or {}), self.timeout)
+            location = response_headers.get('location')
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return url, status, response_headers, self._decode(response_headers, body)
+        raise ValueError('Too many redirects for ' + url)
+
+    async def _connect(self, key):
+        scheme, netloc = key
+        parts = urlsplit(scheme + '://' + netloc)
+        port = parts.port or (443 if scheme == 'https' else 80)
+        return await asyncio.open_connection(parts.hostname, port, ssl=True if scheme == 'https' else None)
+
+    async def _request(self, key, target, method, headers):
+        idle = self._idle.get(key)
+        connection, reused = (idle.pop(), True) if idle else (await self._connect(key), False)
+        lines = ['%s %s HTTP/1.1' % (method, target), 'Host: ' + key[1], 'Accept-Encoding: gzip']
+        lines.extend('%s: %s' % header for header in headers.items())
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        try:
+            try:
+                status, response_headers, body, keep_alive = await self._exchange(connection, request, method)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                if not reused:
+                    raise
+                # The server may have closed the idle connection, retry on a new one.
+                connection[1].close()
+                connection = await self._connect(key)
+                status, response_headers, body, keep_alive = await self._exchange(connection, request, method)
+        except BaseException:
+            connection[1].close()
+            raise
+        if keep_alive:
+            self._idle.setdefault(key, []).append(connection)
+        else:
+            connection[1].close()
+        return status, response_headers, body
+
+    @staticmethod
+    async def _exchange(connection, request, method):
+        reader, writer = connection
+        writer.write(request)
+        await writer.drain()
+        status_line = (await reader.readline()).decode('latin-1').split(None, 2)
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise ValueError('Invalid status line')
+        status = int(status_line[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = status_line[0] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                if not size:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            # Skip any trailers.
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, headers, body, keep_alive
+
+    @staticmethod
+    def _decode(headers, body):
+        if headers.get('content-encoding', '').lower() == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        charset = re.search(r'charset=["\']?([\w.:-]+)', headers.get('content-type', ''))
+        try:
+            return body.decode(charset.group(1) if charset else 'utf-8', errors='replace')
+        except LookupError:
+            return body.decode('utf-8', errors='replace')
+
+    def close(self):
+        """Closes all the idle connections."""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+class AsyncCrawler:
+    """Validates the links of many websites concurrently in one asyncio event loop.
+
+    Each site is described by a SiteAllLinkValidator, whose settings,
+    link filtering rules and frontier are used. Pages are fetched over
+    HTTP (see AsyncHttpClient) rather than rendered in a browser, and
+    time_to_wait is not used.
+
+    Example:
+        >>> async for result in AsyncCrawler().crawl(validator, other_validator):
+        ...     print(result.url, result.error)
+    """
+
+    def __init__(self, max_connections=100, max_per_host=6, timeout=30, client=None, rate_limiter=None):
+        """Initiate the crawler.
+
+        Args:
+            max_connections (int): The requests in flight, for all sites. Defaults to 100.
+            max_per_host (int): The requests in flight, per host. Defaults to 6.
+            timeout (float): The timeout of each request in seconds. Defaults to 30.
+            client (AsyncHttpClient): The HTTP client. Defaults to a new one with the limits above.
+            rate_limiter (HostRateLimiter): The limiter to space the requests to each host with, if any.
+        """
+        self.max_per_host = max_per_host
+        self.client = client or AsyncHttpClient(max_connections, max_per_host, timeout)
+        self.rate_limiter = rate_limiter
+
+    async def crawl(self, *validators):
+        """Validates all the links of the sites, yielding the result of each
+        page as soon as it is validated.
+
+        Args:
+            *validators (SiteAllLinkValidator): The sites to validate.
+
+        Yields:
+            CrawlResult: The result of each page visited, or failed to be visited.
+
+        Raises:
+            ValueError: If the xpath_to_check of a site is not supported by
+                parse_region_xpath(), before any page is fetched.
+        """
+        # Fail before crawling rather than on the first page of a site.
+        regions = [parse_region_xpath(validator.xpath_to_check + '//a') for validator in validators]
+        results = asyncio.Queue()
+        tasks = [asyncio.ensure_future(self._crawl_site(validator, region, results))
+                 for validator, region in zip(validators, regions)]
+        running = len(tasks)
+        try:
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+            # Raise any unexpected exception of the sites.
+            for task in tasks:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.client.close()
+
+    async def _crawl_site(self, validator, region, results):
+        """Validates the pages of a site, keeping up to max_per_host pages in flight.
+        Puts the results in the queue, followed by None."""
+        frontier = validator.frontier
+        pages = set()
+        try:
+            start_url = validator.get_relative_url(validator.protocol + validator.domain + validator.starting_url)
+            if start_url is False or not frontier.push(start_url):
+                return
+            while True:
+                while len(pages) < self.max_per_host:
+                    url = frontier.claim(block=False)
+                    if url is None:
+                        break
+                    pages.add(asyncio.ensure_future(self._validate_page(validator, region, url, url == start_url)))
+                if not pages:
+                    return
+                done, pages = await asyncio.wait(pages, return_when=asyncio.FIRST_COMPLETED)
+                for page in done:
+                    await results.put(page.result())
+        finally:
+            # Do not leave the pages in flight behind, e.g. when one raised.
+            for page in pages:
+                page.cancel()
+            await asyncio.gather(*pages, return_exceptions=True)
+            await results.put(None)
+
+    async def _validate_page(self, validator, region, url, check_full_page):
+        """Fetches and validates a page and sets its links to visit.
+
+        Args:
+            validator (SiteAllLinkValidator): The site.
+            region (tuple|None): The region of xpath_to_check, see parse_region_xpath().
+            url (str): The relative URL.
+            check_full_page (bool): Whether to collect the links of the full page.
+
+        Returns:
+            CrawlResult: The result of the page.
+        """
+        link = validator.protocol + validator.domain + url
+        try:
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve(link))
+            try:
+                final_url, status_code, _, html = await self.client.fetch(link)
+            except (OSError, asyncio.TimeoutError, ValueError) as exception:
+                return CrawlResult(validator, link, None, 'Error loading url: ' + link + ': ' + repr(exception))
+            validator.frontier.mark_visited(url)
+            extractor = LinkExtractor(None if check_full_page else region, final_url)
+            extractor.feed(html)
+            extractor.close()
+            for href in dict.fromkeys(extractor.hrefs):
+                relative_url = validator.get_relative_url(href)
+                if relative_url and validator.is_for_check(href):
+                    validator.frontier.push(relative_url)
+            error = None
+            if status_code >= 400:
+                error = 'Error status ' + str(status_code) + ' was found at URL: ' + final_url
+            elif validator.is_error_page_title(extractor.title.strip()):
+                error = 'Error page was found at URL: ' + final_url
+            return CrawlResult(validator, final_url, status_code, error)
+        finally:
+            validator.frontier.release(url)
+
+
+def shard_of(link, shards):
+    """Returns the shard owning a link in a sharded crawl.
+
+    The hash is stable across processes and machines, unlike hash().
+
+    Args:
+        link (str): The relative URL.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard, from 0 to shards - 1.
+    """
+    return zlib.crc32(link.encode()) % shards
+
+
+class ShardFrontier(LinkFrontier):
+    """The frontier of a worker of a sharded crawl, holding the links of its shard only.
+
+    The links of other shards pushed are collected in an outbox instead,
+    with the page they were found in, to be sent to their shards in batches.
+    """
+
+    def __init__(self, shard, shards, visited=None):
+        """Initiate the frontier.
+
+        Args:
+            shard (int): The shard of the worker.
+            shards (int): The number of shards.
+            visited: The visited set. Defaults to a MemoryVisitedSet.
+        """
+        super().__init__(visited)
+        self.shard = shard
+        self.shards = shards
+        self.page_url = None  # The URL of the page being validated, the referrer of the links pushed.
+        self.pending = 0  # The number of links in the outbox.
+        self._outbox = {}  # The referrer of each link to send, by link, by shard.
+
+    def push(self, link):
+        """Adds a link of the shard to the queue, like LinkFrontier.push(),
+        or a link of another shard to the outbox.
+
+        Returns:
+            bool: True if the link was enqueued, False if it was a duplicate or of another shard.
+        """
+        owner = shard_of(link, self.shards)
+        if owner == self.shard:
+            return super().push(link)
+        links = self._outbox.setdefault(owner, {})
+        if link not in links:
+            links[link] = self.page_url
+            self.pending += 1
+        return False
+
+    def take_outbox(self):
+        """Empties the outbox.
+
+        Returns:
+            list: The [shard, [[link, referrer], ...]] pairs of the links of each other shard.
+        """
+        outbox, self._outbox, self.pending = self._outbox, {}, 0
+        return [[owner, [[link, referrer] for link, referrer in links.items()]] for owner, links in outbox.items()]
+
+
+class _ChannelSink:
+    """Sends the results of a shard worker to the coordinator in batches."""
+
+    def __init__(self, channel, batch_size=50):
+        self.channel = channel
+        self.batch_size = batch_size
+        self._results = []
+
+    def emit(self, result):
+        self._results.append(list(result))
+        if len(self._results) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._results:
+            self.channel.send(['results', self._results])
+            self._results = []
+
+    def close(self):
+        self.flush()
+
+
+def run_shard(validator_factory, shard, shards, channel, batch_size=500):
+    """Runs a worker of a sharded crawl (see SiteAllLinkValidator.validate_all_links_sharded())
+    until the coordinator stops it.
+
+    The worker validates the links of its shard it receives, and sends the
+    links of other shards it finds, its results and whenever it is idle to the
+    coordinator, all through the channel.
+
+    Args:
+        validator_factory (callable): Returns a new SiteAllLinkValidator, with its own webdriver.
+        shard (int): The shard of the worker.
+        shards (int): The number of shards.
+        channel: The worker side of the transport, see QueueShardTransport.worker()
+            and SocketShardTransport.connect().
+        batch_size (int): The links of other shards to collect before sending them. Defaults to 500.
+    """
+    validator = validator_factory()
+    frontier = validator.frontier = ShardFrontier(shard, shards)
+    sink = _ChannelSink(channel)
+    validator.result_sinks = [sink]
+    start_url = validator.get_relative_url(validator.protocol + validator.domain + validator.starting_url)
+    received = 0  # The batches of links received.
+    idle = False
+    try:
+        while True:
+            # Wait for links only when there are none left to visit.
+            message = channel.receive(block=idle)
+            while message is not None:
+                kind, payload = message
+                if kind == 'stop':
+                    validator.report_external_links()
+                    sink.flush()
+                    channel.send(['done', list(frontier.visited)])
+                    return
+                received += 1
+                idle = False
+                for url, referrer in payload:
+                    if frontier.push(url) and referrer is not None:
+                        validator._referrers[url] = referrer
+                message = channel.receive(block=False)
+            if frontier:
+                url = frontier.pop()
+                frontier.page_url = validator.protocol + validator.domain + url
+                try:
+                    validator.validate_link(url, url == start_url)
+                except WebDriverException as exception:
+                    validator.emit_result(validator._driver_error_result(url, exception))
+                if frontier.pending >= batch_size:
+                    channel.send(['links', frontier.take_outbox()])
+            elif not idle:
+                # Send everything before reporting idle, the coordinator relies on the order.
+                if frontier.pending:
+                    channel.send(['links', frontier.take_outbox()])
+                sink.flush()
+                channel.send(['idle', received])
+                idle = True
+    finally:
+        validator.driver.quit()
+        channel.close()
+
+
+class _QueueShardChannel:
+    """The worker side of a QueueShardTransport."""
+
+    def __init__(self, shard, hub, inbox):
+        self.shard = shard
+        self._hub = hub
+        self._inbox = inbox
+
+    def send(self, message):
+        self._hub.put((self.shard, message))
+
+    def receive(self, block=True):
+        try:
+            return self._inbox.get(block)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        pass
+
+
+class QueueShardTransport:
+    """Passes the messages of a sharded crawl through multiprocessing queues,
+    for worker processes on the same machine."""
+
+    def __init__(self, shards, context=None):
+        """Initiate the transport.
+
+        Args:
+            shards (int): The number of shards.
+            context: The multiprocessing context. Defaults to the 'spawn' one.
+        """
+        context = context or multiprocessing.get_context('spawn')
+        self._hub = context.Queue()  # The messages of all the workers.
+        self._inboxes = [context.Queue() for _ in range(shards)]  # The messages of each worker.
+
+    def worker(self, shard):
+        """Returns the worker side of the transport for a shard, to pass to run_shard()."""
+        return _QueueShardChannel(shard, self._hub, self._inboxes[shard])
+
+    def send(self, shard, message):
+        """Sends a message to the worker of a shard."""
+        self._inboxes[shard].put(message)
+
+    def receive(self, timeout=None):
+        """Returns the next (shard, message) of the workers, or None on timeout."""
+        try:
+            return self._hub.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Releases the queues."""
+        for messages in [self._hub] + self._inboxes:
+            messages.close()
+
+
+def _send_message(connection, message):
+    """Sends a message as length-prefixed JSON."""
+    data = json.dumps(message).encode()
+    connection.sendall(len(data).to_bytes(4, 'big') + data)
+
+
+def _read_message(stream):
+    """Reads a length-prefixed JSON message.
+
+    Args:
+        stream: The binary file-like object of the connection.
+
+    Returns:
+        The message, or None if the connection is closed or broken.
+    """
+    try:
+        header = stream.read(4)
+        if len(header) < 4:
+            return None
+        return json.loads(stream.read(int.from_bytes(header, 'big')))
+    except (OSError, ValueError):
+        return None
+
+
+def _read_messages(stream, messages, shard=None):
+    """Puts the messages read from a connection in a queue, until it is closed.
+
+    Args:
+        stream: The binary file-like object of the connection.
+        messages (queue.Queue): The queue, where None is put once the connection is closed.
+        shard (int): The shard of the worker, on the coordinator side. The messages
+            are then put as (shard, message) pairs, followed by (shard, ['closed', None]).
+    """
+    while True:
+        message = _read_message(stream)
+        if message is None:
+            break
+        messages.put(message if shard is None else (shard, message))
+    messages.put(None if shard is None else (shard, ['closed', None]))
+
+
+class SocketShardChannel:
+    """The worker side of a SocketShardTransport, connected on first use.
+    Instances are picklable until then, so they can be passed to other processes."""
+
+    def __init__(self, address, shard):
+        self.address = tuple(address)
+        self.shard = shard
+        self._connection = None
+        self._messages = None
+
+    def _connect(self):
+        if self._connection is not None:
+            return
+        self._connection = socket.create_connection(self.address)
+        self._connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._messages = queue.Queue()
+        _send_message(self._connection, ['hello', self.shard])
+        threading.Thread(target=_read_messages, args=(self._connection.makefile('rb'), self._messages),
+                         daemon=True).start()
+
+    def send(self, message):
+        self._connect()
+        _send_message(self._connection, message)
+
+    def receive(self, block=True):
+        self._connect()
+        try:
+            message = self._messages.get(block)
+        except queue.Empty:
+            return None
+        if message is None:
+            raise ConnectionError('The coordinator closed the connection')
+        return message
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+class SocketShardTransport:
+    """Passes the messages of a sharded crawl through TCP connections
+    from the workers to the coordinator, as length-prefixed JSON,
+    for worker processes on several machines."""
+
+    def __init__(self, address=('127.0.0.1', 0), connect_timeout=None):
+        """Initiate the transport and start listening for workers.
+
+        Args:
+            address (tuple): The (host, port) to listen on. Defaults to a free
+                port of the loopback interface, for local workers only.
+            connect_timeout (float): The seconds to wait for a worker to connect
+                before sending it a message, if limited.
+        """
+        self.connect_timeout = connect_timeout
+        self._server = socket.create_server(tuple(address))
+        self.address = self._server.getsockname()[:2]  # The (host, port) listened on.
+        self._messages = queue.Queue()  # The (shard, message) of all the workers.
+        self._connections = {}  # The connection of each worker, by shard.
+        self._connected = threading.Condition()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    @staticmethod
+    def connect(address, shard):
+        """Returns the worker side of the transport for a shard, to pass to run_shard().
+
+        Args:
+            address (tuple): The (host, port) the coordinator listens on.
+            shard (int): The shard of the worker.
+        """
+        return SocketShardChannel(address, shard)
+
+    def worker(self, shard):
+        """Returns the worker side of the transport for a shard, for a local worker."""
+        return self.connect(self.address, shard)
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        stream = connection.makefile('rb')
+        hello = _read_message(stream)
+        if not isinstance(hello, list) or len(hello) != 2 or hello[0] != 'hello' or not isinstance(hello[1], int):
+            connection.close()
+            return
+        shard = hello[1]
+        with self._connected:
+            self._connections[shard] = connection
+            self._connected.notify_all()
+        _read_messages(stream, self._messages, shard)
+
+    def send(self, shard, message):
+        """Sends a message to the worker of a shard, waiting for it to connect first.
+
+        Raises:
+            RuntimeError: If the worker does not connect within connect_timeout.
+        """
+        with self._connected:
+            if not self._connected.wait_for(lambda: shard in self._connections, self.connect_timeout):
+                raise RuntimeError('The worker of shard %d did not connect' % shard)
+            connection = self._connections[shard]
+        _send_message(connection, message)
+
+    def receive(self, timeout=None):
+        """Returns the next (shard, message) of the workers, or None on timeout."""
+        try:
+            return self._messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Stops listening and closes the connections."""
+        self._server.close()
+        with self._connected:
+            for connection in self._connections.values():
+                connection.close()
@@ -0,0 +1,551 @@
+import unittest
+from contextlib import redirect_stdout
+import asyncio
+import functools
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from selenium_validate_site_links import SiteAllLinkValidator, HttpFastPathDriver, AsyncCrawler, CrawlCheckpoint, \
+    IncrementalCache, ExternalLinkChecker, JsonLinesSink, CrawlInstrumentation, SitemapReader, \
+    QueueShardTransport, SocketShardTransport, ValidationProfile, NetworkLogCapture, \
+    LinkGraph, DriverSession, PriorityFrontier, LinkScorer, CrawlBudget, UrlCanonicalizer
+from selenium.common.exceptions import WebDriverException
+from tests.fakedriver import FakeDriver, make_page, make_site, make_fake_validator, serve_site
+
+
+class TestSiteAllLinkValidatorCrawl(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.site = serve_site(make_site(40))
+        cls.domain = cls.site.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.site.__exit__(None, None, None)
+
+    def make_validator(self, driver=None):
+        validator = SiteAllLinkValidator(driver, self.domain)
+        validator.protocol = 'http://'
+        return validator
+
+    def test_validate_all_links(self):
+        validator = self.make_validator(FakeDriver())
+        validator.validate_all_links()
+        # All the pages, the about page and the missing page are visited once.
+        self.assertEqual(len(validator.links_visited), 42)
+        self.assertEqual(len(validator.driver.visits), 42)
+        self.assertEqual(validator.links_visited[0], '')
+        self.assertIn('/missing', validator.links_visited)
+
+    def test_iter_validate_all_links(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            validator = self.make_validator(FakeDriver(fail_urls=['/page/7']))
+            validator.result_sinks = [JsonLinesSink(path, batch_size=10)]
+            output = StringIO()
+            with redirect_stdout(output):
+                results = list(validator.iter_validate_all_links())
+            validator.result_sinks[0].close()
+            with open(path) as lines:
+                records = [json.loads(line) for line in lines]
+        # Nothing is printed without a PrintSink.
+        self.assertEqual(output.getvalue(), '')
+        self.assertEqual(len(results), 39)
+        self.assertEqual([record['url'] for record in records], [result.url for result in results])
+        self.assertEqual(results[0].status, 'valid')
+        self.assertIsNone(results[0].referrer)
+        self.assertEqual(set(results[0].timings), {'get', 'wait', 'validate', 'find_links', 'filter_links'})
+        site = 'http://' + self.domain
+        failed = [(result.url, result.status, result.error_kind, result.referrer)
+                  for result in results if result.status != 'valid']
+        self.assertEqual(failed, [(site + '/page/7', 'failed', 'load_error', site + '/page/2'),
+                                  (site + '/missing', 'error', 'error_page', site + '/page/39')])
+
+    def test_instrumentation(self):
+        validator = self.make_validator(FakeDriver())
+        validator.instrumentation = CrawlInstrumentation(slowest=3)
+        calls = []
+        validator.instrumentation.add_hooks(pre=lambda phase, url: calls.append(('pre', phase)),
+                                            post=lambda phase, url, seconds: calls.append(('post', phase)))
+        output = StringIO()
+        with redirect_stdout(output):
+            validator.validate_all_links()
+        histograms = validator.instrumentation.histograms
+        self.assertEqual(set(histograms), {'get', 'wait', 'validate', 'find_links', 'filter_links', 'page'})
+        self.assertEqual(histograms['get'].count, 42)
+        self.assertEqual(validator.instrumentation.counters, {'pages.valid': 41, 'pages.error': 1, 'links': 44})
+        self.assertEqual(calls[:4], [('pre', 'get'), ('post', 'get'), ('pre', 'wait'), ('post', 'wait')])
+        self.assertEqual(len(validator.instrumentation.slowest_pages()), 3)
+        # The summary ends the output.
+        self.assertIn('slowest pages:', output.getvalue().split('Error page was found')[-1])
+
+    def test_validation_profile(self):
+        class BlockingDriver(FakeDriver):
+            # The links of /page/2 are rendered by a script blocked with the other resources.
+            blocked_urls = []
+
+            def execute_cdp_cmd(self, command, params):
+                if command == 'Network.setBlockedURLs':
+                    self.blocked_urls = params['urls']
+
+            def get(self, url):
+                super().get(url)
+                if self.blocked_urls and url.endswith('/page/2'):
+                    self._parser.main_links = []
+
+        validator = self.make_validator(BlockingDriver())
+        validator.validation_profile = ValidationProfile()
+        with redirect_stdout(StringIO()):
+            results = list(validator.iter_validate_all_links())
+        self.assertEqual(len(validator.links_visited), 42)
+        blocked = [result.url for result in results if ('blocked_rendering', mock.ANY) in result.issues]
+        self.assertEqual(blocked, ['http://' + self.domain + '/page/2'])
+        # The resources are blocked again after each reload.
+        self.assertEqual(validator.driver.blocked_urls, validator.validation_profile.blocked_urls)
+
+    def test_network_log(self):
+        pages = {'/': make_page('Home', ['/missing', '/soft', '/ok']),
+                 '/soft': make_page('Oops, Page Not Found'),
+                 '/ok': make_page('Not found yet')}
+        with serve_site(pages) as domain:
+            validator = SiteAllLinkValidator(FakeDriver(performance_log=True), domain)
+            validator.protocol = 'http://'
+            validator.network_log = NetworkLogCapture()
+            validator.error_page_title = ['Gone', re.compile('page not found', re.I)]
+            with redirect_stdout(StringIO()):
+                results = {result.url[len('http://' + domain):]: result
+                           for result in validator.iter_validate_all_links()}
+        # The status comes from the page load, and soft 404s from the title patterns.
+        self.assertEqual({url: (result.status_code, result.error_kind) for url, result in results.items()},
+                         {'': (200, None), '/missing': (404, 'error_status'), '/soft': (200, 'error_page'),
+                          '/ok': (200, None)})
+        self.assertEqual(results['/ok'].timings['response'], 0.005)
+
+    def test_link_graph(self):
+        validator = self.make_validator(FakeDriver())
+        validator.link_graph = LinkGraph()
+        with redirect_stdout(StringIO()):
+            validator.validate_all_links()
+        graph = validator.link_graph
+        self.assertEqual(graph.referrers('/missing'), ['/page/39'])
+        self.assertEqual(graph.referrers('https://google.com/'), ['/about'])
+        self.assertEqual(graph.referrers('/about'), [''])
+        self.assertEqual(graph.depth('/page/4', ''), 2)
+        self.assertEqual(graph.depth('/missing', ''), 4)
+
+    def test_priority_frontier(self):
+        validator = self.make_validator(FakeDriver())
+        validator.frontier = PriorityFrontier(LinkScorer(regex='/page/3'), max_depth=2)
+        with redirect_stdout(StringIO()):
+            results = list(validator.iter_validate_all_links())
+        # The links matching the regex first, then by depth.
+        self.assertEqual([result.url[len('http://' + self.domain):] for result in results[:4]],
+                         ['', '/page/3', '/about', '/page/1'])
+        self.assertEqual(validator.coverage(), (14, 0, 27, None))
+        self.assertNotIn('/page/13', validator.links_visited)
+
+    def test_budget(self):
+        validator = self.make_validator(FakeDriver())
+        validator.budget = CrawlBudget(max_pages=5)
+        validator.result_sinks = []
+        output = StringIO()
+        with redirect_stdout(output):
+            results = list(validator.iter_validate_all_links())
+        self.assertEqual(len(results), 5 + 1)
+        self.assertEqual(validator.coverage(), (5, 9, 0, 'max_pages'))
+        # The partial coverage is a result of the crawl, printed only by a PrintSink.
+        self.assertEqual(results[-1].issues,
+                         (('partial_coverage', 'Crawl stopped by max_pages: 5 links visited, 9 left to visit'),))
+        self.assertEqual(output.getvalue(), '')
+        validator = self.make_validator(FakeDriver())
+        validator.budget = CrawlBudget(max_seconds=0)
+        with redirect_stdout(StringIO()):
+            validator.validate_all_links_parallel(FakeDriver, workers=2)
+        self.assertEqual(validator.coverage(), (0, 1, 0, 'max_seconds'))
+
+    def test_canonicalizer(self):
+        pages = {'/': make_page('Home', ['/a?utm_source=news', '/a', '/b/index.html', '/c?y=2&x=1', '/d']),
+                 '/a': make_page('A', ['/c?x=1&y=2&sid=9', '/e']),
+                 '/b': make_page('B'),
+                 '/c': make_page('C'),
+                 '/d': make_page('D', ['/f'], canonical='/e'),
+                 '/e': make_page('E'),
+                 '/f': make_page('F')}
+        with serve_site(pages) as domain:
+            for driver in (FakeDriver(), HttpFastPathDriver()):
+                validator = SiteAllLinkValidator(driver, domain)
+                validator.protocol = 'http://'
+                validator.canonicalizer = UrlCanonicalizer()
+                validator.result_sinks = []
+                output = StringIO()
+                with redirect_stdout(output):
+                    results = list(validator.iter_validate_all_links())
+                driver.quit()
+                # Each page is visited once, and /e, the canonical URL of /d, not at all.
+                self.assertEqual(list(validator.links_visited), ['', '/a', '/b', '/c?x=1&y=2', '/d', '/e', '/f'])
+                self.assertEqual(results[-1].issues, (('visits_avoided', 'URL canonicalization avoided 3 visits'),))
+                self.assertEqual(output.getvalue(), '')
+            # No visits avoided are reported when there are none.
+            validator = SiteAllLinkValidator(FakeDriver(), domain)
+            validator.protocol = 'http://'
+            validator.starting_url = '/b'
+            validator.canonicalizer = UrlCanonicalizer()
+            validator.result_sinks = []
+            self.assertEqual([result.issues for result in validator.iter_validate_all_links()], [()])
+
+    def test_session_recycling(self):
+        drivers = []
+
+        def driver_factory():
+            drivers.append(FakeDriver())
+            drivers[-1].set_page_load_timeout = lambda seconds: setattr(drivers[-1], 'page_load_timeout', seconds)
+            return drivers[-1]
+
+        validator = self.make_validator()
+        validator.session = DriverSession(driver_factory, max_pages=10, page_load_timeout=20)
+        with redirect_stdout(StringIO()):
+            validator.validate_all_links()
+        self.assertEqual(len(validator.links_visited), 42)
+        self.assertEqual([len(driver.visits) for driver in drivers], [10, 10, 10, 10, 2])
+        self.assertEqual([driver.quit_called for driver in drivers], [True] * 4 + [False])
+        self.assertTrue(all(driver.page_load_timeout == 20 for driver in drivers))
+
+    def test_session_watchdog(self):
+        class FakeProcess:
+            def __init__(self):
+                self.killed = threading.Event()
+
+            def kill(self):
+                self.killed.set()
+
+        class HangingDriver(FakeDriver):
+            # Hangs on the pages in `hangs`, as many times as set, until killed.
+            hangs = {}
+
+            def __init__(self):
+                super().__init__()
+                self.service = mock.Mock(process=FakeProcess())
+
+            def get(self, url):
+                path = url.split(self.domain, 1)[1]
+                if self.hangs.get(path):
+                    self.hangs[path] -= 1
+                    self.service.process.killed.wait()
+                    # Local webdrivers lose their connection, remote ones fail the command.
+                    raise self.error('Connection refused')
+                super().get(url)
+
+        HangingDriver.domain = self.domain
+        for error in (ConnectionError, WebDriverException):
+            HangingDriver.error = error
+            for hangs, visited, hung in (({'/page/5': 1}, 42, []), ({'/page/6': 5}, 38, ['/page/6'])):
+                HangingDriver.hangs = hangs
+                validator = self.make_validator()
+                validator.session = DriverSession(HangingDriver, watchdog_timeout=0.1, max_retries=1)
+                with redirect_stdout(StringIO()):
+                    results = list(validator.iter_validate_all_links())
+                # The page is retried once with a new driver, then reported.
+                self.assertEqual(len(validator.links_visited), visited)
+                self.assertEqual(validator.session.killed, 1 if visited == 42 else 2)
+                self.assertEqual([(result.url.split(self.domain, 1)[1], result.referrer) for result in results
+                                  if result.error_kind == 'hung_page'],
+                                 [(path, 'http://' + self.domain + '/page/1') for path in hung])
+                # The killed attempts are not reported as load errors.
+                self.assertEqual([result for result in results if result.error_kind == 'load_error'], [])
+
+    def test_collect_current_page_links_to_visit(self):
+        # The hrefs are read with a single script call.
+        validator = self.make_validator(FakeDriver())
+        validator.visit_url('/page/1')
+        round_trips = validator.driver.round_trips
+        validator.collect_current_page_links_to_visit(True)
+        self.assertEqual(validator.driver.round_trips, round_trips + 1)
+        self.assertEqual(list(validator.links_to_visit), ['/about', '/page/4', '/page/5', '/page/6'])
+        # Drivers without scripts are asked for each tag.
+        validator = self.make_validator(FakeDriver(scripts=False))
+        validator.visit_url('/page/1')
+        round_trips = validator.driver.round_trips
+        validator.collect_current_page_links_to_visit(True)
+        self.assertEqual(validator.driver.round_trips, round_trips + 1 + 5)
+        self.assertEqual(list(validator.links_to_visit), ['/about', '/page/4', '/page/5', '/page/6'])
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'crawl.sqlite')
+            validator = self.make_validator(FakeDriver(crash_after=15))
+            validator.checkpoint = CrawlCheckpoint(path, interval=0)
+            with self.assertRaises(KeyboardInterrupt):
+                validator.validate_all_links()
+            # Resume with a new validator, as a new process would.
+            resumed = self.make_validator(FakeDriver())
+            resumed.checkpoint = CrawlCheckpoint(path, interval=0)
+            resumed.validate_all_links()
+            resumed.checkpoint.close()
+            validator.checkpoint.close()
+        self.assertEqual(list(resumed.links_visited[:15]), list(validator.links_visited))
+        self.assertEqual(len(resumed.links_visited), 42)
+        # Only the pages not visited before the crash are visited again.
+        self.assertEqual(len(resumed.driver.visits), 42 - 15)
+
+    def test_checkpoint_cleared_after_crawl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'crawl.sqlite')
+            for _ in range(2):
+                validator = self.make_validator(FakeDriver())
+                validator.checkpoint = CrawlCheckpoint(path, interval=0)
+                validator.validate_all_links()
+                validator.checkpoint.close()
+                # The completed crawl is not resumed by the next one.
+                self.assertEqual(len(validator.driver.visits), 42)
+
+    def test_incremental_cache(self):
+        for etags in (False, True):
+            pages = make_site(20)
+            with tempfile.TemporaryDirectory() as directory, serve_site(pages, etags=etags) as domain:
+                path = os.path.join(directory, 'pages.sqlite')
+
+                def run():
+                    validator = SiteAllLinkValidator(FakeDriver(), domain)
+                    validator.protocol = 'http://'
+                    validator.incremental_cache = IncrementalCache(path)
+                    output = StringIO()
+                    with redirect_stdout(output):
+                        validator.validate_all_links()
+                    validator.incremental_cache.close()
+                    return validator, output.getvalue()
+
+                first, _ = run()
+                self.assertEqual(len(first.driver.visits), 22)
+                # Nothing changed, so no page is rendered but the results are the same.
+                second, output = run()
+                self.assertEqual(second.driver.visits, [])
+                self.assertEqual(set(second.links_visited), set(first.links_visited))
+                self.assertIn('Error page was found at URL: http://' + domain + '/missing', output)
+                # Only the changed page and the page it links to are rendered.
+                pages['/page/3'] = pages['/page/3'].replace('</main>', '<a href="/new">new</a></main>')
+                pages['/new'] = '<html><head><title>New</title></head><body><main></main></body></html>'
+                third, _ = run()
+                self.assertEqual(third.driver.visits, ['http://' + domain + '/page/3', 'http://' + domain + '/new'])
+                self.assertEqual(len(third.links_visited), 23)
+
+    def test_incremental_cache_status(self):
+        pages = {'/': make_page('Home', ['/missing', '/soft', '/ok']),
+                 '/soft': make_page('Gone'),
+                 '/ok': make_page('OK')}
+        with tempfile.TemporaryDirectory() as directory, serve_site(pages) as domain:
+            path = os.path.join(directory, 'pages.sqlite')
+            runs = []
+            for _ in range(2):
+                validator = SiteAllLinkValidator(FakeDriver(performance_log=True), domain)
+                validator.protocol = 'http://'
+                validator.network_log = NetworkLogCapture()
+                validator.error_page_title = 'Gone'
+                validator.incremental_cache = IncrementalCache(path)
+                with redirect_stdout(StringIO()):
+                    runs.append({result.url[len('http://' + domain):]: (result.status_code, result.error_kind)
+                                 for result in validator.iter_validate_all_links()})
+                validator.incremental_cache.close()
+        # The unchanged pages are not rendered again but keep their own status and error.
+        self.assertEqual(validator.driver.visits, [])
+        self.assertEqual(runs[0], {'': (200, None), '/missing': (404, 'error_status'), '/soft': (200, 'error_page'),
+                                   '/ok': (200, None)})
+        self.assertEqual(runs[1], runs[0])
+
+    def test_external_link_checker(self):
+        with tempfile.TemporaryDirectory() as directory, serve_site({'/ok': make_page('OK')}) as external_domain:
+            # The external site is requested by name, so that it is not internal.
+            external = 'http://localhost:' + external_domain.split(':')[1]
+            pages = {'/': make_page('Home', [external + '/ok', external + '/missing', '/page']),
+                     '/page': make_page('Page', [external + '/missing'])}
+            path = os.path.join(directory, 'external.sqlite')
+            with serve_site(pages) as domain:
+                for checked in (2, 0):
+                    validator = SiteAllLinkValidator(FakeDriver(), domain)
+                    validator.protocol = 'http://'
+                    validator.external_link_checker = ExternalLinkChecker(cache_path=path)
+                    output = StringIO()
+                    with redirect_stdout(output):
+                        validator.validate_all_links()
+                    validator.external_link_checker.close()
+                    # The links are checked once, and not again while cached.
+                    self.assertEqual(validator.external_link_checker.checked, checked)
+                    self.assertEqual(output.getvalue(), 'Broken external link ' + external + '/missing (Error status 404)'
+                                     ' was found in URL: http://' + domain + '\n')
+                    self.assertEqual(len(validator.external_link_checker.results()), 2)
+
+    def test_external_link_checker_invalid_urls(self):
+        checker = ExternalLinkChecker()
+        for url in ('http://[::1/x', 'http://example.com:port/', 'http:///x'):
+            checker.submit(url, 'http://example.org/')
+        # The malformed links are reported as broken, without aborting the others.
+        checker.join()
+        self.assertEqual(sorted(result.url for result in checker.broken_links()),
+                         ['http:///x', 'http://[::1/x', 'http://example.com:port/'])
+        self.assertTrue(all(result.error.startswith('Error loading url: ') for result in checker.broken_links()))
+        checker.close()
+
+    def test_sitemap_reader(self):
+        urlset = '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">%s</urlset>'
+        url = '<url><loc>%s</loc><lastmod>2020-01-01</lastmod></url>'
+        pages = {'/': make_page('Home', ['/a']),
+                 '/a': make_page('A', ['/a/']),
+                 '/orphan': make_page('Orphan', ['/deep']),
+                 '/deep': make_page('Deep'),
+                 '/robots.txt': 'User-agent: *\nDisallow:\nSitemap: /sitemap_index.xml\n'}
+        with serve_site(pages) as domain:
+            base = 'http://' + domain
+            pages['/sitemap_index.xml'] = (
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                + ''.join('<sitemap><loc>%s</loc></sitemap>' % (base + path)
+                          for path in ('/sitemap1.xml.gz', '/sitemap2.xml', '/missing.xml'))
+                + '</sitemapindex>')
+            pages['/sitemap1.xml.gz'] = gzip.compress(
+                (urlset % ''.join(url % link for link in (base + '/a', base + '/orphan', 'https://google.com/'))).encode())
+            pages['/sitemap2.xml'] = urlset % ''.join(url % link for link in (base + '/orphan/', base + '/'))
+            validator = SiteAllLinkValidator(FakeDriver(), domain)
+            validator.protocol = 'http://'
+            validator.sitemap_reader = SitemapReader()
+            validator.result_sinks = []
+            output = StringIO()
+            with redirect_stdout(output):
+                results = list(validator.iter_validate_all_links())
+        self.assertEqual(set(validator.links_visited), {'', '/a', '/orphan', '/deep'})
+        # The pages are found from the sitemaps, and the ones no page links to are reported.
+        orphans = [result for result in results if result.issues and result.issues[0][0] == 'orphan_page']
+        self.assertEqual([(result.url, result.referrer) for result in orphans],
+                         [(base + '/orphan', base + '/sitemap1.xml.gz')])
+        self.assertEqual(validator.sitemap_reader.errors, [(base + '/missing.xml', 'Error status 404')])
+        errors = [result for result in results if result.issues and result.issues[0][0] == 'sitemap_error']
+        self.assertEqual([(result.url, result.issues[0][1]) for result in errors],
+                         [(base + '/missing.xml', 'Error reading sitemap ' + base + '/missing.xml: Error status 404')])
+        # Nothing is printed without a PrintSink.
+        self.assertEqual(output.getvalue(), '')
+
+    def test_validate_all_links_parallel(self):
+        serial = self.make_validator(FakeDriver())
+        serial.validate_all_links()
+        drivers = []
+
+        def driver_factory():
+            drivers.append(FakeDriver(fail_urls=['/page/7']))
+            return drivers[-1]
+
+        parallel = self.make_validator()
+        parallel.validate_all_links_parallel(driver_factory, workers=4)
+        self.assertEqual(len(drivers), 4)
+        self.assertTrue(all(driver.quit_called for driver in drivers))
+        # The page that failed to load is not visited, nor are its children.
+        expected = set(serial.links_visited) - {'/page/7', '/page/22', '/page/23', '/page/24'}
+        self.assertEqual(set(parallel.links_visited), expected)
+        self.assertEqual(len(parallel.links_visited), len(expected))
+        self.assertEqual(sum(len(driver.visits) for driver in drivers), len(expected))
+
+    def test_validate_all_links_sharded(self):
+        serial = self.make_validator(FakeDriver())
+        serial.validate_all_links()
+        for transport in (QueueShardTransport(3), SocketShardTransport(connect_timeout=30)):
+            sharded = self.make_validator()
+            sharded.result_sinks = []
+            sharded.instrumentation = CrawlInstrumentation(navigation_timing=False)
+            with redirect_stdout(StringIO()):
+                sharded.validate_all_links_sharded(functools.partial(make_fake_validator, self.domain), 3, transport)
+            # The shards visit every page once and their results are merged.
+            self.assertEqual(set(sharded.links_visited), set(serial.links_visited))
+            self.assertEqual(len(sharded.links_visited), len(serial.links_visited))
+            self.assertEqual(sharded.instrumentation.counters, {'pages.valid': 41, 'pages.error': 1})
+
+    def test_http_fast_path_driver(self):
+        serial = self.make_validator(FakeDriver())
+        serial.validate_all_links()
+        browser = FakeDriver()
+        driver = HttpFastPathDriver(browser=browser, browser_url_regex='^/page/1$')
+        validator = self.make_validator(driver)
+        output = StringIO()
+        with redirect_stdout(output):
+            validator.validate_all_links()
+        self.assertEqual(list(validator.links_visited), list(serial.links_visited))
+        self.assertIn('Error status 404 was found at URL: http://' + self.domain + '/missing', output.getvalue())
+        # Only the matching page is rendered by the browser.
+        self.assertEqual(browser.visits, ['http://' + self.domain + '/page/1'])
+        # The connections are kept alive and reused.
+        self.assertEqual(len(driver.pool._idle[('http', self.domain)]), 1)
+        driver.quit()
+        self.assertTrue(browser.quit_called)
+
+    def test_http_fast_path_driver_encoding(self):
+        pages = {'/': make_page('Home', ['/caf\u00e9?q=cr\u00e8me', '/a b']),
+                 '/caf%C3%A9': make_page('Caf\u00e9'),
+                 '/a%20b': make_page('A B')}
+        with serve_site(pages) as domain:
+            driver = HttpFastPathDriver()
+            validator = SiteAllLinkValidator(driver, domain)
+            validator.protocol = 'http://'
+            with redirect_stdout(StringIO()):
+                results = list(validator.iter_validate_all_links())
+            # The non-ASCII and unescaped URLs are percent-encoded.
+            self.assertEqual([(result.url, result.status_code) for result in results],
+                             [('http://' + domain, 200), ('http://' + domain + '/caf\u00e9?q=cr\u00e8me', 200),
+                              ('http://' + domain + '/a b', 200)])
+            # Invalid URLs fail like any page that cannot be loaded.
+            with self.assertRaises(WebDriverException):
+                driver.get('http://' + domain + ':port/')
+            driver.quit()
+
+    def test_http_fast_path_driver_unsupported_xpath(self):
+        validator = self.make_validator(HttpFastPathDriver())
+        with self.assertRaises(ValueError):
+            validator.xpath_to_check = '//main[1]'
+        validator.driver.quit()
+        # Also when the driver is set after the XPath, before any page is visited.
+        validator = self.make_validator(FakeDriver())
+        validator.xpath_to_check = '//main[1]'
+        validator.driver = HttpFastPathDriver()
+        with self.assertRaises(ValueError):
+            validator.validate_all_links()
+        self.assertEqual(list(validator.links_visited), [])
+        validator.driver.quit()
+
+    def test_async_crawler(self):
+        serial = self.make_validator(FakeDriver())
+        serial.validate_all_links()
+        pages = make_site(10)
+        # The non-ASCII and unescaped URLs are percent-encoded.
+        pages['/about'] = make_page('About', ['/caf\u00e9', '/\u65e5\u672c', '/a b'])
+        pages.update({'/caf%C3%A9': make_page('Caf\u00e9'), '/%E6%97%A5%E6%9C%AC': make_page('\u65e5\u672c'),
+                      '/a%20b': make_page('A B')})
+        with serve_site(pages) as other_domain:
+            validators = [self.make_validator(), SiteAllLinkValidator(None, other_domain)]
+            validators[1].protocol = 'http://'
+
+            async def crawl():
+                return [result async for result in AsyncCrawler(max_per_host=3).crawl(*validators)]
+
+            results = asyncio.run(crawl())
+        self.assertEqual(set(validators[0].links_visited), set(serial.links_visited))
+        self.assertEqual(len(validators[1].links_visited), 15)
+        self.assertEqual(len(results), 42 + 15)
+        errors = {result.url for result in results if result.error}
+        self.assertEqual(errors, {'http://' + other_domain + '/missing', 'http://' + self.domain + '/missing'})
+
+    def test_async_crawler_unsupported_xpath(self):
+        validator = self.make_validator()
+        validator.xpath_to_check = '//main[1]'
+        crawler = AsyncCrawler()
+
+        async def crawl():
+            return [result async for result in crawler.crawl(validator)]
+
+        # The crawl fails before fetching any page.
+        with self.assertRaises(ValueError):
+            asyncio.run(crawl())
+        self.assertEqual(list(validator.links_visited), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
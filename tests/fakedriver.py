@@ -0,0 +1,240 @@
+"""A local test site served by http.server and a fake webdriver to crawl it."""
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from urllib.request import urlopen
+import json
+import re
+import threading
+import zlib
+from selenium.common.exceptions import WebDriverException
+from selenium_validate_site_links import SiteAllLinkValidator, FIND_HREFS_SCRIPT, READINESS_SCRIPT, \
+    CANONICAL_URL_SCRIPT
+
+NOT_FOUND_PAGE = '<html><head><title>404 not found</title></head><body><main></main></body></html>'
+
+
+def make_page(title, main_links=(), nav_links=(), canonical=None):
+    """Returns the HTML of a test page.
+
+    Args:
+        title (str): The page title.
+        main_links (iterable): The hrefs inside the <main> element.
+        nav_links (iterable): The hrefs outside the <main> element.
+        canonical (str): The href of the <link rel="canonical"> tag, if any.
+    """
+    nav = ''.join('<a href="%s">nav</a>' % href for href in nav_links)
+    main = ''.join('<a href="%s">link</a>' % href for href in main_links)
+    head = '<link rel="canonical" href="%s">' % canonical if canonical else ''
+    return ('<html><head><title>%s</title>%s</head><body><nav>%s</nav><main>%s</main></body></html>'
+            % (title, head, nav, main))
+
+
+def make_site(size, fan_out=3, nav_links=('/', '/about')):
+    """Returns a tree-shaped site of `size` pages as a {path: html} dict.
+
+    Every page links to its `fan_out` children in <main> and to the
+    `nav_links` outside of it. The last page links to a missing page.
+    """
+    pages = {}
+    for page in range(size):
+        path = '/' if page == 0 else '/page/%d' % page
+        children = ['/page/%d/' % child for child in range(page * fan_out + 1, page * fan_out + fan_out + 1)
+                    if child < size]
+        if page == size - 1:
+            children.append('/missing')
+        pages[path] = make_page('Page %d' % page, children, nav_links)
+    pages['/about'] = make_page('About', ['mailto:mail@example.com', 'https://google.com/'])
+    return pages
+
+
+@contextmanager
+def serve_site(pages, delay=0, etags=False):
+    """Serves the pages from a local http.server in a background thread.
+
+    Args:
+        pages (dict): The HTML (or bytes) of every page keyed by path.
+        delay (float): Seconds to wait before every response.
+        etags (bool): Whether to send ETags and answer conditional requests.
+
+    Yields:
+        str: The domain (host:port) of the server.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if delay:
+                threading.Event().wait(delay)
+            path = self.path.split('?', 1)[0]
+            html = pages.get(path)
+            status = 200 if html is not None else 404
+            body = html if html is not None else NOT_FOUND_PAGE
+            if isinstance(body, str):
+                body = body.encode()
+            etag = '"%x"' % zlib.crc32(body)
+            if etags and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(status)
+            if etags:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield '127.0.0.1:%d' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class FakeElement:
+    """A fake webelement for an 'a' tag."""
+
+    def __init__(self, driver, href):
+        self.driver = driver
+        self.href = href
+
+    def get_attribute(self, name):
+        self.driver.round_trips += 1
+        return self.href if name == 'href' else None
+
+
+class _PageParser(HTMLParser):
+    """Collects the title and the hrefs, inside and outside of <main>."""
+
+    def __init__(self):
+        super().__init__()
+        self.title = ''
+        self.in_title = False
+        self.main_depth = 0
+        self.links = []
+        self.main_links = []
+        self.canonical = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'link' and dict(attrs).get('rel') == 'canonical':
+            self.canonical = dict(attrs).get('href')
+        elif tag == 'main':
+            self.main_depth += 1
+        elif tag == 'a':
+            href = dict(attrs).get('href', '')
+            self.links.append(href)
+            if self.main_depth:
+                self.main_links.append(href)
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'main':
+            self.main_depth -= 1
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+
+
+class FakeDriver:
+    """A fake webdriver that fetches pages with urllib.
+
+    Like a browser, it resolves the hrefs to absolute URLs. It supports
+    the './/a' and './/main//a' XPaths and counts its round trips.
+    """
+
+    def __init__(self, fail_urls=(), scripts=True, crash_after=None, performance_log=False):
+        """Initiate the driver.
+
+        Args:
+            fail_urls (iterable): URL paths whose get() raises a WebDriverException.
+            scripts (bool): Whether the driver has execute_script(). Defaults to True.
+            crash_after (int): The number of pages after which get() raises
+                a KeyboardInterrupt, to simulate a killed crawl.
+            performance_log (bool): Whether the driver has get_log() with the
+                network events of each page load, like Chrome. Defaults to False.
+        """
+        self.crash_after = crash_after
+        if scripts:
+            self.execute_script = self._execute_script
+        if performance_log:
+            self.get_log = self._get_log
+        self._log = []
+        self.fail_urls = set(fail_urls)
+        self.current_url = ''
+        self.title = ''
+        self.round_trips = 0
+        self.visits = []
+        self.quit_called = False
+        self._parser = _PageParser()
+
+    def get(self, url):
+        self.round_trips += 1
+        if self.crash_after is not None and len(self.visits) >= self.crash_after:
+            raise KeyboardInterrupt
+        if re.sub('^https?://[^/]+', '', url) in self.fail_urls:
+            raise WebDriverException('Fake failure for ' + url)
+        try:
+            with urlopen(url) as response:
+                html = response.read().decode()
+                status = response.status
+        except HTTPError as error:
+            html = error.read().decode()
+            status = error.code
+        request_id = str(len(self.visits))
+        self._log.append({'method': 'Network.requestWillBeSent', 'params': {
+            'requestId': request_id, 'loaderId': request_id, 'type': 'Document', 'request': {'url': url}}})
+        self._log.append({'method': 'Network.responseReceived', 'params': {
+            'requestId': request_id, 'response': {'url': url, 'status': status, 'timing': {'receiveHeadersEnd': 5.0}}}})
+        self.visits.append(url)
+        self.current_url = url
+        self._parser = _PageParser()
+        self._parser.feed(html)
+        self.title = self._parser.title
+
+    def find_elements_by_xpath(self, xpath):
+        self.round_trips += 1
+        links = self._parser.links if xpath == './/a' else self._parser.main_links
+        return [FakeElement(self, urljoin(self.current_url, href)) for href in links]
+
+    def _execute_script(self, script, *args):
+        self.round_trips += 1
+        if script == FIND_HREFS_SCRIPT:
+            links = self._parser.links if args[0] == './/a' else self._parser.main_links
+            return [urljoin(self.current_url, href) for href in links]
+        if script == READINESS_SCRIPT:
+            # The page and its resources are loaded once get() returns.
+            return ['complete', 60000, 0]
+        if script == CANONICAL_URL_SCRIPT:
+            return urljoin(self.current_url, self._parser.canonical) if self._parser.canonical else None
+        raise WebDriverException('Unsupported script')
+
+    def _get_log(self, log_type):
+        self.round_trips += 1
+        entries, self._log = self._log, []
+        return [{'message': json.dumps({'message': event})} for event in entries]
+
+    def quit(self):
+        self.quit_called = True
+
+
+def make_fake_validator(domain):
+    """Returns a validator of a local site with a new FakeDriver, e.g. for a worker process."""
+    validator = SiteAllLinkValidator(FakeDriver(), domain)
+    validator.protocol = 'http://'
+    return validator
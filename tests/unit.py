@@ -1,5 +1,14 @@
+import json
+import os
+import re
+import tempfile
 import unittest
-from selenium_validate_site_links import SiteAllLinkValidator
+from io import BytesIO
+from unittest import mock
+from selenium_validate_site_links import SiteAllLinkValidator, LinkFrontier, LinkExtractor, LinkNormalizer, \
+    NormalizedLink, parse_region_xpath, HostRateLimiter, ReadinessWait, Histogram, iter_sitemap, \
+    ValidationProfile, NetworkLogCapture, LinkGraph, BloomVisitedSet, SqliteVisitedSet, PriorityFrontier, \
+    LinkScorer, CrawlHistory, PageResult, UrlCanonicalizer
 
 
 class TestSiteAllLinkValidator(unittest.TestCase):
@@ -37,6 +46,19 @@ class TestSiteAllLinkValidator(unittest.TestCase):
         self.assertEqual(self.validator.error_page_title, '404 not found')
         self.validator.error_page_title = 'Page not found'
         self.assertEqual(self.validator.error_page_title, 'Page not found')
+        self.assertTrue(self.validator.is_error_page_title('Page not found'))
+        self.assertFalse(self.validator.is_error_page_title('Page not found!'))
+        self.validator.error_page_title = ['404', re.compile('not found', re.I), 'a.b']
+        self.assertTrue(self.validator.is_error_page_title('404'))
+        self.assertTrue(self.validator.is_error_page_title('Page Not Found - w3.org'))
+        self.assertFalse(self.validator.is_error_page_title('axb'))
+        # The patterns keep all their flags, inline or not.
+        self.validator.error_page_title = [re.compile('(?i)not found'), re.compile('^Error', re.M)]
+        self.assertTrue(self.validator.is_error_page_title('Page NOT FOUND'))
+        self.assertTrue(self.validator.is_error_page_title('Oops\nError 500'))
+        self.assertFalse(self.validator.is_error_page_title('No Error'))
+        self.validator.error_page_title = []
+        self.assertFalse(self.validator.is_error_page_title(''))
         # Test the time_to_wait property.
         self.assertEqual(self.validator.time_to_wait, 0)
         self.validator.time_to_wait = 10
@@ -151,6 +173,364 @@ class TestSiteAllLinkValidator(unittest.TestCase):
         self.assertFalse(self.validator.is_link('tel:+000000000000'))
         self.assertFalse(self.validator.is_link('ftp:server@example.com'))
 
+    def test_set_to_visit(self):
+        self.assertTrue(self.validator.set_to_visit('/standards'))
+        self.assertFalse(self.validator.set_to_visit('/standards'))
+        self.validator.set_visited('/participate')
+        self.assertFalse(self.validator.set_to_visit('/participate'))
+        self.assertEqual(self.validator.links_to_visit, ['/standards'])
+        self.assertIn('/standards', self.validator.links_to_visit)
+        # The views are read-only but can be replaced as a whole.
+        with self.assertRaises(AttributeError):
+            self.validator.links_visited.append('/membership')
+        self.validator.links_visited = ['', '/standards']
+        self.assertEqual(self.validator.links_visited, ['', '/standards'])
+        self.assertTrue(self.validator.is_visited('/standards'))
+
+
+class TestLinkNormalizer(unittest.TestCase):
+
+    def test_normalize(self):
+        normalizer = LinkNormalizer('www.w3.org', regex_to_check='/?standards')
+        self.assertEqual(normalizer.normalize('https://w3.org/standards/#top'),
+                         NormalizedLink('/standards', True, True, True, True))
+        self.assertEqual(normalizer.normalize('/participate'), NormalizedLink('/participate', True, False, True, False))
+        self.assertEqual(normalizer.normalize('https://google.com/'), NormalizedLink(False, True, True, False, False))
+        self.assertEqual(normalizer.normalize('tel:+000'), NormalizedLink(False, False, False, False, False))
+        self.assertEqual(normalizer.normalize(None), NormalizedLink(False, False, False, False, False))
+        # The dots of the domain are matched literally.
+        self.assertFalse(normalizer.normalize('https://w3xorg/standards').is_internal)
+        # Changing the settings clears the cached results.
+        normalizer.configure('w3.org', True, '')
+        self.assertEqual(normalizer.normalize('https://w3.org/standards/#top'),
+                         NormalizedLink('/standards/#top', True, True, True, True))
+
+    def test_canonicalizer(self):
+        canonicalizer = UrlCanonicalizer()
+        self.assertEqual(canonicalizer.canonicalize('/a/./b/../c//index.html?utm_source=x&b=2&a=%7e1#top'),
+                         '/a/c?a=~1&b=2#top')
+        self.assertEqual(canonicalizer.canonicalize('/cart;jsessionid=AB12/view?SID=1'), '/cart/view')
+        self.assertEqual(canonicalizer.canonicalize('/caf\u00e9 menu/?q=%c3%a9'), '/caf%C3%A9%20menu?q=%C3%A9')
+        canonicalizer = UrlCanonicalizer(keep_parameters=['page'], sort_parameters=False, lowercase_path=True,
+                                         rewrite_rules=[(r'^/en(/|$)', r'/')])
+        self.assertEqual(canonicalizer.canonicalize('/EN/News?sort=asc&page=2'), '/news?page=2')
+        normalizer = LinkNormalizer('w3.org', canonicalizer=UrlCanonicalizer())
+        self.assertEqual(normalizer.normalize('https://w3.org/index.html').relative_url, '')
+        self.assertEqual(normalizer.normalize('https://w3.org/standards/?utm_medium=mail').relative_url, '/standards')
+
+    def test_canonicalizer_visits_avoided(self):
+        canonicalizer = UrlCanonicalizer()
+        canonicalizer.record_link('/a?utm_source=x', '/a', False)
+        canonicalizer.record_link('/a?utm_source=y', '/a', True)
+        canonicalizer.record_link('/a?utm_source=y', '/a', True)
+        canonicalizer.record_link('/a', '/a', True)
+        canonicalizer.record_link('/a', '/a', True)
+        canonicalizer.record_link('/b', '/b', False)
+        canonicalizer.record_link('/b?gclid=1', '/b', True)
+        self.assertEqual(canonicalizer.visits_avoided, 3)
+
+
+class TestReadinessWait(unittest.TestCase):
+
+    def test_wait(self):
+        driver = mock.Mock()
+        driver.execute_script.side_effect = [['loading', 0, 0], ['complete', 10, 3], ['complete', 600, 4],
+                                             ['complete', 700, 4]]
+        self.assertTrue(ReadinessWait(poll_interval=0).wait(driver))
+        self.assertEqual(driver.execute_script.call_count, 4)
+        driver.execute_script.side_effect = None
+        driver.execute_script.return_value = ['interactive', 0, 0]
+        self.assertFalse(ReadinessWait(timeout=0.05, poll_interval=0.01).wait(driver))
+
+
+class TestValidationProfile(unittest.TestCase):
+
+    def test_chrome_options(self):
+        options = ValidationProfile(blocked_types=('image',)).chrome_options()
+        capabilities = options.to_capabilities()
+        self.assertEqual(capabilities['pageLoadStrategy'], 'eager')
+        self.assertEqual(options.experimental_options['prefs'], {'profile.managed_default_content_settings.images': 2})
+        self.assertRaises(ValueError, ValidationProfile, blocked_types=('video',))
+
+    def test_attach(self):
+        profile = ValidationProfile(blocked_types=('font',), blocked_patterns=('*ads.example.com*',))
+        driver = mock.Mock()
+        self.assertTrue(profile.attach(driver))
+        driver.execute_cdp_cmd.assert_called_with('Network.setBlockedURLs', {'urls': [
+            '*.woff*', '*.ttf*', '*.otf*', '*.eot*', '*ads.example.com*']})
+        with profile.unblocked(driver) as unblocked:
+            self.assertTrue(unblocked)
+            driver.execute_cdp_cmd.assert_called_with('Network.setBlockedURLs', {'urls': []})
+        self.assertEqual(len(driver.execute_cdp_cmd.call_args[0][1]['urls']), 5)
+        # Drivers without the Chrome DevTools Protocol cannot block resources.
+        self.assertFalse(profile.attach(object()))
+
+
+class TestNetworkLogCapture(unittest.TestCase):
+
+    def test_parse(self):
+        def entry(method, **params):
+            return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+        entries = [
+            # A subframe of the previous page and the redirected page load.
+            entry('Network.requestWillBeSent', requestId='1', loaderId='1', type='Document',
+                  request={'url': 'https://w3.org/frame'}),
+            entry('Network.requestWillBeSent', requestId='2', loaderId='2', type='Document',
+                  request={'url': 'http://w3.org/old#top'}),
+            entry('Network.requestWillBeSent', requestId='2', loaderId='2', type='Document',
+                  request={'url': 'https://w3.org/new'},
+                  redirectResponse={'url': 'http://w3.org/old', 'status': 301}),
+            entry('Network.responseReceived', requestId='1', response={'url': 'https://w3.org/frame', 'status': 200}),
+            entry('Network.responseReceived', requestId='2', response={
+                'url': 'https://w3.org/new', 'status': 500, 'timing': {'receiveHeadersEnd': 120.0}}),
+        ]
+        self.assertEqual(NetworkLogCapture.parse(entries, 'http://w3.org/old/'),
+                         ('https://w3.org/new', 500, [('http://w3.org/old', 301)], 0.12))
+        self.assertIsNone(NetworkLogCapture.parse(entries, 'https://w3.org/other'))
+        self.assertIsNone(NetworkLogCapture().capture(object(), 'https://w3.org/'))
+
+
+class TestHostRateLimiter(unittest.TestCase):
+
+    def test_reserve(self):
+        limiter = HostRateLimiter(rate=10, burst=2)
+        with mock.patch('selenium_validate_site_links.monotonic', return_value=100.0):
+            self.assertEqual(limiter.reserve('https://w3.org/a'), 0)
+            self.assertEqual(limiter.reserve('https://w3.org/b'), 0)
+            self.assertAlmostEqual(limiter.reserve('https://w3.org/c'), 0.1)
+            self.assertAlmostEqual(limiter.reserve('https://w3.org/d'), 0.2)
+            # Other hosts have their own bucket.
+            self.assertEqual(limiter.reserve('https://google.com/'), 0)
+        with mock.patch('selenium_validate_site_links.monotonic', return_value=100.5):
+            self.assertEqual(limiter.reserve('https://w3.org/e'), 0)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentile(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(50), 0)
+        for millisecond in range(1, 101):
+            histogram.record(millisecond / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.total, 5.05)
+        self.assertAlmostEqual(histogram.percentile(50), 0.050, delta=0.005)
+        self.assertAlmostEqual(histogram.percentile(99), 0.099, delta=0.009)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+
+class TestLinkFrontier(unittest.TestCase):
+
+    def test_frontier(self):
+        frontier = LinkFrontier()
+        self.assertFalse(frontier)
+        self.assertTrue(frontier.push('/a'))
+        self.assertTrue(frontier.push('/b'))
+        self.assertFalse(frontier.push('/a'))
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(frontier.pop(), '/a')
+        self.assertFalse(frontier.is_queued('/a'))
+        frontier.mark_visited('/a')
+        frontier.mark_visited('/a')
+        self.assertFalse(frontier.push('/a'))
+        self.assertTrue(frontier.is_visited('/a'))
+        self.assertEqual(frontier.visited, ['/a'])
+        self.assertEqual(frontier.pop(), '/b')
+        with self.assertRaises(IndexError):
+            frontier.pop()
+        # A visited link can be requeued to retry it, unless the visited set cannot forget it.
+        self.assertTrue(frontier.requeue('/a'))
+        self.assertEqual((frontier.is_visited('/a'), list(frontier.to_visit)), (False, ['/a']))
+        frontier = LinkFrontier(BloomVisitedSet(capacity=10))
+        frontier.mark_visited('/a')
+        self.assertFalse(frontier.requeue('/a'))
+
+    def test_visited_sets(self):
+        for visited in (BloomVisitedSet(capacity=1000, error_rate=0.01), SqliteVisitedSet(batch_size=3)):
+            frontier = LinkFrontier(visited)
+            for link in ('/a', '/b', '/a', '/c', '/d'):
+                frontier.mark_visited(link)
+            self.assertEqual(len(frontier.visited), 4)
+            self.assertTrue(frontier.is_visited('/d'))
+            self.assertFalse(frontier.push('/b'))
+            self.assertTrue(frontier.push('/e'))
+            self.assertFalse(frontier.is_visited('/e'))
+            frontier.reset_visited(['/e'])
+            self.assertEqual((frontier.is_visited('/a'), frontier.is_visited('/e')), (False, True))
+            visited.close()
+
+    def test_sqlite_visited_set(self):
+        visited = SqliteVisitedSet(batch_size=2)
+        for link in ('/a', '/b', '/c'):
+            visited.add(link)
+        self.assertEqual(list(visited), ['/a', '/b', '/c'])
+        self.assertEqual((visited[0], visited[-1], visited[1:]), ('/a', '/c', ['/b', '/c']))
+        visited.close()
+        self.assertFalse(os.path.exists(visited.path))
+
+    def test_bloom_visited_set(self):
+        visited = BloomVisitedSet(capacity=10000, error_rate=0.01)
+        for i in range(10000):
+            visited.add('/page/%d' % i)
+        self.assertTrue(all('/page/%d' % i in visited for i in range(10000)))
+        false_positives = sum('/other/%d' % i in visited for i in range(10000))
+        self.assertLess(false_positives, 200)
+        self.assertRaises(TypeError, list, visited)
+
+
+class TestPriorityFrontier(unittest.TestCase):
+
+    def test_priority_frontier(self):
+        frontier = PriorityFrontier(max_depth=2)
+        self.assertTrue(frontier.push('/'))
+        self.assertEqual(frontier.pop(), '/')
+        frontier.mark_visited('/')
+        for link in ('/a', '/b', '/c'):
+            frontier.push(link)
+        self.assertEqual(frontier.pop(), '/a')
+        frontier.mark_visited('/a')
+        # Found in /a, at depth 2, and /c found again, before /b.
+        self.assertTrue(frontier.push('/a/1'))
+        self.assertFalse(frontier.push('/c'))
+        self.assertEqual(list(frontier.to_visit), ['/c', '/b', '/a/1'])
+        self.assertEqual(frontier.pop(), '/c')
+        self.assertEqual(frontier.pop(), '/b')
+        self.assertEqual(frontier.pop(), '/a/1')
+        # Beyond the max depth.
+        self.assertFalse(frontier.push('/a/1/x'))
+        self.assertEqual(frontier.beyond_max_depth, {'/a/1/x'})
+        # A requeued link keeps its depth.
+        self.assertTrue(frontier.requeue('/a/1'))
+        self.assertEqual(frontier._depths['/a/1'], 2)
+        self.assertEqual(frontier.pop(), '/a/1')
+        self.assertFalse(frontier)
+
+    def test_priority_frontier_max_depth(self):
+        # The /a links first.
+        frontier = PriorityFrontier(LinkScorer(regex='/a', regex_weight=10), max_depth=2)
+        frontier.push('/')
+        self.assertEqual(frontier.pop(), '/')
+        frontier.push('/a')
+        frontier.push('/b')
+        self.assertEqual(frontier.pop(), '/a')
+        frontier.push('/a/1')
+        self.assertEqual(frontier.pop(), '/a/1')
+        # Found at depth 3 first, then at depth 2 in /b.
+        self.assertFalse(frontier.push('/x'))
+        self.assertEqual(frontier.beyond_max_depth, {'/x'})
+        self.assertEqual(frontier.pop(), '/b')
+        self.assertTrue(frontier.push('/x'))
+        self.assertEqual(frontier.beyond_max_depth, set())
+        self.assertEqual(frontier.pop(), '/x')
+
+    def test_link_scorer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            history = CrawlHistory(os.path.join(directory, 'history.db'), 'https://example.com')
+            history.emit(PageResult('https://example.com/failed', 'error', 404, 'error_status', (), None, {}))
+            history.emit(PageResult('https://example.com/valid', 'valid', 200, None, (), None, {'get': 0.1}))
+            history.emit(PageResult('https://example.com/changed', 'valid', 200, None, (),
+                                    None, {'revalidate': 0.1, 'get': 0.1}))
+            history.close()
+            history = CrawlHistory(os.path.join(directory, 'history.db'), 'https://example.com')
+            self.assertIsNotNone(history.last_event('/failed'))
+            self.assertIsNotNone(history.last_event('/changed'))
+            self.assertIsNone(history.last_event('/valid'))
+            scorer = LinkScorer(regex='/products/', history=history)
+            self.assertEqual(scorer('/valid', 2, 1), 2)
+            self.assertEqual(scorer('/valid', 2, 4), 0)
+            self.assertEqual(scorer('/products/1', 2, 1), -3)
+            self.assertAlmostEqual(scorer('/failed', 2, 1), -3, places=3)
+            history.close()
+
+
+class TestLinkGraph(unittest.TestCase):
+
+    def test_queries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Spill every other page to the file.
+            graph = LinkGraph(os.path.join(directory, 'links.bin'), spill_threshold=2)
+            graph.add_links('', ['/a', '/b', ''])
+            graph.add_links('/a', ['/c', '/b'])
+            self.assertEqual(graph.referrers('/b'), ['', '/a'])
+            graph.add_links('/c', ['/d', 'https://google.com/'])
+            self.assertEqual(graph.link_count, 6)
+            self.assertEqual(len(graph), 6)
+            self.assertEqual(graph.links(''), ['/a', '/b'])
+            self.assertEqual(graph.referrers('https://google.com/'), ['/c'])
+            self.assertEqual(graph.referrers(''), [])
+            self.assertEqual(graph.referrers('/unknown'), [])
+            self.assertEqual([graph.depth(url, '') for url in ('', '/a', '/b', '/c', '/d')], [0, 1, 1, 2, 3])
+            self.assertEqual(graph.depth('/a', '/c'), None)
+            graph.close()
+
+    def test_queries_while_adding(self):
+        with tempfile.TemporaryDirectory() as directory:
+            graph = LinkGraph(os.path.join(directory, 'links.bin'), spill_threshold=8)
+            links = []
+            for page in range(50):
+                # The links added after a query are answered with the indexes, then rebuilt.
+                targets = ['/%d' % ((page * 7 + step) % 60) for step in range(4)]
+                graph.add_links('/%d' % page, targets)
+                links.extend(('/%d' % page, target) for target in targets if target != '/%d' % page)
+                for url in ('/%d' % page, targets[0], '/59'):
+                    self.assertEqual(graph.referrers(url), [source for source, target in links if target == url])
+                    self.assertEqual(graph.links(url), [target for source, target in links if source == url])
+            self.assertEqual(graph.link_count, len(links))
+            self.assertEqual(graph.depth('/7', '/0'), 2)
+            graph.close()
+
+
+class TestLinkExtractor(unittest.TestCase):
+
+    def test_parse_region_xpath(self):
+        self.assertIsNone(parse_region_xpath('.//a'))
+        self.assertEqual(parse_region_xpath('.//main//a'), ('main', None, None))
+        self.assertEqual(parse_region_xpath('//div[@id="content"]//a'), ('div', 'id', 'content'))
+        self.assertEqual(parse_region_xpath(".//*[@class='links']//a"), ('*', 'class', 'links'))
+        with self.assertRaises(ValueError):
+            parse_region_xpath('.//main/div[2]//a')
+
+    def test_link_extractor(self):
+        html = ('<html><head><title> Home </title></head><body><a href="/nav">'
+                '<div id="content"><div><a href="page/">x</a></div><a>no href</a></div>'
+                '<a href="/footer"></body></html>')
+        parser = LinkExtractor(parse_region_xpath('.//div[@id="content"]//a'), 'https://w3.org/standards/')
+        # Feed the page in small chunks, as it would be downloaded.
+        for start in range(0, len(html), 7):
+            parser.feed(html[start:start + 7])
+        self.assertEqual(parser.title, ' Home ')
+        self.assertEqual(parser.hrefs, ['https://w3.org/standards/page/', None])
+        parser = LinkExtractor(None, 'https://w3.org/')
+        parser.feed(html)
+        self.assertEqual(parser.hrefs, ['https://w3.org/nav', 'https://w3.org/page/', None, 'https://w3.org/footer'])
+        self.assertIsNone(parser.canonical_url)
+        parser = LinkExtractor(None, 'https://w3.org/standards/')
+        parser.feed('<html><head><link rel="Canonical" href="../home/"></head></html>')
+        self.assertEqual(parser.canonical_url, 'https://w3.org/home/')
+
+    def test_link_extractor_void_elements(self):
+        html = ('<div id="c"><img src=x><br><input name=q><hr/><a href="/in"></a></div>'
+                '<meta charset="utf-8"><a href="/out"></a>')
+        for xpath in ('.//*[@id="c"]//a', './/div[@id="c"]//a'):
+            parser = LinkExtractor(parse_region_xpath(xpath), 'https://w3.org/')
+            parser.feed(html)
+            # The void elements have no end tag and do not keep the region open.
+            self.assertEqual(parser.hrefs, ['https://w3.org/in'])
+
+
+class TestIterSitemap(unittest.TestCase):
+
+    def test_iter_sitemap(self):
+        xml = (b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+               b'<url><loc> https://w3.org/a </loc></url><url><lastmod>2020-01-01</lastmod></url>'
+               + b'<url><loc>https://w3.org/b</loc></url>' * 50000 + b'</urlset>')
+        entries = iter_sitemap(BytesIO(xml))
+        self.assertEqual(next(entries), ('url', 'https://w3.org/a'))
+        self.assertEqual(sum(1 for _ in entries), 50000)
+        index = b'<sitemapindex><sitemap><loc>https://w3.org/sitemap.xml</loc></sitemap></sitemapindex>'
+        self.assertEqual(list(iter_sitemap(BytesIO(index))), [('sitemap', 'https://w3.org/sitemap.xml')])
+
 
 if __name__ == '__main__':
     unittest.main()